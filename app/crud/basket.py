@@ -0,0 +1,162 @@
+from collections import Counter
+from datetime import date
+
+import numpy as np
+from sqlalchemy import select, func, distinct
+from sqlalchemy.orm import Session
+
+from app.models import (
+    SalesDocument, SalesLineItem, ProductVariant, Product, DocumentType, DocumentStatus
+)
+
+CHUNK_ROWS = 200000     # Renglones (venta, variante) por bloque leído
+MAX_BASKET = 50         # Partidas distintas máximas por ticket que se consideran
+
+
+def _sale_filters(branch_id: int, start: date, end: date):
+    return (
+        SalesDocument.branch_id == branch_id,
+        SalesDocument.doc_type == DocumentType.INVOICE,
+        SalesDocument.status != DocumentStatus.CANCELLED,
+        SalesDocument.business_date >= start,
+        SalesDocument.business_date <= end,
+    )
+
+
+def _count_pairs(docs: np.ndarray, items: np.ndarray, counts: Counter, n_items: int) -> int:
+    """
+    Cuenta pares (a, b) con a < b dentro de cada ticket. `docs`/`items` vienen
+    ordenados por ticket y variante: los pares del mismo ticket están a distancia
+    1..MAX_BASKET-1 en el arreglo, así que se comparan desplazamientos vectorizados.
+    En tickets con más de MAX_BASKET variantes frecuentes no se cuentan los pares más
+    alejados; devuelve cuántos tickets quedaron así.
+    """
+    if not len(docs):
+        return 0
+    for k in range(1, min(MAX_BASKET, len(docs))):
+        same = docs[k:] == docs[:-k]
+        if not same.any():
+            break
+        keys = items[:-k][same] * n_items + items[k:][same]
+        uniq, freq = np.unique(keys, return_counts=True)
+        counts.update(dict(zip(uniq.tolist(), freq.tolist())))
+    _, sizes = np.unique(docs, return_counts=True)
+    return int((sizes > MAX_BASKET).sum())
+
+
+def mine_association_rules(
+    db: Session,
+    branch_id: int,
+    start: date,
+    end: date,
+    min_support: float = 0.01,
+    min_confidence: float = 0.2,
+    max_rules: int = 200,
+) -> dict:
+    """
+    Reglas de asociación A -> B entre variantes (soporte, confianza, lift) de los tickets
+    del periodo. Apriori de dos niveles sobre la matriz dispersa ticket x variante:
+    1. Soporte por variante con una consulta agrupada; solo siguen las frecuentes.
+    2. Pares (venta, variante) leídos en bloques (sin ORM) y contados con NumPy.
+    De cada ticket se consideran a lo más MAX_BASKET variantes frecuentes por par;
+    `truncated_transactions` indica cuántos tickets rebasaron ese límite.
+    """
+    filters = _sale_filters(branch_id, start, end)
+
+    n_docs = db.execute(
+        select(func.count(SalesDocument.id)).where(*filters)
+    ).scalar() or 0
+    if not n_docs:
+        return {"from": start, "to": end, "transactions": 0, "frequent_items": 0, "frequent_pairs": 0,
+                "truncated_transactions": 0, "rules": []}
+    min_count = max(2, int(np.ceil(min_support * n_docs)))
+
+    # 1. Variantes frecuentes (tickets distintos en que aparecen)
+    item_counts = dict(db.execute(
+        select(SalesLineItem.variant_id, func.count(distinct(SalesLineItem.document_id)))
+        .join(SalesDocument, SalesDocument.id == SalesLineItem.document_id)
+        .where(*filters)
+        .group_by(SalesLineItem.variant_id)
+        .having(func.count(distinct(SalesLineItem.document_id)) >= min_count)
+    ).all())
+    if len(item_counts) < 2:
+        return {"from": start, "to": end, "transactions": n_docs, "frequent_items": len(item_counts),
+                "frequent_pairs": 0, "truncated_transactions": 0, "rules": []}
+
+    variant_ids = np.array(sorted(item_counts), dtype=np.int64)
+    n_items = len(variant_ids)
+
+    # 2. Pares por ticket: se lee (venta, variante) ordenado y en bloques
+    pair_counts: Counter = Counter()
+    truncated = 0
+    stmt = (
+        select(SalesLineItem.document_id, SalesLineItem.variant_id)
+        .join(SalesDocument, SalesDocument.id == SalesLineItem.document_id)
+        .where(*filters)
+        .distinct()
+        .order_by(SalesLineItem.document_id, SalesLineItem.variant_id)
+        .execution_options(yield_per=CHUNK_ROWS)
+    )
+    carry_docs = np.empty(0, dtype=np.int64)
+    carry_items = np.empty(0, dtype=np.int64)
+    for partition in db.execute(stmt).partitions():
+        block = np.array([tuple(row) for row in partition], dtype=np.int64)
+        # Solo variantes frecuentes (se filtra aquí: la lista puede ser enorme para un IN)
+        pos = np.minimum(np.searchsorted(variant_ids, block[:, 1]), n_items - 1)
+        frequent = variant_ids[pos] == block[:, 1]
+        if not frequent.any():
+            continue
+        docs = np.concatenate([carry_docs, block[frequent, 0]])
+        items = np.concatenate([carry_items, pos[frequent]])
+        # El último ticket puede seguir en el siguiente bloque: se deja pendiente
+        tail = np.searchsorted(docs, docs[-1])
+        truncated += _count_pairs(docs[:tail], items[:tail], pair_counts, n_items)
+        carry_docs, carry_items = docs[tail:], items[tail:]
+    truncated += _count_pairs(carry_docs, carry_items, pair_counts, n_items)
+
+    # 3. Reglas en ambos sentidos para los pares frecuentes
+    keys = np.array([k for k, c in pair_counts.items() if c >= min_count], dtype=np.int64)
+    if not len(keys):
+        return {"from": start, "to": end, "transactions": n_docs, "frequent_items": n_items,
+                "frequent_pairs": 0, "truncated_transactions": truncated, "rules": []}
+    together = np.array([pair_counts[k] for k in keys.tolist()], dtype=np.float64)
+    a_idx, b_idx = keys // n_items, keys % n_items
+    support_items = np.array([item_counts[v] for v in variant_ids.tolist()], dtype=np.float64)
+
+    ante = np.concatenate([a_idx, b_idx])
+    cons = np.concatenate([b_idx, a_idx])
+    both = np.concatenate([together, together])
+    confidence = both / support_items[ante]
+    lift = confidence / (support_items[cons] / n_docs)
+    keep = np.flatnonzero(confidence >= min_confidence)
+    order = keep[np.lexsort((-confidence[keep], -lift[keep]))][:max_rules]
+
+    used = set(variant_ids[ante[order]].tolist()) | set(variant_ids[cons[order]].tolist())
+    names = {
+        r.id: (r.sku, f"{r.name} ({r.variant_name})" if r.variant_name and r.variant_name != "Estándar" else r.name)
+        for r in db.query(ProductVariant.id, ProductVariant.sku, ProductVariant.variant_name, Product.name)
+        .join(Product, Product.id == ProductVariant.product_id)
+        .filter(ProductVariant.id.in_(used))
+    } if used else {}
+
+    rules = []
+    for i in order.tolist():
+        a, b = int(variant_ids[ante[i]]), int(variant_ids[cons[i]])
+        rules.append({
+            "antecedent": {"variant_id": a, "sku": names.get(a, (None, None))[0], "name": names.get(a, (None, None))[1]},
+            "consequent": {"variant_id": b, "sku": names.get(b, (None, None))[0], "name": names.get(b, (None, None))[1]},
+            "transactions": int(both[i]),
+            "support": round(float(both[i] / n_docs), 6),
+            "confidence": round(float(confidence[i]), 4),
+            "lift": round(float(lift[i]), 4),
+        })
+
+    return {
+        "from": start,
+        "to": end,
+        "transactions": n_docs,
+        "frequent_items": n_items,
+        "frequent_pairs": int(len(keys)),
+        "truncated_transactions": truncated,
+        "rules": rules,
+    }
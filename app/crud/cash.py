@@ -0,0 +1,247 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from typing import Iterable, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import (
+    CashSession, CashSessionStatus, CashMovement, CashCutSnapshot, Payment, PaymentMethod,
+    SalesDocument, DocumentType, DocumentStatus, Branch
+)
+
+ZERO = Decimal("0.00")
+
+# Columna del acumulado de la sesión por método de pago
+SALES_COLUMNS = {
+    PaymentMethod.CASH: "sales_cash",
+    PaymentMethod.CARD: "sales_card",
+    PaymentMethod.TRANSFER: "sales_transfer",
+    PaymentMethod.OTHER: "sales_other",
+}
+TOTAL_COLUMNS = list(SALES_COLUMNS.values()) + ["payments_count", "inflows", "outflows"]
+
+
+def _dec(value) -> Decimal:
+    if value is None:
+        return ZERO
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def get_open_session(db: Session, user_id: int) -> Optional[CashSession]:
+    return db.query(CashSession).filter(
+        CashSession.user_id == user_id,
+        CashSession.status == CashSessionStatus.OPEN
+    ).first()
+
+
+def _bump_session(db: Session, session_id: int, deltas: dict) -> None:
+    """UPDATE col = col + delta sobre la sesión (atómico; no depende del flush)."""
+    db.query(CashSession).filter(CashSession.id == session_id).update(
+        {getattr(CashSession, col): func.coalesce(getattr(CashSession, col), 0) + delta
+         for col, delta in deltas.items() if delta},
+        synchronize_session=False
+    )
+
+
+def session_stamp(session: Optional[CashSession]) -> dict:
+    """Campos con que se sella un pago nuevo: turno abierto y terminal del cajero."""
+    if session is None:
+        return {"cash_session_id": None, "terminal": None}
+    return {"cash_session_id": session.id, "terminal": session.terminal}
+
+
+def apply_payments(db: Session, payments: Iterable[Payment], sign: int = 1) -> None:
+    """
+    Suma (sign=1) o resta (sign=-1, cancelación) pagos de venta en los acumulados
+    del turno con que se sellaron. Los pagos sin turno no afectan ninguna caja.
+    No hace commit: viaja con la transacción de la venta.
+    """
+    by_session = defaultdict(lambda: defaultdict(Decimal))
+    for payment in payments:
+        if payment.cash_session_id is None:
+            continue
+        column = SALES_COLUMNS.get(PaymentMethod(payment.method), "sales_other")
+        by_session[payment.cash_session_id][column] += sign * _dec(payment.amount)
+        by_session[payment.cash_session_id]["payments_count"] += sign
+
+    for target, deltas in by_session.items():
+        _bump_session(db, target, deltas)
+
+
+def apply_movement(db: Session, session_id: int, direction: str, amount) -> None:
+    """Entrada (IN) o salida (OUT) manual de efectivo. No hace commit."""
+    _bump_session(db, session_id, {"inflows" if direction == "IN" else "outflows": _dec(amount)})
+
+
+def expected_in_drawer(session: CashSession) -> Decimal:
+    return (_dec(session.opening_balance) + _dec(session.sales_cash)
+            + _dec(session.inflows) - _dec(session.outflows))
+
+
+def _payments_by_method(db: Session, session_id: int) -> dict:
+    """{método: (pagos, monto)} de las ventas vigentes cobradas en el turno (índice por turno y método)."""
+    rows = db.query(Payment.method, func.count(Payment.id), func.sum(Payment.amount)).join(
+        SalesDocument, SalesDocument.id == Payment.sales_document_id
+    ).filter(
+        Payment.cash_session_id == session_id,
+        SalesDocument.doc_type == DocumentType.INVOICE,
+        SalesDocument.status != DocumentStatus.CANCELLED,
+    ).group_by(Payment.method)
+    return {PaymentMethod(method): (count, _dec(amount)) for method, count, amount in rows}
+
+
+# -----------------------------
+# Corte de caja
+# -----------------------------
+def build_cash_cut(db: Session, session: CashSession) -> CashCutSnapshot:
+    """
+    Calcula el corte del turno una sola vez: montos de los acumulados de la sesión,
+    pagos y monto por método (de los mismos renglones de pago) y lista de movimientos.
+    Al cerrar, el llamador concilia antes los acumulados (`reconcile_sessions`) para que
+    ambos coincidan. Devuelve el snapshot sin guardar.
+    """
+    by_method = _payments_by_method(db, session.id)
+    movements = db.query(CashMovement).filter(
+        CashMovement.session_id == session.id
+    ).order_by(CashMovement.id).all()
+    branch = db.get(Branch, session.branch_id)
+    user = session.user
+    closed = session.closed_at is not None and session.difference is not None
+    # Cerrado: el esperado es el que se usó para la diferencia al cerrar
+    expected = (_dec(session.closing_balance) - _dec(session.difference)) if closed else expected_in_drawer(session)
+
+    return CashCutSnapshot(
+        session_id=session.id,
+        branch_id=session.branch_id,
+        user_id=session.user_id,
+        branch_name=branch.name if branch else None,
+        cashier_name=(user.full_name or user.username) if user else None,
+        terminal=session.terminal,
+        opened_at=session.opened_at,
+        closed_at=session.closed_at,
+        opening_balance=_dec(session.opening_balance),
+        sales_cash=_dec(session.sales_cash),
+        sales_card=_dec(session.sales_card),
+        sales_transfer=_dec(session.sales_transfer),
+        sales_other=_dec(session.sales_other),
+        payments_count=session.payments_count or 0,
+        inflows=_dec(session.inflows),
+        outflows=_dec(session.outflows),
+        expected=expected,
+        closing_balance=session.closing_balance if closed else None,
+        difference=session.difference if closed else None,
+        by_method={
+            method.value: {
+                "count": by_method.get(method, (0, ZERO))[0],
+                "amount": float(by_method.get(method, (0, ZERO))[1]),
+            }
+            for method in SALES_COLUMNS
+        },
+        movements=[
+            {
+                "created_at": m.created_at.isoformat() if m.created_at else None,
+                "type": m.type,
+                "amount": float(m.amount),
+                "reason": m.reason,
+            } for m in movements
+        ],
+        notes=session.notes,
+    )
+
+
+def snapshot_cash_cut(db: Session, session: CashSession) -> CashCutSnapshot:
+    """Congela el corte de un turno que se está cerrando. No hace commit."""
+    cut = build_cash_cut(db, session)
+    db.add(cut)
+    return cut
+
+
+def get_cash_cut(db: Session, session: CashSession) -> CashCutSnapshot:
+    """Corte guardado del turno; si sigue abierto se calcula al momento (sin guardar)."""
+    return session.cut or build_cash_cut(db, session)
+
+
+def backfill_cash_cuts(db: Session) -> int:
+    """Congela el corte de los turnos cerrados antes de existir los snapshots. No hace commit."""
+    missing = db.query(CashSession).outerjoin(
+        CashCutSnapshot, CashCutSnapshot.session_id == CashSession.id
+    ).filter(
+        CashSession.status == CashSessionStatus.CLOSED,
+        CashCutSnapshot.session_id.is_(None)
+    ).all()
+    for session in missing:
+        snapshot_cash_cut(db, session)
+    return len(missing)
+
+
+# -----------------------------
+# Conciliación contra los renglones
+# -----------------------------
+def compute_session_totals(db: Session, session: CashSession) -> dict:
+    """Recalcula los acumulados de una sesión desde pagos y movimientos (lento; para verificar)."""
+    totals = {col: ZERO for col in TOTAL_COLUMNS}
+    totals["payments_count"] = 0
+
+    for method, (count, amount) in _payments_by_method(db, session.id).items():
+        totals[SALES_COLUMNS.get(method, "sales_other")] += amount
+        totals["payments_count"] += count
+
+    movements = db.query(CashMovement.type, func.sum(CashMovement.amount)).filter(
+        CashMovement.session_id == session.id
+    ).group_by(CashMovement.type)
+    for direction, amount in movements:
+        totals["inflows" if direction == "IN" else "outflows"] += _dec(amount)
+    return totals
+
+
+def reconcile_sessions(db: Session, session_id: Optional[int] = None, fix: bool = False) -> List[dict]:
+    """
+    Compara los acumulados guardados de cada sesión (o solo `session_id`) contra
+    los renglones. Devuelve las diferencias; con fix=True las corrige. No hace commit.
+    """
+    query = db.query(CashSession).order_by(CashSession.id)
+    if session_id is not None:
+        query = query.filter(CashSession.id == session_id)
+
+    mismatches = []
+    for session in query:
+        expected = compute_session_totals(db, session)
+        diffs = {
+            col: {"stored": getattr(session, col) or 0, "computed": value}
+            for col, value in expected.items()
+            if _dec(getattr(session, col)) != _dec(value)
+        }
+        if diffs:
+            mismatches.append({
+                "session_id": session.id,
+                "status": getattr(session.status, "value", session.status),
+                "diffs": diffs,
+            })
+            if fix:
+                for col, value in expected.items():
+                    setattr(session, col, value)
+    return mismatches
+
+
+def backfill_payment_sessions(db: Session) -> int:
+    """
+    Sella con su turno los pagos anteriores a cash_session_id: el del cajero que
+    cobró y cuya ventana abierto-cerrado contiene el pago. No hace commit.
+    """
+    total = 0
+    for session in db.query(CashSession).order_by(CashSession.id):
+        query = db.query(Payment).filter(
+            Payment.cash_session_id.is_(None),
+            Payment.created_by_id == session.user_id,
+            # now() del servidor se guarda sin fracciones de segundo (SQLite)
+            Payment.created_at >= session.opened_at.replace(microsecond=0) - timedelta(seconds=1),
+        )
+        if session.closed_at is not None:
+            query = query.filter(Payment.created_at <= session.closed_at)
+        total += query.update(
+            {Payment.cash_session_id: session.id, Payment.terminal: session.terminal},
+            synchronize_session=False
+        )
+    return total
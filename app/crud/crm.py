@@ -1,6 +1,14 @@
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, type_coerce, Float
 from sqlalchemy.orm import Session
-from app.models import Customer
+from app.models import Customer, CustomerLedgerEntry, CustomerRFM, SalesDocument, DocumentStatus, DocumentType
 from app.schemas.crm import CustomerCreate
+from app.utils.business_date import branch_today
 
 def get_customer(db: Session, customer_id: int):
     return db.query(Customer).filter(Customer.id == customer_id).first()
@@ -25,4 +33,197 @@ def create_customer(db: Session, customer: CustomerCreate):
     db.add(db_customer)
     db.commit()
     db.refresh(db_customer)
-    return db_customer
\ No newline at end of file
+    return db_customer
+
+# -----------------------------
+# Cuentas por cobrar (ventas a crédito abiertas)
+# -----------------------------
+def open_invoices_query(db: Session, customer_id: Optional[int] = None):
+    """Ventas con saldo pendiente (usa el índice parcial balance_due > 0)."""
+    query = db.query(SalesDocument).filter(
+        SalesDocument.balance_due > 0,
+        SalesDocument.status != DocumentStatus.CANCELLED
+    )
+    if customer_id is not None:
+        query = query.filter(SalesDocument.customer_id == customer_id)
+    return query
+
+
+def overdue_invoices_query(db: Session, as_of: date, customer_id: Optional[int] = None):
+    """Ventas abiertas cuyo vencimiento (business_date + credit_days) ya pasó."""
+    return open_invoices_query(db, customer_id).filter(SalesDocument.due_date < as_of)
+
+
+def apply_customer_payment(
+    db: Session,
+    customer: Customer,
+    amount: Decimal,
+    description: str,
+) -> List[CustomerLedgerEntry]:
+    """
+    Aplica un abono a cuenta: baja el saldo del cliente y lo reparte FIFO
+    (la venta abierta más antigua primero) actualizando `balance_due` de cada venta.
+    Deja un movimiento de ledger por venta abonada y, si sobra, uno sin venta
+    (saldo a favor). No hace commit.
+    """
+    customer.current_balance -= amount
+
+    entries = []
+    remaining = amount
+    open_docs = (
+        open_invoices_query(db, customer.id)
+        .order_by(SalesDocument.created_at, SalesDocument.id)
+        .with_for_update()
+    )
+    for doc in open_docs:
+        if remaining <= 0:
+            break
+        applied = min(remaining, doc.balance_due)
+        doc.balance_due -= applied
+        if doc.balance_due <= 0:
+            doc.status = DocumentStatus.PAID
+        remaining -= applied
+        entries.append(CustomerLedgerEntry(
+            customer_id=customer.id,
+            sales_document_id=doc.id,
+            amount=-applied, # Negativo porque disminuye la deuda
+            description=f"{description} - Venta #{doc.series}-{doc.folio}",
+            entry_type="PAYMENT"
+        ))
+
+    if remaining > 0:
+        entries.append(CustomerLedgerEntry(
+            customer_id=customer.id,
+            amount=-remaining,
+            description=description,
+            entry_type="PAYMENT"
+        ))
+
+    db.add_all(entries)
+    return entries
+
+
+def apply_customer_credit(db: Session, customer: Customer) -> Decimal:
+    """
+    Aplica el saldo a favor del cliente (abonos que quedaron sin venta, p. ej. tras
+    cancelar una venta abonada o pagar de más) a sus ventas abiertas, FIFO.
+    Solo baja `balance_due`: el saldo del cliente y el ledger ya reflejan esos abonos,
+    así que la suma de los saldos abiertos vuelve a cuadrar con `current_balance`.
+    No hace commit. Devuelve lo aplicado.
+    """
+    db.flush()
+    open_docs = (
+        open_invoices_query(db, customer.id)
+        .order_by(SalesDocument.created_at, SalesDocument.id)
+        .with_for_update()
+        .all()
+    )
+    balance = customer.current_balance if isinstance(customer.current_balance, Decimal) else Decimal(str(customer.current_balance or 0))
+    credit = sum((doc.balance_due for doc in open_docs), Decimal("0.00")) - balance
+    applied_total = Decimal("0.00")
+    for doc in open_docs:
+        if credit <= 0:
+            break
+        applied = min(credit, doc.balance_due)
+        doc.balance_due -= applied
+        if doc.balance_due <= 0:
+            doc.status = DocumentStatus.PAID
+        credit -= applied
+        applied_total += applied
+    return applied_total
+
+
+# --------------------------------------------------------------------------
+# Segmentación RFM (Recencia, Frecuencia, Monto)
+# --------------------------------------------------------------------------
+RFM_SEGMENTS = {
+    "CHAMPIONS": "Campeones",
+    "LOYAL": "Leales",
+    "NEW": "Nuevos",
+    "POTENTIAL": "Potenciales",
+    "AT_RISK": "En riesgo",
+    "LOST": "Perdidos",
+    "HIBERNATING": "Hibernando",
+    "NEEDS_ATTENTION": "Requieren atención",
+}
+RFM_COLUMNS = ["customer_id", "first_purchase", "last_purchase", "frequency", "monetary"]
+INSERT_BATCH = 5000
+
+
+def _quintile_scores(values: pd.Series, ascending: bool = True) -> np.ndarray:
+    """Calificación 1-5 por percentil; los empates reciben la misma calificación."""
+    pct = values.rank(method="average", ascending=ascending, pct=True).to_numpy()
+    return np.clip(np.ceil(pct * 5), 1, 5).astype(int)
+
+
+def score_rfm(df: pd.DataFrame, as_of: date) -> pd.DataFrame:
+    """Agrega recencia, calificaciones R/F/M y segmento a un DataFrame con RFM_COLUMNS."""
+    df = df.copy()
+    df["recency_days"] = (pd.Timestamp(as_of) - pd.to_datetime(df["last_purchase"])).dt.days.clip(lower=0)
+    df["avg_ticket"] = (df["monetary"] / df["frequency"].where(df["frequency"] > 0, 1)).round(2)
+
+    # Recencia: menos días es mejor (orden descendente -> más reciente = 5)
+    r = _quintile_scores(df["recency_days"], ascending=False)
+    f = _quintile_scores(df["frequency"])
+    m = _quintile_scores(df["monetary"])
+    df["r_score"], df["f_score"], df["m_score"] = r, f, m
+    df["rfm_score"] = (r * 100 + f * 10 + m).astype(str)
+
+    # El orden importa: gana la primera regla que aplica
+    df["segment"] = np.select(
+        [
+            (r >= 4) & (f >= 4),
+            (r >= 3) & (f >= 4),
+            (r >= 4) & (f <= 1),
+            (r >= 3) & (f >= 2) & (f <= 3),
+            (r <= 2) & (f >= 3),
+            (r <= 1) & (f <= 2),
+            (r <= 2) & (f <= 2),
+        ],
+        ["CHAMPIONS", "LOYAL", "NEW", "POTENTIAL", "AT_RISK", "LOST", "HIBERNATING"],
+        "NEEDS_ATTENTION",
+    )
+    return df
+
+
+def refresh_customer_rfm(db: Session, as_of: Optional[date] = None) -> dict:
+    """
+    Recalcula `customer_rfm` con todas las ventas (no canceladas) a clientes registrados.
+    Una sola consulta agrupada por cliente; calificaciones y segmentos vectorizados.
+    Reemplaza la tabla completa. No hace commit. Devuelve clientes por segmento.
+    """
+    # Sin fecha: el día de negocio en la zona por defecto (el llamador pasa el de su sucursal)
+    as_of = as_of or branch_today(db, None)
+    query = db.query(
+        SalesDocument.customer_id,
+        func.min(SalesDocument.business_date),
+        func.max(SalesDocument.business_date),
+        func.count(SalesDocument.id),
+        type_coerce(func.sum(SalesDocument.total_amount), Float),
+    ).filter(
+        SalesDocument.customer_id.isnot(None),
+        SalesDocument.doc_type == DocumentType.INVOICE,
+        SalesDocument.status != DocumentStatus.CANCELLED,
+        SalesDocument.business_date <= as_of,
+    ).group_by(SalesDocument.customer_id)
+
+    df = pd.DataFrame(db.execute(query.statement).fetchall(), columns=RFM_COLUMNS)
+    db.query(CustomerRFM).delete(synchronize_session=False)
+    if df.empty:
+        return {}
+
+    df["monetary"] = df["monetary"].astype(float).fillna(0.0).round(2)
+    df = score_rfm(df, as_of)
+    df["computed_at"] = datetime.now(timezone.utc)
+
+    rows = df[RFM_COLUMNS + ["recency_days", "avg_ticket", "r_score", "f_score", "m_score",
+                             "rfm_score", "segment", "computed_at"]].to_dict("records")
+    for row in rows:
+        # Tipos nativos para el driver (numpy/pandas -> int/float/date)
+        row["customer_id"] = int(row["customer_id"])
+        for key in ("frequency", "recency_days", "r_score", "f_score", "m_score"):
+            row[key] = int(row[key])
+    for offset in range(0, len(rows), INSERT_BATCH):
+        db.bulk_insert_mappings(CustomerRFM, rows[offset:offset + INSERT_BATCH])
+
+    return {k: int(v) for k, v in df["segment"].value_counts().items()}
@@ -0,0 +1,224 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Iterable, List, Optional
+
+from sqlalchemy import select, update, case, and_
+from sqlalchemy.sql import func
+from sqlalchemy.orm import Session
+
+from app.models import Product, ProductVariant, ProductPrice, ProductPriceHistory
+from app.schemas.products import RepriceRequest, RepriceMode
+
+# Tamaño de lote para consultas IN (...) al escribir historial
+HISTORY_CHUNK = 500
+
+
+# -----------------------------
+# Historial de precios
+# -----------------------------
+def record_price_history(
+    db: Session,
+    variant_ids: Iterable[int],
+    source: str,
+    user_id: Optional[int] = None,
+    effective_at: Optional[datetime] = None,
+) -> int:
+    """
+    Agrega en bloque una foto del precio, costo y escalones ACTUALES de las variantes.
+    Se llama después de modificar precios, dentro de la misma transacción.
+    Devuelve cuántos renglones se insertaron.
+    """
+    ids = list(dict.fromkeys(i for i in variant_ids if i is not None))
+    if not ids:
+        return 0
+
+    # autoflush está desactivado: asegurar que los cambios ORM pendientes se lean
+    db.flush()
+    effective_at = effective_at or datetime.utcnow()
+
+    inserted = 0
+    for start in range(0, len(ids), HISTORY_CHUNK):
+        chunk = ids[start:start + HISTORY_CHUNK]
+
+        tiers = {}
+        tier_rows = (
+            db.query(ProductPrice.variant_id, ProductPrice.price_name,
+                     ProductPrice.min_quantity, ProductPrice.unit_price)
+            .filter(ProductPrice.variant_id.in_(chunk))
+            .order_by(ProductPrice.variant_id, ProductPrice.min_quantity)
+        )
+        for t in tier_rows:
+            tiers.setdefault(t.variant_id, []).append({
+                "price_name": t.price_name,
+                "min_quantity": str(t.min_quantity),
+                "unit_price": str(t.unit_price),
+            })
+
+        mappings = [
+            {
+                "variant_id": v.id,
+                "price": v.price,
+                "cost": v.cost,
+                "tiers": tiers.get(v.id, []),
+                "source": source,
+                "user_id": user_id,
+                "effective_at": effective_at,
+            }
+            for v in db.query(ProductVariant.id, ProductVariant.price, ProductVariant.cost)
+            .filter(ProductVariant.id.in_(chunk))
+        ]
+        if mappings:
+            db.bulk_insert_mappings(ProductPriceHistory, mappings)
+            inserted += len(mappings)
+
+    return inserted
+
+
+def backfill_price_history(db: Session) -> int:
+    """
+    Foto inicial ("BASELINE") con el precio actual de las variantes que aún no tienen
+    historial, vigente desde ahora (la migración): el precio de antes no se conoce, así
+    que las consultas a fechas anteriores siguen sin historial. No hace commit.
+    Devuelve cuántas variantes.
+    """
+    missing = [
+        variant_id for (variant_id,) in db.query(ProductVariant.id).outerjoin(
+            ProductPriceHistory, ProductPriceHistory.variant_id == ProductVariant.id
+        ).filter(ProductPriceHistory.id.is_(None))
+    ]
+    return record_price_history(db, missing, "BASELINE")
+
+
+# -----------------------------
+# Motor de re-precio masivo
+# -----------------------------
+def _round_price(expr, ending: Optional[Decimal]):
+    """
+    Redondea a 2 decimales y, si se pide, a la terminación indicada (.50, .90, ...):
+    el menor precio >= expr cuyos centavos sean `ending`.
+    ceil(y) se expresa como ROUND(y + 0.499) (y tiene 2 decimales) para que
+    funcione igual en SQLite y PostgreSQL sin funciones matemáticas extra.
+    """
+    base = func.round(expr, 2)
+    if ending is None:
+        return base
+    y = base - ending
+    return func.round(func.round(y + Decimal("0.499"), 0) + ending, 2)
+
+
+def _new_price_expr(rule: RepriceRequest):
+    """Expresión SQL del nuevo precio base en función de las columnas de la variante."""
+    if rule.mode == RepriceMode.PERCENT:
+        raw = ProductVariant.price * (1 + rule.value / Decimal(100))
+    elif rule.mode == RepriceMode.AMOUNT:
+        raw = ProductVariant.price + rule.value
+    else:  # MARGIN: precio = costo * (1 + margen%)
+        raw = ProductVariant.cost * (1 + rule.value / Decimal(100))
+
+    rounded = _round_price(raw, rule.rounding)
+    return case((rounded < 0, Decimal(0)), else_=rounded)
+
+
+def _selected_variants(rule: RepriceRequest):
+    """Subconsulta con los ids de variante que cumplen el selector."""
+    q = (
+        select(ProductVariant.id)
+        .join(Product, Product.id == ProductVariant.product_id)
+        .where(Product.is_active == True)
+    )
+    if rule.department_id is not None:
+        q = q.where(Product.category_id == rule.department_id)
+    if rule.brand_id is not None:
+        q = q.where(Product.brand_id == rule.brand_id)
+    if rule.skus:
+        q = q.where(ProductVariant.sku.in_(rule.skus))
+
+    if rule.mode == RepriceMode.MARGIN:
+        q = q.where(ProductVariant.cost.isnot(None), ProductVariant.cost > 0)
+    else:
+        q = q.where(ProductVariant.price.isnot(None))
+    return q
+
+
+def reprice_variants(db: Session, rule: RepriceRequest, user_id: Optional[int] = None) -> dict:
+    """
+    Aplica la regla de precio a todas las variantes del selector con UPDATEs
+    por conjunto (sin cargar objetos ORM) y registra el historial en bloque.
+    No hace commit.
+    """
+    selected = _selected_variants(rule)
+    variant_ids: List[int] = [r[0] for r in db.execute(selected)]
+    if not variant_ids:
+        return {"updated": 0, "tiers_updated": 0}
+
+    new_price = _new_price_expr(rule)
+    tiers_updated = 0
+
+    # 1. Escalones: se escalan con la proporción nuevo/anterior ANTES de tocar el precio base
+    if rule.scale_tiers:
+        ratio = (
+            select(new_price / ProductVariant.price)
+            .where(ProductVariant.id == ProductPrice.variant_id)
+            .scalar_subquery()
+        )
+        scalable = selected.where(ProductVariant.price > 0)
+        result = db.execute(
+            update(ProductPrice)
+            .where(ProductPrice.variant_id.in_(scalable))
+            .values(unit_price=_round_price(ProductPrice.unit_price * ratio, rule.rounding))
+            .execution_options(synchronize_session=False)
+        )
+        tiers_updated = result.rowcount or 0
+
+    # 2. Precio base
+    result = db.execute(
+        update(ProductVariant)
+        .where(ProductVariant.id.in_(selected))
+        .values(price=new_price)
+        .execution_options(synchronize_session=False)
+    )
+
+    # 3. Historial en bloque
+    record_price_history(db, variant_ids, source="REPRICE", user_id=user_id)
+
+    return {"updated": result.rowcount or 0, "tiers_updated": tiers_updated}
+
+
+# -----------------------------
+# Consulta a un punto en el tiempo
+# -----------------------------
+def prices_at(db: Session, variant_ids: Iterable[int], at: datetime) -> List[ProductPriceHistory]:
+    """
+    Precio/costo vigente de cada variante en el instante `at`, en UNA consulta:
+    el último renglón de historial con effective_at <= at (índice variant_id, effective_at).
+    Las variantes sin historial anterior a `at` no aparecen en el resultado.
+    """
+    ids = list(dict.fromkeys(variant_ids))
+    if not ids:
+        return []
+
+    # El historial se guarda en UTC sin zona (igual que datetime.utcnow())
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    ranked = (
+        select(
+            ProductPriceHistory.id,
+            func.row_number().over(
+                partition_by=ProductPriceHistory.variant_id,
+                order_by=(ProductPriceHistory.effective_at.desc(), ProductPriceHistory.id.desc()),
+            ).label("rn"),
+        )
+        .where(
+            ProductPriceHistory.variant_id.in_(ids),
+            ProductPriceHistory.effective_at <= at,
+        )
+        .subquery()
+    )
+
+    return (
+        db.query(ProductPriceHistory)
+        .join(ranked, and_(ranked.c.id == ProductPriceHistory.id, ranked.c.rn == 1))
+        .order_by(ProductPriceHistory.variant_id)
+        .all()
+    )
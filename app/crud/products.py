@@ -1,5 +1,12 @@
+from decimal import Decimal
+from typing import Iterable, List
+
+from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from app.models import Product, ProductVariant, StockOnHand
+from app.models import (
+    Product, ProductVariant, ProductPrice, StockOnHand,
+    SalesLineItem, InventoryMovement, ProductPriceHistory
+)
 from app.schemas.products import ProductCreate
 
 def create_simple_product(db: Session, product_in: ProductCreate, branch_id: int):
@@ -41,4 +48,139 @@ def create_simple_product(db: Session, product_in: ProductCreate, branch_id: int
     return db_product
 
 def get_product_by_sku(db: Session, sku: str):
-    return db.query(ProductVariant).filter(ProductVariant.sku == sku).first()
\ No newline at end of file
+    return db.query(ProductVariant).filter(ProductVariant.sku == sku).first()
+
+# -----------------------------
+# Sincronización diferencial (edición de productos)
+# -----------------------------
+def _changed(current, new) -> bool:
+    """Compara valores numéricos/texto tolerando None y escalas distintas de Decimal."""
+    if current is None or new is None:
+        return current is not new
+    if isinstance(new, Decimal) or isinstance(current, Decimal):
+        return Decimal(str(current)) != Decimal(str(new))
+    return current != new
+
+
+def sync_price_tiers(db: Session, variant_id: int, existing: List[ProductPrice], tiers_in: Iterable) -> bool:
+    """
+    Sincroniza los precios escalonados de una variante contra la lista recibida.
+    Empareja por (price_name, min_quantity) y solo emite los INSERT/UPDATE/DELETE
+    necesarios, en bloque. Los renglones sin cambios no se tocan.
+    Devuelve True si hubo algún cambio.
+    """
+    current = {(p.price_name, Decimal(str(p.min_quantity))): p for p in existing}
+
+    incoming = {}
+    for t in tiers_in:
+        incoming[(t.price_name, Decimal(str(t.min_quantity)))] = t  # El último duplicado gana
+
+    to_insert, to_update = [], []
+    for key, t in incoming.items():
+        row = current.get(key)
+        if row is None:
+            to_insert.append({
+                "variant_id": variant_id,
+                "price_name": t.price_name,
+                "min_quantity": t.min_quantity,
+                "unit_price": t.unit_price,
+            })
+        elif _changed(row.unit_price, t.unit_price):
+            to_update.append({"id": row.id, "unit_price": t.unit_price})
+
+    to_delete = [p.id for key, p in current.items() if key not in incoming]
+
+    if to_delete:
+        db.query(ProductPrice).filter(ProductPrice.id.in_(to_delete)).delete(synchronize_session=False)
+    if to_update:
+        db.bulk_update_mappings(ProductPrice, to_update)
+    if to_insert:
+        db.bulk_insert_mappings(ProductPrice, to_insert)
+    return bool(to_delete or to_update or to_insert)
+
+
+def sync_extra_variants(db: Session, product: Product, main: ProductVariant, extras_in: Iterable) -> List[str]:
+    """
+    Sincroniza las variantes extra (todas excepto la principal) emparejando por SKU.
+    - SKU nuevo  -> INSERT (validando unicidad global)
+    - SKU existente con cambios -> UPDATE por id (conserva el id y sus FKs)
+    - SKU que ya no viene -> DELETE, solo si no tiene ventas, kardex ni historial de precios
+    Devuelve los SKUs dados de alta o con cambio de precio/costo (para el historial).
+    """
+    current = {v.sku: v for v in product.variants if v.id != main.id}
+
+    incoming = {}
+    for extra in extras_in:
+        if extra.sku == main.sku:
+            continue  # La principal se maneja con sku/price del producto
+        incoming[extra.sku] = extra
+
+    # 1. Altas: validar SKU único en una sola consulta
+    new_skus = [sku for sku in incoming if sku not in current]
+    if new_skus:
+        taken = db.query(ProductVariant.sku).filter(ProductVariant.sku.in_(new_skus)).all()
+        if taken:
+            raise HTTPException(status_code=400, detail=f"El SKU '{taken[0].sku}' ya existe.")
+
+    to_insert = [
+        {
+            "product_id": product.id,
+            "sku": incoming[sku].sku,
+            "variant_name": incoming[sku].variant_name,
+            "price": incoming[sku].price,
+            "cost": incoming[sku].cost or main.cost,
+        }
+        for sku in new_skus
+    ]
+
+    # 2. Cambios: solo las columnas que realmente difieren
+    to_update = []
+    repriced = list(new_skus)
+    for sku, extra in incoming.items():
+        row = current.get(sku)
+        if row is None:
+            continue
+        changes = {}
+        if extra.variant_name != row.variant_name:
+            changes["variant_name"] = extra.variant_name
+        if _changed(row.price, extra.price):
+            changes["price"] = extra.price
+        new_cost = extra.cost or main.cost
+        if _changed(row.cost, new_cost):
+            changes["cost"] = new_cost
+        if "price" in changes or "cost" in changes:
+            repriced.append(sku)
+        if changes:
+            changes["id"] = row.id
+            to_update.append(changes)
+
+    # 3. Bajas: no borrar variantes con historial (ventas / kardex / precios; este último no se borra)
+    to_delete = [v.id for sku, v in current.items() if sku not in incoming]
+    if to_delete:
+        used = set(
+            r[0] for r in db.query(SalesLineItem.variant_id)
+            .filter(SalesLineItem.variant_id.in_(to_delete)).distinct()
+        )
+        used.update(
+            r[0] for r in db.query(InventoryMovement.variant_id)
+            .filter(InventoryMovement.variant_id.in_(to_delete)).distinct()
+        )
+        used.update(
+            r[0] for r in db.query(ProductPriceHistory.variant_id)
+            .filter(ProductPriceHistory.variant_id.in_(to_delete)).distinct()
+        )
+        if used:
+            skus = ", ".join(v.sku for v in current.values() if v.id in used)
+            raise HTTPException(
+                status_code=400,
+                detail=f"No se pueden eliminar variantes con movimientos o historial de precios: {skus}",
+            )
+
+        db.query(ProductPrice).filter(ProductPrice.variant_id.in_(to_delete)).delete(synchronize_session=False)
+        db.query(StockOnHand).filter(StockOnHand.variant_id.in_(to_delete)).delete(synchronize_session=False)
+        db.query(ProductVariant).filter(ProductVariant.id.in_(to_delete)).delete(synchronize_session=False)
+    if to_update:
+        db.bulk_update_mappings(ProductVariant, to_update)
+    if to_insert:
+        db.bulk_insert_mappings(ProductVariant, to_insert)
+    return repriced
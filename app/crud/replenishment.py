@@ -0,0 +1,152 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import type_coerce, Float
+from sqlalchemy.orm import Session
+
+from app.models import Branch, DailyVariantSales, ReplenishmentPlan
+from app.utils.business_date import branch_today
+
+HISTORY_DAYS = 84       # 12 semanas
+ALPHA = 0.2             # Suavizamiento exponencial del nivel
+LEAD_TIME_DAYS = 7      # Días entre pedir y recibir
+REVIEW_DAYS = 7         # Cada cuánto se revisa / pide
+SERVICE_Z = 1.65        # ~95% de nivel de servicio
+MIN_WEEKDAY_OBS = 4     # Observaciones mínimas de un día de la semana para confiar en su factor
+INSERT_BATCH = 5000
+
+
+def _demand_matrix(db: Session, branch_id: int, start: date, days: int):
+    """Matriz (variantes x días) de unidades netas vendidas, desde el acumulado diario."""
+    net_units = type_coerce(DailyVariantSales.units - DailyVariantSales.units_returned, Float)
+    rows = db.execute(
+        db.query(DailyVariantSales.variant_id, DailyVariantSales.business_date, net_units).filter(
+            DailyVariantSales.branch_id == branch_id,
+            DailyVariantSales.business_date >= start,
+            DailyVariantSales.business_date < start + timedelta(days=days),
+        ).statement
+    ).fetchall()
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.zeros((0, days))
+
+    variant_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    offsets = np.fromiter(((r[1] - start).days for r in rows), dtype=np.int64, count=len(rows))
+    units = np.fromiter((r[2] or 0.0 for r in rows), dtype=np.float64, count=len(rows))
+
+    series, index = np.unique(variant_ids, return_inverse=True)
+    matrix = np.zeros((len(series), days))
+    np.add.at(matrix, (index, offsets), units)
+    return series, np.clip(matrix, 0, None)
+
+
+def forecast(
+    matrix: np.ndarray,
+    start: date,
+    alpha: float = ALPHA,
+    lead_time_days: int = LEAD_TIME_DAYS,
+    review_days: int = REVIEW_DAYS,
+    service_z: float = SERVICE_Z,
+) -> dict:
+    """
+    Pronóstico vectorizado para todas las series a la vez (una fila por serie):
+    factores por día de la semana + suavizamiento exponencial simple sobre la serie
+    desestacionalizada. Devuelve arreglos por serie.
+    """
+    n_series, days = matrix.shape
+    weekdays = (start.weekday() + np.arange(days)) % 7
+
+    # 1. Estacionalidad semanal: promedio de cada día de la semana / promedio general.
+    #    Un factor 0 (p. ej. domingo cerrado) se conserva si hay historia suficiente de ese día;
+    #    solo con pocas observaciones se usa el neutro 1.0.
+    mean = matrix.mean(axis=1)
+    by_weekday = np.stack([matrix[:, weekdays == k].mean(axis=1) if (weekdays == k).any()
+                           else np.zeros(n_series) for k in range(7)], axis=1)
+    factors = np.divide(by_weekday, mean[:, None], out=np.ones_like(by_weekday), where=mean[:, None] > 0)
+    enough_history = np.bincount(weekdays, minlength=7) >= MIN_WEEKDAY_OBS
+    factors = np.where(enough_history[None, :], factors, 1.0)
+    factors /= factors.mean(axis=1, keepdims=True)
+
+    # 2. Suavizamiento exponencial sobre la serie sin estacionalidad (un paso por día).
+    #    Los días con factor 0 no aportan información del nivel y se saltan.
+    day_factors = factors[:, weekdays]
+    observed = day_factors > 0
+    deseasoned = np.divide(matrix, day_factors, out=np.zeros_like(matrix), where=observed)
+    warmup = min(7, days)
+    seen = observed[:, :warmup].sum(axis=1)
+    level = np.divide(deseasoned[:, :warmup].sum(axis=1), seen, out=np.zeros(n_series), where=seen > 0)
+    sq_error = np.zeros(n_series)
+    for t in range(warmup, days):
+        error = np.where(observed[:, t], deseasoned[:, t] - level, 0.0)
+        sq_error += error * error
+        level = level + alpha * error
+    steps = np.maximum(observed[:, warmup:].sum(axis=1), 1)
+    sigma = np.sqrt(sq_error / steps)
+
+    # 3. Demanda esperada en los próximos días (reaplicando el factor de cada día)
+    future = (start.weekday() + days + np.arange(lead_time_days + review_days)) % 7
+    daily = level[:, None] * factors[:, future]
+    lead_time_demand = daily[:, :lead_time_days].sum(axis=1)
+    review_demand = daily[:, lead_time_days:].sum(axis=1)
+
+    safety_stock = service_z * sigma * np.sqrt(lead_time_days)
+    reorder_point = lead_time_demand + safety_stock
+    return {
+        "avg_daily_demand": mean,
+        "forecast_daily": level,
+        "demand_std": sigma,
+        "lead_time_demand": lead_time_demand,
+        "safety_stock": safety_stock,
+        "reorder_point": reorder_point,
+        "order_up_to": reorder_point + review_demand,
+    }
+
+
+def run_replenishment(
+    db: Session,
+    branch_id: Optional[int] = None,
+    history_days: int = HISTORY_DAYS,
+    alpha: float = ALPHA,
+    lead_time_days: int = LEAD_TIME_DAYS,
+    review_days: int = REVIEW_DAYS,
+    service_z: float = SERVICE_Z,
+) -> dict:
+    """
+    Recalcula `replenishment_plans` de una sucursal (o todas) con las ventas de los
+    últimos `history_days` días completos. Reemplaza los renglones de la sucursal. No hace commit.
+    Devuelve {branch_id: variantes calculadas}.
+    """
+    branch_ids = [branch_id] if branch_id is not None else [b.id for b in db.query(Branch.id).order_by(Branch.id)]
+    computed_at = datetime.now(timezone.utc)
+    summary = {}
+
+    for b_id in branch_ids:
+        end = branch_today(db, b_id) - timedelta(days=1)
+        start = end - timedelta(days=history_days - 1)
+        series, matrix = _demand_matrix(db, b_id, start, history_days)
+
+        # Solo series con venta en la ventana
+        active = matrix.sum(axis=1) > 0
+        series, matrix = series[active], matrix[active]
+        result = forecast(matrix, start, alpha, lead_time_days, review_days, service_z)
+
+        db.query(ReplenishmentPlan).filter(ReplenishmentPlan.branch_id == b_id).delete(synchronize_session=False)
+        columns = {name: np.round(values, 3).tolist() for name, values in result.items()}
+        rows = [
+            {
+                "branch_id": b_id,
+                "variant_id": int(variant_id),
+                "history_start": start,
+                "history_end": end,
+                "lead_time_days": lead_time_days,
+                "review_days": review_days,
+                "computed_at": computed_at,
+                **{name: values[i] for name, values in columns.items()},
+            }
+            for i, variant_id in enumerate(series)
+        ]
+        for offset in range(0, len(rows), INSERT_BATCH):
+            db.bulk_insert_mappings(ReplenishmentPlan, rows[offset:offset + INSERT_BATCH])
+        summary[b_id] = len(rows)
+
+    return summary
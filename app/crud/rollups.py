@@ -0,0 +1,364 @@
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterable, Optional
+
+from sqlalchemy import insert, select, and_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.sql import func
+from sqlalchemy.orm import Session
+
+from app.models import (
+    SalesDocument, SalesLineItem, Payment, PaymentMethod,
+    DocumentType, DocumentStatus, SaleReturn, SaleReturnItem,
+    DailySales, DailyPayments, DailyVariantSales, HourlySales
+)
+from app.utils.business_date import business_date_for, branch_zone, to_local_hour
+from app.utils import report_cache, live_events
+
+ZERO = Decimal("0.00")
+
+# INSERT ... ON CONFLICT DO UPDATE por dialecto (el resto usa UPDATE y luego INSERT)
+UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def _dec(value) -> Decimal:
+    if value is None:
+        return ZERO
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def _bump(db: Session, model, key: dict, deltas: dict) -> None:
+    """
+    Suma `deltas` al renglón `key` (su llave primaria) del acumulado; si todavía no
+    existe, lo inserta. En una sola sentencia (upsert) para que dos primeras escrituras
+    simultáneas de la misma llave no choquen al insertar. Se ejecuta de inmediato.
+    """
+    upsert = UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if upsert is not None:
+        stmt = upsert(model).values(**key, **deltas)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=list(key),
+            set_={col: getattr(model, col) + stmt.excluded[col] for col in deltas},
+        ))
+        return
+
+    updated = (
+        db.query(model)
+        .filter_by(**key)
+        .update({getattr(model, col): getattr(model, col) + delta for col, delta in deltas.items()},
+                synchronize_session=False)
+    )
+    if not updated:
+        db.execute(insert(model).values(**key, **deltas))
+
+
+def sale_unit_costs():
+    """
+    Subconsulta (document_id, variant_id, unit_cost): costo unitario promedio con que
+    se vendió cada variante en cada venta. Con él se valúa lo devuelto.
+    """
+    line_cost = func.coalesce(SalesLineItem.unit_cost, 0) * SalesLineItem.quantity
+    return select(
+        SalesLineItem.document_id,
+        SalesLineItem.variant_id,
+        (func.sum(line_cost) * 1.0 / func.nullif(func.sum(SalesLineItem.quantity), 0)).label("unit_cost"),
+    ).group_by(SalesLineItem.document_id, SalesLineItem.variant_id).subquery()
+
+
+def _doc_date(db: Session, doc: SalesDocument) -> date:
+    return doc.business_date or business_date_for(db, doc.branch_id, doc.created_at)
+
+
+# -----------------------------
+# Mantenimiento incremental
+# -----------------------------
+def apply_sale(
+    db: Session,
+    doc: SalesDocument,
+    lines: Iterable[SalesLineItem],
+    payments: Iterable[Payment],
+    sign: int = 1,
+) -> None:
+    """
+    Suma (sign=1) o resta (sign=-1, cancelación) una venta en los acumulados diarios.
+    Solo cuentan tickets (INVOICE); las cotizaciones no afectan los reportes.
+    No hace commit: viaja con la transacción de la venta, y al confirmarse se
+    invalidan los reportes cacheados de esa sucursal y día y se publica el delta
+    en el canal en vivo de la sucursal.
+    """
+    if doc.doc_type != DocumentType.INVOICE:
+        return
+
+    day = _doc_date(db, doc)
+    key = {"branch_id": doc.branch_id, "business_date": day}
+    report_cache.invalidate_on_commit(db, doc.branch_id, day)
+
+    units = 0.0
+    total_cost = ZERO
+    by_variant = defaultdict(lambda: [0.0, ZERO, ZERO])  # units, revenue, cost
+    for line in lines:
+        qty = float(line.quantity or 0)
+        cost = _dec(line.unit_cost) * _dec(line.quantity)
+        units += qty
+        total_cost += cost
+        acc = by_variant[line.variant_id]
+        acc[0] += qty
+        acc[1] += _dec(line.total_line)
+        acc[2] += cost
+
+    _bump(db, DailySales, key, {
+        "tickets_count": sign,
+        "total_amount": sign * _dec(doc.total_amount),
+        "total_cost": sign * total_cost,
+        "units": sign * units,
+    })
+
+    for variant_id, (qty, revenue, cost) in by_variant.items():
+        _bump(db, DailyVariantSales, {**key, "variant_id": variant_id}, {
+            "units": sign * qty,
+            "revenue": sign * revenue,
+            "cost": sign * cost,
+        })
+
+    # Hora local en que se hizo el ticket (la cancelación resta en la misma hora)
+    _bump(db, HourlySales, {**key, "hour": to_local_hour(doc.created_at, branch_zone(db, doc.branch_id))}, {
+        "tickets_count": sign,
+        "total_amount": sign * _dec(doc.total_amount),
+        "units": sign * units,
+    })
+
+    by_method = defaultdict(lambda: [0, ZERO])  # (día, método) -> count, amount
+    for payment in payments:
+        acc = by_method[(payment.business_date or day, PaymentMethod(payment.method))]
+        acc[0] += 1
+        acc[1] += _dec(payment.amount)
+
+    for (pay_day, method), (count, amount) in by_method.items():
+        if pay_day != day:
+            report_cache.invalidate_on_commit(db, doc.branch_id, pay_day)
+        _bump(db, DailyPayments,
+              {"branch_id": doc.branch_id, "business_date": pay_day, "method": method},
+              {"payments_count": sign * count, "amount": sign * amount})
+
+    payments_delta = defaultdict(float)
+    for (_, method), (_, amount) in by_method.items():
+        payments_delta[method.value] += float(sign * amount)
+    live_events.publish_on_commit(db, doc.branch_id, {
+        "type": "sale" if sign > 0 else "cancel",
+        "business_date": day.isoformat(),
+        "sale_id": doc.id,
+        "folio": f"{doc.series}-{doc.folio}" if doc.series else str(doc.folio or doc.id),
+        "seller_id": doc.seller_id,
+        "customer_name": doc.customer.name if doc.customer_id and doc.customer else None,
+        "status": doc.status.value if doc.status else None,
+        "tickets": sign,
+        "total": float(sign * _dec(doc.total_amount)),
+        "units": sign * units,
+        "payments": dict(payments_delta),
+    })
+
+
+def apply_return(db: Session, sale_return: SaleReturn, items: Iterable[SaleReturnItem]) -> None:
+    """Registra una devolución en el día de negocio en que se hizo (no el de la venta)."""
+    key = {"branch_id": sale_return.branch_id, "business_date": sale_return.business_date}
+    report_cache.invalidate_on_commit(db, sale_return.branch_id, sale_return.business_date)
+
+    _bump(db, DailySales, key, {
+        "returns_count": 1,
+        "returns_amount": _dec(sale_return.total_refunded),
+    })
+
+    live_events.publish_on_commit(db, sale_return.branch_id, {
+        "type": "return",
+        "business_date": sale_return.business_date.isoformat() if sale_return.business_date else None,
+        "return_id": sale_return.id,
+        "sale_id": sale_return.sale_id,
+        "amount": float(_dec(sale_return.total_refunded)),
+    })
+
+    by_variant = defaultdict(lambda: [ZERO, ZERO])
+    for item in items:
+        acc = by_variant[item.variant_id]
+        acc[0] += _dec(item.quantity)
+        acc[1] += _dec(item.refund_amount)
+
+    costs = sale_unit_costs()
+    unit_costs = dict(db.execute(
+        select(costs.c.variant_id, costs.c.unit_cost).where(
+            costs.c.document_id == sale_return.sale_id,
+            costs.c.variant_id.in_(list(by_variant)),
+        )
+    ).all()) if by_variant else {}
+
+    for variant_id, (qty, refund) in by_variant.items():
+        _bump(db, DailyVariantSales, {**key, "variant_id": variant_id}, {
+            "units_returned": float(qty),
+            "refunds": refund,
+            "cost_returned": (qty * _dec(unit_costs.get(variant_id))).quantize(ZERO),
+        })
+
+
+# -----------------------------
+# Reconstrucción completa
+# -----------------------------
+def rebuild_rollups(
+    db: Session,
+    branch_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> dict:
+    """
+    Recalcula los acumulados desde ventas, pagos y devoluciones con consultas agrupadas.
+    Borra primero el rango (sucursal / fechas inclusivas) y lo vuelve a llenar. No hace commit.
+    """
+    def in_range(query, branch_col, date_col):
+        if branch_id is not None:
+            query = query.filter(branch_col == branch_id)
+        if start is not None:
+            query = query.filter(date_col >= start)
+        if end is not None:
+            query = query.filter(date_col <= end)
+        return query
+
+    for model in (DailySales, DailyPayments, DailyVariantSales, HourlySales):
+        in_range(db.query(model), model.branch_id, model.business_date).delete(synchronize_session=False)
+
+    valid_sale = (
+        SalesDocument.doc_type == DocumentType.INVOICE,
+        SalesDocument.status != DocumentStatus.CANCELLED,
+    )
+    line_cost = func.coalesce(SalesLineItem.unit_cost, 0) * SalesLineItem.quantity
+
+    # 1. Totales por día
+    daily = {}
+    tickets = in_range(
+        db.query(
+            SalesDocument.branch_id, SalesDocument.business_date,
+            func.count(SalesDocument.id), func.sum(SalesDocument.total_amount),
+        ).filter(*valid_sale),
+        SalesDocument.branch_id, SalesDocument.business_date,
+    ).group_by(SalesDocument.branch_id, SalesDocument.business_date)
+    for b, d, count, total in tickets:
+        daily[(b, d)] = {
+            "branch_id": b, "business_date": d,
+            "tickets_count": count, "total_amount": _dec(total),
+            "total_cost": ZERO, "units": 0.0,
+            "returns_count": 0, "returns_amount": ZERO,
+        }
+
+    # 2. Por variante (y costo/unidades del día)
+    variants = {}
+    line_rows = in_range(
+        db.query(
+            SalesDocument.branch_id, SalesDocument.business_date, SalesLineItem.variant_id,
+            func.sum(SalesLineItem.quantity), func.sum(SalesLineItem.total_line), func.sum(line_cost),
+        ).join(SalesLineItem, SalesLineItem.document_id == SalesDocument.id).filter(*valid_sale),
+        SalesDocument.branch_id, SalesDocument.business_date,
+    ).group_by(SalesDocument.branch_id, SalesDocument.business_date, SalesLineItem.variant_id)
+    for b, d, v, qty, revenue, cost in line_rows:
+        variants[(b, d, v)] = {
+            "branch_id": b, "business_date": d, "variant_id": v,
+            "units": float(qty or 0), "revenue": _dec(revenue), "cost": _dec(cost),
+            "units_returned": 0.0, "refunds": ZERO, "cost_returned": ZERO,
+        }
+        day = daily.get((b, d))
+        if day:
+            day["units"] += float(qty or 0)
+            day["total_cost"] += _dec(cost)
+
+    # 3. Por hora local: se agrupa por hora UTC (truncada) y cada cubeta se pasa a la
+    # hora local de la sucursal; a lo más 24 cubetas por día, no un renglón por ticket
+    hourly = {}
+    utc_hour = func.strftime("%Y-%m-%d %H:00:00", SalesDocument.created_at)
+    hour_rows = in_range(
+        db.query(
+            SalesDocument.branch_id, SalesDocument.business_date, utc_hour,
+            func.count(SalesDocument.id), func.sum(SalesDocument.total_amount),
+        ).filter(*valid_sale, SalesDocument.created_at.isnot(None)),
+        SalesDocument.branch_id, SalesDocument.business_date,
+    ).group_by(SalesDocument.branch_id, SalesDocument.business_date, utc_hour)
+    for b, d, ts, count, total in hour_rows:
+        if d is None:
+            continue
+        hour = to_local_hour(datetime.fromisoformat(ts), branch_zone(db, b))
+        row = hourly.setdefault((b, d, hour), {
+            "branch_id": b, "business_date": d, "hour": hour,
+            "tickets_count": 0, "total_amount": ZERO, "units": 0.0,
+        })
+        row["tickets_count"] += count
+        row["total_amount"] += _dec(total)
+
+    hour_units = in_range(
+        db.query(
+            SalesDocument.branch_id, SalesDocument.business_date, utc_hour, func.sum(SalesLineItem.quantity),
+        ).join(SalesLineItem, SalesLineItem.document_id == SalesDocument.id)
+        .filter(*valid_sale, SalesDocument.created_at.isnot(None)),
+        SalesDocument.branch_id, SalesDocument.business_date,
+    ).group_by(SalesDocument.branch_id, SalesDocument.business_date, utc_hour)
+    for b, d, ts, qty in hour_units:
+        row = hourly.get((b, d, to_local_hour(datetime.fromisoformat(ts), branch_zone(db, b))))
+        if row:
+            row["units"] += float(qty or 0)
+
+    # 4. Devoluciones (en el día en que se registraron)
+    returns = in_range(
+        db.query(
+            SaleReturn.branch_id, SaleReturn.business_date,
+            func.count(SaleReturn.id), func.sum(SaleReturn.total_refunded),
+        ).filter(SaleReturn.business_date.isnot(None)),
+        SaleReturn.branch_id, SaleReturn.business_date,
+    ).group_by(SaleReturn.branch_id, SaleReturn.business_date)
+    for b, d, count, total in returns:
+        day = daily.setdefault((b, d), {
+            "branch_id": b, "business_date": d,
+            "tickets_count": 0, "total_amount": ZERO, "total_cost": ZERO, "units": 0.0,
+            "returns_count": 0, "returns_amount": ZERO,
+        })
+        day["returns_count"] = count
+        day["returns_amount"] = _dec(total)
+
+    costs = sale_unit_costs()
+    returned = in_range(
+        db.query(
+            SaleReturn.branch_id, SaleReturn.business_date, SaleReturnItem.variant_id,
+            func.sum(SaleReturnItem.quantity), func.sum(SaleReturnItem.refund_amount),
+            func.sum(SaleReturnItem.quantity * func.coalesce(costs.c.unit_cost, 0)),
+        ).join(SaleReturnItem, SaleReturnItem.return_id == SaleReturn.id)
+        .outerjoin(costs, and_(costs.c.document_id == SaleReturn.sale_id,
+                               costs.c.variant_id == SaleReturnItem.variant_id))
+        .filter(SaleReturn.business_date.isnot(None)),
+        SaleReturn.branch_id, SaleReturn.business_date,
+    ).group_by(SaleReturn.branch_id, SaleReturn.business_date, SaleReturnItem.variant_id)
+    for b, d, v, qty, refund, returned_cost in returned:
+        row = variants.setdefault((b, d, v), {
+            "branch_id": b, "business_date": d, "variant_id": v,
+            "units": 0.0, "revenue": ZERO, "cost": ZERO,
+            "units_returned": 0.0, "refunds": ZERO, "cost_returned": ZERO,
+        })
+        row["units_returned"] = float(qty or 0)
+        row["refunds"] = _dec(refund)
+        row["cost_returned"] = _dec(returned_cost).quantize(ZERO)
+
+    # 5. Cobros por método (día del pago, sucursal de la venta)
+    payments = [
+        {"branch_id": b, "business_date": d, "method": m, "payments_count": count, "amount": _dec(total)}
+        for b, d, m, count, total in in_range(
+            db.query(
+                SalesDocument.branch_id, Payment.business_date, Payment.method,
+                func.count(Payment.id), func.sum(Payment.amount),
+            ).join(SalesDocument, SalesDocument.id == Payment.sales_document_id).filter(*valid_sale),
+            SalesDocument.branch_id, Payment.business_date,
+        ).group_by(SalesDocument.branch_id, Payment.business_date, Payment.method)
+        if d is not None and m is not None
+    ]
+
+    daily_rows = [r for r in daily.values() if r["business_date"] is not None]
+    variant_rows = [r for r in variants.values() if r["business_date"] is not None]
+    db.bulk_insert_mappings(DailySales, daily_rows)
+    db.bulk_insert_mappings(DailyVariantSales, variant_rows)
+    db.bulk_insert_mappings(DailyPayments, payments)
+    db.bulk_insert_mappings(HourlySales, list(hourly.values()))
+
+    return {"daily_sales": len(daily_rows), "daily_variant_sales": len(variant_rows),
+            "daily_payments": len(payments), "hourly_sales": len(hourly)}
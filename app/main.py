@@ -6,16 +6,22 @@ from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime, timezone
 
 
-from app.database import engine
+from app.database import engine, SessionLocal
 from app.models import Base 
+from app.utils import ref_cache
+from app.utils.schema_check import check_schema
 from app.routers import (
     auth, users, branches, departments, products, 
     inventory, sales, cash, customers, reports,
-    printer, returns, documents, quotes, organization
+    printer, returns, documents, quotes, organization,
+    events, analytics, consolidated
 )
 
 # 1. CREACIÓN AUTOMÁTICA DE TABLAS
 Base.metadata.create_all(bind=engine)
+check_schema(engine)  # Base anterior sin migrar: detener con la instrucción para migrar
+with SessionLocal() as _db:
+    ref_cache.seed_versions(_db)  # Sellos de versión de los catálogos cacheados
 
 app = FastAPI(
     title="Atlas ERP & POS",
@@ -55,7 +61,10 @@ app.include_router(quotes.router, prefix="/api/quotes", tags=["📄 Cotizaciones
 app.include_router(customers.router, prefix="/api/customers", tags=["👥 Clientes (CRM)"])
 app.include_router(documents.router, prefix="/api/documents", tags=["📄 Documentos"])
 app.include_router(reports.router, prefix="/api/reports", tags=["📊 Reportes & Auditoría"])
+app.include_router(analytics.router, prefix="/api/reports/analytics", tags=["📈 Analítica (DuckDB)"])
+app.include_router(consolidated.router, prefix="/api/reports/consolidated", tags=["🏬 Reportes Consolidados"])
 app.include_router(printer.router, prefix="/api/printer", tags=["🖨️ Hardware / Impresora"])
+app.include_router(events.router, prefix="/api/events", tags=["📡 Eventos en vivo"])
 
 # --- 5. RUTAS DE NAVEGACIÓN (FRONTEND) ---
 
@@ -18,9 +18,10 @@ from .products import (
     Brand, 
     Category, 
     UnitOfMeasure, 
-    ProductPrice  # <--- Nuevo
+    ProductPrice,  # <--- Nuevo
+    ProductPriceHistory
 )
-from .inventory import InventoryMovement, MovementType, StockOnHand
+from .inventory import InventoryMovement, MovementType, StockOnHand, ReplenishmentPlan
 
 # 5. Ventas y Caja
 from .sales import (
@@ -35,11 +36,18 @@ from .sales import (
 from .cash import (
     CashSession,
     CashSessionStatus,
-    CashMovement
+    CashMovement,
+    CashCutSnapshot
 )
 
 # 6. Clientes
-from .crm import Customer, CustomerLedgerEntry
+from .crm import Customer, CustomerLedgerEntry, CustomerRFM
 # (Si cambiaste el nombre del archivo a 'customers.py', cambia '.crm' por '.customers')
 
-from .returns import SaleReturn, SaleReturnItem
\ No newline at end of file
+from .returns import SaleReturn, SaleReturnItem
+
+# Acumulados diarios para reportes
+from .rollups import DailySales, DailyPayments, DailyVariantSales, HourlySales
+
+# 7. Infraestructura (versiones de caché)
+from .cache import CacheVersion
\ No newline at end of file
@@ -0,0 +1,17 @@
+# app/models/cache.py
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from app.database import Base
+
+class CacheVersion(Base):
+    """
+    Sello de versión por catálogo cacheado (branches, departments, organization...).
+    Cada escritura incrementa `version`; los workers comparan contra su copia local
+    para saber cuándo recargar.
+    """
+    __tablename__ = "cache_versions"
+    __table_args__ = {'extend_existing': True}
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
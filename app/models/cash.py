@@ -1,6 +1,6 @@
 # app/models/cash.py
 import enum
-from sqlalchemy import Column, Integer, String, DateTime, Numeric, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, Numeric, ForeignKey, Enum, Index, JSON, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -11,10 +11,14 @@ class CashSessionStatus(str, enum.Enum):
 
 class CashSession(Base):
     __tablename__ = "cash_sessions"
+    __table_args__ = (
+        Index("ix_cash_sessions_user_status", "user_id", "status"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     branch_id = Column(Integer, ForeignKey("branches.id"), nullable=False)
+    terminal = Column(String(50), nullable=True)  # Caja / equipo donde se abrió el turno
     
     # Tiempos de operación
     opened_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -26,6 +30,16 @@ class CashSession(Base):
     
     total_cash_sales = Column(Numeric(10, 2), default=0.00)
     difference = Column(Numeric(10, 2), default=0.00)      # Faltante o sobrante
+
+    # Acumulados del turno: se actualizan en la misma transacción de la venta,
+    # la cancelación y el movimiento de caja (ver app/crud/cash.py)
+    sales_cash = Column(Numeric(12, 2), default=0, nullable=False)
+    sales_card = Column(Numeric(12, 2), default=0, nullable=False)
+    sales_transfer = Column(Numeric(12, 2), default=0, nullable=False)
+    sales_other = Column(Numeric(12, 2), default=0, nullable=False)
+    payments_count = Column(Integer, default=0, nullable=False)
+    inflows = Column(Numeric(12, 2), default=0, nullable=False)
+    outflows = Column(Numeric(12, 2), default=0, nullable=False)
     
     status = Column(Enum(CashSessionStatus), default=CashSessionStatus.OPEN)
     notes = Column(String, nullable=True)
@@ -33,6 +47,7 @@ class CashSession(Base):
     # Relaciones
     user = relationship("User")
     movements = relationship("CashMovement", back_populates="session")
+    cut = relationship("CashCutSnapshot", uselist=False, viewonly=True)
 
 class CashMovement(Base):
     __tablename__ = "cash_movements"
@@ -45,4 +60,44 @@ class CashMovement(Base):
     reason = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    session = relationship("CashSession", back_populates="movements")
\ No newline at end of file
+    session = relationship("CashSession", back_populates="movements")
+
+
+class CashCutSnapshot(Base):
+    """
+    Corte de caja congelado al cerrar el turno (ver app/crud/cash.py).
+    PDF, ticket, impresión ESC/POS e historial lo leen tal cual; no se modifica.
+    """
+    __tablename__ = "cash_cut_snapshots"
+
+    session_id = Column(Integer, ForeignKey("cash_sessions.id"), primary_key=True)
+    branch_id = Column(Integer, ForeignKey("branches.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    branch_name = Column(String, nullable=True)
+    cashier_name = Column(String, nullable=True)
+    terminal = Column(String(50), nullable=True)
+
+    opened_at = Column(DateTime(timezone=True), nullable=True)
+    closed_at = Column(DateTime(timezone=True), nullable=True)
+
+    opening_balance = Column(Numeric(12, 2), nullable=False, default=0)
+    sales_cash = Column(Numeric(12, 2), nullable=False, default=0)
+    sales_card = Column(Numeric(12, 2), nullable=False, default=0)
+    sales_transfer = Column(Numeric(12, 2), nullable=False, default=0)
+    sales_other = Column(Numeric(12, 2), nullable=False, default=0)
+    payments_count = Column(Integer, nullable=False, default=0)
+    inflows = Column(Numeric(12, 2), nullable=False, default=0)
+    outflows = Column(Numeric(12, 2), nullable=False, default=0)
+    expected = Column(Numeric(12, 2), nullable=False, default=0)    # Esperado en caja
+    closing_balance = Column(Numeric(12, 2), nullable=True)         # Contado por el cajero
+    difference = Column(Numeric(12, 2), nullable=True)              # Faltante o sobrante
+
+    by_method = Column(JSON, nullable=False, default=dict)   # {"CASH": {"count", "amount"}, ...}
+    movements = Column(JSON, nullable=False, default=list)   # [{"created_at", "type", "amount", "reason"}, ...]
+    notes = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+@event.listens_for(CashCutSnapshot, "before_update")
+def _cash_cut_is_immutable(mapper, connection, target):
+    raise ValueError(f"El corte de caja #{target.session_id} ya se cerró y no puede modificarse")
@@ -1,5 +1,5 @@
 # app/models/crm.py
-from sqlalchemy import Column, Integer, String, Boolean, Numeric, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, Numeric, ForeignKey, DateTime, Index, Float, Date
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 # --- CORRECCIÓN CRÍTICA: Usar la Base de app.database ---
@@ -34,6 +34,8 @@ class Customer(Base):
     
     # Relación con sus movimientos financieros
     ledger_entries = relationship("CustomerLedgerEntry", back_populates="customer")
+    # Segmentación RFM (se recalcula en lote, ver crud.crm.refresh_customer_rfm)
+    rfm = relationship("CustomerRFM", uselist=False, viewonly=True)
 
 class CustomerLedgerEntry(Base):
     """
@@ -42,7 +44,10 @@ class CustomerLedgerEntry(Base):
     Negativo (-) = Deuda baja (Pago/Abono)
     """
     __tablename__ = "customer_ledger_entries"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        Index("ix_customer_ledger_customer_created", "customer_id", "created_at"),
+        {'extend_existing': True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(Integer, ForeignKey("customers.id"), nullable=False)
@@ -50,6 +55,34 @@ class CustomerLedgerEntry(Base):
     
     amount = Column(Numeric(10, 2), nullable=False)
     description = Column(String, nullable=True)
+    entry_type = Column(String, nullable=True) # Ej: DEBT, PAYMENT, CANCELLATION
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
-    customer = relationship("Customer", back_populates="ledger_entries")
\ No newline at end of file
+    customer = relationship("Customer", back_populates="ledger_entries")
+
+
+class CustomerRFM(Base):
+    """
+    Recencia / Frecuencia / Monto por cliente y su segmento.
+    Tabla de resultados: se reemplaza completa al recalcular; las pantallas solo la leen.
+    """
+    __tablename__ = "customer_rfm"
+    __table_args__ = {'extend_existing': True}
+
+    customer_id = Column(Integer, ForeignKey("customers.id"), primary_key=True)
+
+    first_purchase = Column(Date, nullable=False)
+    last_purchase = Column(Date, nullable=False)
+    recency_days = Column(Integer, nullable=False)       # Días desde la última compra
+    frequency = Column(Integer, nullable=False)          # Tickets en la ventana
+    monetary = Column(Float, default=0, nullable=False)  # Venta total (valor histórico del cliente)
+    avg_ticket = Column(Float, default=0, nullable=False)
+
+    # Calificaciones 1-5 por quintiles (5 = mejor)
+    r_score = Column(Integer, nullable=False)
+    f_score = Column(Integer, nullable=False)
+    m_score = Column(Integer, nullable=False)
+    rfm_score = Column(String(3), nullable=False)        # Ej. "545"
+    segment = Column(String, index=True, nullable=False)
+
+    computed_at = Column(DateTime(timezone=True), server_default=func.now())
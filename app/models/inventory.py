@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Enum, Numeric, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, Enum, Numeric, DateTime, Float, Date
 from sqlalchemy.sql import func
 from app.database import Base
 import enum
@@ -10,6 +10,8 @@ class MovementType(str, enum.Enum):
     ADJUSTMENT_OUT = "ADJUSTMENT_OUT"# Ajuste Inventario (-)
     TRANSFER_IN = "TRANSFER_IN"
     TRANSFER_OUT = "TRANSFER_OUT"
+    SALE_RETURN = "SALE_RETURN"      # Entrada por Cancelación de Venta
+    RETURN_IN = "RETURN_IN"          # Entrada por Devolución
 
 class InventoryMovement(Base):
     __tablename__ = "inventory_movements"
@@ -45,4 +47,31 @@ class StockOnHand(Base):
 
     from sqlalchemy.orm import relationship
     branch = relationship("Branch")
-    variant = relationship("ProductVariant", backref="stock_levels")
\ No newline at end of file
+    variant = relationship("ProductVariant", backref="stock_levels")
+
+class ReplenishmentPlan(Base):
+    """
+    Pronóstico de demanda y punto de reorden por sucursal y variante.
+    Lo llena el proceso batch (run_replenishment.py); el endpoint solo lo lee.
+    """
+    __tablename__ = "replenishment_plans"
+    __table_args__ = {'extend_existing': True}
+
+    branch_id = Column(Integer, ForeignKey("branches.id"), primary_key=True)
+    variant_id = Column(Integer, ForeignKey("product_variants.id"), primary_key=True)
+
+    history_start = Column(Date, nullable=False)   # Ventana de ventas usada
+    history_end = Column(Date, nullable=False)
+
+    avg_daily_demand = Column(Float, default=0, nullable=False)  # Promedio simple de la ventana
+    forecast_daily = Column(Float, default=0, nullable=False)    # Nivel suavizado (sin estacionalidad)
+    demand_std = Column(Float, default=0, nullable=False)        # Desviación diaria del error de pronóstico
+
+    lead_time_days = Column(Integer, nullable=False)
+    review_days = Column(Integer, nullable=False)
+    lead_time_demand = Column(Float, default=0, nullable=False)
+    safety_stock = Column(Float, default=0, nullable=False)
+    reorder_point = Column(Float, default=0, nullable=False)
+    order_up_to = Column(Float, default=0, nullable=False)       # Nivel objetivo al pedir
+
+    computed_at = Column(DateTime(timezone=True), server_default=func.now())
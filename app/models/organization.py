@@ -12,6 +12,7 @@ class Branch(Base):
     address = Column(String, nullable=True)
     phone = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
+    timezone = Column(String, default="America/Mexico_City") # Zona IANA para el día de negocio
 
     # ESTA LÍNEA ES LA QUE FALTA:
     users = relationship("User", back_populates="branch")
@@ -1,6 +1,7 @@
 # app/models/products.py
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Numeric
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Numeric, DateTime, JSON, Index
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
 
 # --- CORRECCIÓN CRÍTICA ---
 # Debe ser 'app.database' para que init_db reconozca las tablas
@@ -81,4 +82,28 @@ class ProductPrice(Base):
 
     variant = relationship("ProductVariant", back_populates="prices")
 
+# --- HISTORIAL DE PRECIOS (solo inserción) ---
+class ProductPriceHistory(Base):
+    """
+    Foto del precio/costo de una variante a partir de `effective_at`.
+    Cada cambio de precio agrega un renglón; nunca se actualiza ni se borra.
+    El valor vigente en un instante T es el último renglón con effective_at <= T.
+    """
+    __tablename__ = "product_price_history"
+    __table_args__ = (
+        Index("ix_price_history_variant_effective", "variant_id", "effective_at"),
+        {'extend_existing': True},
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    variant_id = Column(Integer, ForeignKey("product_variants.id"), nullable=False)
+
+    price = Column(Numeric(10, 2), nullable=True)
+    cost = Column(Numeric(10, 2), nullable=True)
+    tiers = Column(JSON, nullable=True) # [{"price_name", "min_quantity", "unit_price"}, ...]
+
+    source = Column(String, nullable=True) # Ej: "REPRICE", "EDIT", "UPLOAD", "PURCHASE"
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    effective_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
 # --- STOCK ---
\ No newline at end of file
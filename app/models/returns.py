@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Numeric
+from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey, Numeric
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -14,6 +14,7 @@ class SaleReturn(Base):
     total_refunded = Column(Numeric(10, 2), nullable=False)
     reason = Column(String, nullable=False) # Ej: Defectuoso, Error de cliente
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    business_date = Column(Date, nullable=True, index=True) # Día local de la sucursal (para reportes)
 
     # Relaciones
     sale = relationship("SalesDocument")
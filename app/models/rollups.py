@@ -0,0 +1,70 @@
+# app/models/rollups.py
+from sqlalchemy import Column, Integer, Float, ForeignKey, Date, Enum, Numeric
+from app.database import Base
+from .sales import PaymentMethod
+
+
+class DailySales(Base):
+    """
+    Acumulado diario por sucursal (día de negocio).
+    Se actualiza dentro de la misma transacción de venta, cancelación y devolución;
+    los KPIs de periodo leen estos renglones en vez de recorrer las ventas.
+    """
+    __tablename__ = "daily_sales"
+    __table_args__ = {'extend_existing': True}
+
+    branch_id = Column(Integer, ForeignKey("branches.id"), primary_key=True)
+    business_date = Column(Date, primary_key=True)
+
+    tickets_count = Column(Integer, default=0, nullable=False)
+    total_amount = Column(Numeric(12, 2), default=0, nullable=False)
+    total_cost = Column(Numeric(12, 2), default=0, nullable=False)
+    units = Column(Float, default=0, nullable=False)
+
+    returns_count = Column(Integer, default=0, nullable=False)
+    returns_amount = Column(Numeric(12, 2), default=0, nullable=False)
+
+
+class DailyPayments(Base):
+    """Cobrado por día de negocio y método de pago (solo pagos de ventas)."""
+    __tablename__ = "daily_payments"
+    __table_args__ = {'extend_existing': True}
+
+    branch_id = Column(Integer, ForeignKey("branches.id"), primary_key=True)
+    business_date = Column(Date, primary_key=True)
+    method = Column(Enum(PaymentMethod), primary_key=True)
+
+    payments_count = Column(Integer, default=0, nullable=False)
+    amount = Column(Numeric(12, 2), default=0, nullable=False)
+
+
+class DailyVariantSales(Base):
+    """Unidades, venta y costo por día de negocio y variante."""
+    __tablename__ = "daily_variant_sales"
+    __table_args__ = {'extend_existing': True}
+
+    branch_id = Column(Integer, ForeignKey("branches.id"), primary_key=True)
+    business_date = Column(Date, primary_key=True)
+    variant_id = Column(Integer, ForeignKey("product_variants.id"), primary_key=True)
+
+    units = Column(Float, default=0, nullable=False)
+    revenue = Column(Numeric(12, 2), default=0, nullable=False)
+    cost = Column(Numeric(12, 2), default=0, nullable=False)
+
+    units_returned = Column(Float, default=0, nullable=False)
+    refunds = Column(Numeric(12, 2), default=0, nullable=False)
+    cost_returned = Column(Numeric(12, 2), default=0, nullable=False)  # Costo de lo devuelto (unit_cost de la venta)
+
+
+class HourlySales(Base):
+    """Tickets y venta por día de negocio y hora local de la sucursal (mapa de calor)."""
+    __tablename__ = "hourly_sales"
+    __table_args__ = {'extend_existing': True}
+
+    branch_id = Column(Integer, ForeignKey("branches.id"), primary_key=True)
+    business_date = Column(Date, primary_key=True)
+    hour = Column(Integer, primary_key=True)  # 0-23, hora local
+
+    tickets_count = Column(Integer, default=0, nullable=False)
+    total_amount = Column(Numeric(12, 2), default=0, nullable=False)
+    units = Column(Float, default=0, nullable=False)
@@ -1,5 +1,5 @@
 import enum
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Enum, Numeric
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Date, Enum, Numeric, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -29,7 +29,16 @@ class CashSessionStatus(str, enum.Enum):
 # --- Modelo 1: Encabezado de Venta ---
 class SalesDocument(Base):
     __tablename__ = "sales_documents"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        Index("ix_sales_documents_branch_business_date", "branch_id", "business_date"),
+        Index("ix_sales_documents_seller_created", "seller_id", "created_at"),
+        # Índices parciales: solo ventas a crédito con saldo abierto
+        Index("ix_sales_documents_open_customer", "customer_id", "created_at",
+              sqlite_where=text("balance_due > 0"), postgresql_where=text("balance_due > 0")),
+        Index("ix_sales_documents_open_due", "due_date",
+              sqlite_where=text("balance_due > 0"), postgresql_where=text("balance_due > 0")),
+        {'extend_existing': True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     
@@ -47,8 +56,13 @@ class SalesDocument(Base):
     tax_amount = Column(Numeric(10, 2), default=0.00)
     total_amount = Column(Numeric(10, 2), default=0.00)
     
+    # Crédito: saldo pendiente de esta venta (abonos aplicados FIFO) y vencimiento
+    balance_due = Column(Numeric(10, 2), default=0.00)
+    due_date = Column(Date, nullable=True)
+    
     notes = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    business_date = Column(Date, nullable=True) # Día local de la sucursal (para reportes)
     
     # Relaciones
     branch = relationship("Branch")
@@ -64,7 +78,7 @@ class SalesLineItem(Base):
     __table_args__ = {'extend_existing': True}
 
     id = Column(Integer, primary_key=True, index=True)
-    document_id = Column(Integer, ForeignKey("sales_documents.id"), nullable=False)
+    document_id = Column(Integer, ForeignKey("sales_documents.id"), nullable=False, index=True)
     variant_id = Column(Integer, ForeignKey("product_variants.id"), nullable=False)
     
     description = Column(String) 
@@ -79,7 +93,10 @@ class SalesLineItem(Base):
 # --- Modelo 3: Pagos (¡ESTE FALTABA!) ---
 class Payment(Base):
     __tablename__ = "payments"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        Index("ix_payments_cash_session_method", "cash_session_id", "method"),
+        {'extend_existing': True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     
@@ -87,11 +104,15 @@ class Payment(Base):
     sales_document_id = Column(Integer, ForeignKey("sales_documents.id"), nullable=True)
     customer_id = Column(Integer, ForeignKey("customers.id"), nullable=True)
     created_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    # Turno de caja abierto (y terminal) al momento de cobrar
+    cash_session_id = Column(Integer, ForeignKey("cash_sessions.id"), nullable=True)
+    terminal = Column(String(50), nullable=True)
     
     amount = Column(Numeric(10, 2), nullable=False)
     method = Column(Enum(PaymentMethod), default=PaymentMethod.CASH)
     reference = Column(String, nullable=True) # Referencia bancaria / Folio
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    business_date = Column(Date, nullable=True, index=True) # Día local de la sucursal (para reportes)
 
     sales_document = relationship("SalesDocument", back_populates="payments")
\ No newline at end of file
@@ -260,46 +260,48 @@ class PosPrinter:
         
         return raw
 
-    def print_cash_cut(self, session, cashier_name: str, branch_name: str, sales_cash: Decimal, inflows: Decimal, outflows: Decimal) -> bool:
+    def print_cash_cut(self, cut) -> bool:
         """
-        Imprime el corte de caja.
+        Imprime el corte de caja (CashCutSnapshot: congelado al cerrar el turno).
         """
-        raw = self._build_cash_cut_raw(session, cashier_name, branch_name, sales_cash, inflows, outflows)
+        raw = self._build_cash_cut_raw(cut)
 
         if IS_WINDOWS:
             if not win32print: return False
-            return self._print_windows_raw(raw, job_name=f"Corte #{session.id}")
+            return self._print_windows_raw(raw, job_name=f"Corte #{cut.session_id}")
         else:
             if not Usb: return False
             return self._print_linux_usb(raw)
 
-    def _build_cash_cut_raw(self, session, cashier: str, branch: str, sales: Decimal, inflows: Decimal, outflows: Decimal) -> bytes:
+    def _build_cash_cut_raw(self, cut) -> bytes:
         sep = ("-" * self.cols + "\n").encode("latin-1", "replace")
         raw = b""
         
         # 1. Header
         raw += self.CMD["INIT"] + self.CMD["SIZE_NORMAL"] + self.CMD["CENTER"]
         raw += self.CMD["BOLD_ON"] + b"CORTE DE CAJA\n" + self.CMD["BOLD_OFF"]
-        raw += f"{branch}\n".encode("latin-1", "replace")
+        raw += f"{cut.branch_name or 'Sucursal Principal'}\n".encode("latin-1", "replace")
         
-        fecha = session.closed_at.strftime("%d/%m/%Y %H:%M") if session.closed_at else datetime.now().strftime("%d/%m/%Y %H:%M")
+        fecha = cut.closed_at.strftime("%d/%m/%Y %H:%M") if cut.closed_at else datetime.now().strftime("%d/%m/%Y %H:%M")
         raw += f"{fecha}\n".encode("latin-1", "replace") + self.CMD["LF"]
 
         raw += self.CMD["LEFT"]
-        raw += f"Cajero: {cashier}\n".encode("latin-1", "replace")
-        raw += f"Corte #: {session.id}\n".encode("latin-1", "replace")
+        raw += f"Cajero: {cut.cashier_name or 'Desconocido'}\n".encode("latin-1", "replace")
+        if cut.terminal:
+            raw += f"Terminal: {cut.terminal}\n".encode("latin-1", "replace")
+        raw += f"Corte #: {cut.session_id}\n".encode("latin-1", "replace")
         raw += sep
 
         # 2. Resumen
-        expected = session.opening_balance + sales + inflows - outflows
-        reported = session.closing_balance or Decimal(0)
-        diff = reported - expected
+        expected = cut.expected
+        reported = cut.closing_balance or Decimal(0)
+        diff = cut.difference if cut.difference is not None else reported - expected
 
         raw += self.CMD["BOLD_ON"] + b"BALANCE GENERAL\n" + self.CMD["BOLD_OFF"]
-        raw += self._rline("Fondo Inicial", float(session.opening_balance))
-        raw += self._rline("(+) Ventas Efec", float(sales))
-        raw += self._rline("(+) Entradas", float(inflows))
-        raw += self._rline("(-) Salidas", float(outflows))
+        raw += self._rline("Fondo Inicial", float(cut.opening_balance))
+        raw += self._rline("(+) Ventas Efec", float(cut.sales_cash))
+        raw += self._rline("(+) Entradas", float(cut.inflows))
+        raw += self._rline("(-) Salidas", float(cut.outflows))
         raw += sep
         
         raw += self.CMD["BOLD_ON"]
@@ -316,10 +318,16 @@ class PosPrinter:
         raw += self.CMD["BOLD_OFF"]
         raw += sep
 
+        # Ventas por método (pagos y monto)
+        raw += self.CMD["BOLD_ON"] + b"VENTAS POR METODO\n" + self.CMD["BOLD_OFF"]
+        for method, data in (cut.by_method or {}).items():
+            raw += self._rline(f"{method} ({data['count']})", float(data["amount"]))
+        raw += sep
+
         # 3. Observaciones
-        if session.notes:
+        if cut.notes:
             raw += b"OBSERVACIONES:\n"
-            raw += self._wrap_line(session.notes, 0)
+            raw += self._wrap_line(cut.notes, 0)
             raw += self.CMD["LF"]
 
         # 4. Firma
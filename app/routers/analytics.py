@@ -0,0 +1,177 @@
+# app/routers/analytics.py
+from datetime import date, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.models import Role
+from app.security import get_current_user, User
+from app.utils import analytics
+from app.utils.business_date import branch_today, branch_zone
+
+router = APIRouter()
+
+DEFAULT_DAYS = 30
+
+# Ventas válidas dentro del almacén analítico
+VALID_SALE = "l.branch_id = ? AND l.doc_type = 'INVOICE' AND l.status <> 'CANCELLED' AND l.business_date BETWEEN ? AND ?"
+
+MARGIN_GROUPS = {
+    "department": ("v.department_id", "COALESCE(v.department_name, 'Sin departamento')"),
+    "brand": ("v.brand_id", "COALESCE(v.brand_name, 'Sin marca')"),
+    "variant": ("l.variant_id", "COALESCE(CASE WHEN v.variant_name IS NULL OR v.variant_name = 'Estándar' "
+                                "THEN v.product_name ELSE v.product_name || ' (' || v.variant_name || ')' END, "
+                                "'Variante ' || l.variant_id)"),
+    "seller": ("l.seller_id", "COALESCE(u.full_name, u.username, 'Usuario ' || l.seller_id)"),
+}
+
+
+def _run(sql: str, params: list):
+    try:
+        return analytics.query(sql, params)
+    except analytics.AnalyticsUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+def _period(db: Session, branch_id: int, start: Optional[date], end: Optional[date]):
+    if end is None:
+        end = branch_today(db, branch_id) - timedelta(days=1)
+    if start is None:
+        start = end - timedelta(days=DEFAULT_DAYS - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="La fecha inicial es posterior a la final")
+    return start, end
+
+
+@router.get("/status")
+def analytics_status(current_user: User = Depends(get_current_user)):
+    """Estado del almacén analítico (instalado, última sincronización, datasets disponibles)."""
+    return analytics.status()
+
+
+@router.post("/sync")
+def analytics_sync(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Exporta los días nuevos a Parquet y refresca el almacén analítico."""
+    if current_user.role not in (Role.ADMINISTRADOR, Role.GERENTE):
+        raise HTTPException(status_code=403, detail="Requiere permisos de gerente o administrador")
+    try:
+        exported = analytics.sync(db)
+    except analytics.AnalyticsUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except analytics.SyncInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"exported": exported, **analytics.status()}
+
+
+@router.get("/margin")
+def analytics_margin(
+    group_by: str = Query("department", pattern="^(department|brand|variant|seller)$"),
+    start_date: Optional[date] = Query(None, alias="from"),
+    end_date: Optional[date] = Query(None, alias="to"),
+    limit: int = Query(100, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Venta, costo y margen del periodo agrupados por departamento, marca, variante o vendedor."""
+    branch_id = current_user.branch_id
+    start, end = _period(db, branch_id, start_date, end_date)
+    key_col, label_col = MARGIN_GROUPS[group_by]
+
+    rows = _run(f"""
+        SELECT {key_col} AS id, {label_col} AS name,
+               SUM(l.quantity) AS units,
+               SUM(l.total_line) AS revenue,
+               SUM(COALESCE(l.unit_cost, 0) * l.quantity) AS cost
+        FROM sales_lines l
+        LEFT JOIN dim_variants v ON v.variant_id = l.variant_id
+        LEFT JOIN dim_users u ON u.user_id = l.seller_id
+        WHERE {VALID_SALE}
+        GROUP BY 1, 2
+        ORDER BY revenue DESC
+        LIMIT ?
+    """, [branch_id, start, end, limit])
+
+    for r in rows:
+        revenue = float(r["revenue"] or 0)
+        cost = float(r["cost"] or 0)
+        r.update(units=float(r["units"] or 0), revenue=revenue, cost=cost,
+                 margin=revenue - cost, margin_pct=round((revenue - cost) / revenue * 100, 2) if revenue else 0.0)
+    return {"from": start, "to": end, "group_by": group_by, "rows": rows}
+
+
+@router.get("/heatmap")
+def analytics_heatmap(
+    start_date: Optional[date] = Query(None, alias="from"),
+    end_date: Optional[date] = Query(None, alias="to"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Tickets y venta por día de la semana (0=lunes) y hora local de la sucursal."""
+    branch_id = current_user.branch_id
+    start, end = _period(db, branch_id, start_date, end_date)
+    zone = branch_zone(db, branch_id)
+
+    rows = _run(f"""
+        WITH tickets AS (
+            SELECT DISTINCT l.document_id, l.document_total,
+                   timezone(?, l.created_at) AS local_ts
+            FROM sales_lines l
+            WHERE {VALID_SALE}
+        )
+        SELECT isodow(local_ts) - 1 AS weekday, hour(local_ts) AS hour,
+               COUNT(*) AS tickets, SUM(document_total) AS revenue
+        FROM tickets
+        GROUP BY 1, 2
+    """, [str(zone), branch_id, start, end])
+
+    tickets = [[0] * 24 for _ in range(7)]
+    revenue = [[0.0] * 24 for _ in range(7)]
+    for r in rows:
+        tickets[r["weekday"]][r["hour"]] = r["tickets"]
+        revenue[r["weekday"]][r["hour"]] = float(r["revenue"] or 0)
+    return {"from": start, "to": end, "tickets": tickets, "revenue": revenue}
+
+
+@router.get("/cashiers")
+def analytics_cashiers(
+    start_date: Optional[date] = Query(None, alias="from"),
+    end_date: Optional[date] = Query(None, alias="to"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Comparativo por vendedor: tickets, venta, ticket promedio, unidades por ticket y cancelaciones."""
+    branch_id = current_user.branch_id
+    start, end = _period(db, branch_id, start_date, end_date)
+
+    rows = _run("""
+        WITH docs AS (
+            SELECT l.document_id, l.seller_id, l.status,
+                   ANY_VALUE(l.document_total) AS total, SUM(l.quantity) AS units
+            FROM sales_lines l
+            WHERE l.branch_id = ? AND l.doc_type = 'INVOICE' AND l.business_date BETWEEN ? AND ?
+            GROUP BY 1, 2, 3
+        )
+        SELECT d.seller_id, COALESCE(u.full_name, u.username) AS name,
+               COUNT(*) FILTER (WHERE d.status <> 'CANCELLED') AS tickets,
+               SUM(d.total) FILTER (WHERE d.status <> 'CANCELLED') AS revenue,
+               SUM(d.units) FILTER (WHERE d.status <> 'CANCELLED') AS units,
+               COUNT(*) FILTER (WHERE d.status = 'CANCELLED') AS cancelled
+        FROM docs d
+        LEFT JOIN dim_users u ON u.user_id = d.seller_id
+        GROUP BY 1, 2
+        ORDER BY revenue DESC NULLS LAST
+    """, [branch_id, start, end])
+
+    for r in rows:
+        tickets = r["tickets"] or 0
+        revenue = float(r["revenue"] or 0)
+        units = float(r["units"] or 0)
+        r.update(tickets=tickets, revenue=revenue, units=units,
+                 average_ticket=round(revenue / tickets, 2) if tickets else 0.0,
+                 units_per_ticket=round(units / tickets, 2) if tickets else 0.0)
+    return {"from": start, "to": end, "rows": rows}
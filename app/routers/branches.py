@@ -1,21 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from typing import List
 from app.database import get_db
 from app.models import Branch
 from app.schemas.branches import BranchCreate, BranchRead, BranchUpdate
 from app.security import get_current_user
+from app.utils import ref_cache
+from app.utils.business_date import is_valid_timezone
 
 router = APIRouter()
 
 @router.get("/", response_model=List[BranchRead])
-def get_branches(db: Session = Depends(get_db)):
-    return db.query(Branch).all()
+def get_branches(request: Request, response: Response, db: Session = Depends(get_db)):
+    branches, version = ref_cache.get_branches(db)
+    return ref_cache.not_modified(request, response, ref_cache.BRANCHES, version) or branches
 
 @router.post("/", response_model=BranchRead)
 def create_branch(branch: BranchCreate, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
+    if branch.timezone and not is_valid_timezone(branch.timezone):
+        raise HTTPException(status_code=400, detail=f"Zona horaria inválida: {branch.timezone}")
     new_branch = Branch(**branch.dict())
     db.add(new_branch)
+    ref_cache.invalidate(db, ref_cache.BRANCHES)
     db.commit()
     db.refresh(new_branch)
     return new_branch
@@ -25,10 +31,13 @@ def update_branch(branch_id: int, branch: BranchUpdate, db: Session = Depends(ge
     db_branch = db.query(Branch).filter(Branch.id == branch_id).first()
     if not db_branch:
         raise HTTPException(status_code=404, detail="Sucursal no encontrada")
+    if branch.timezone and not is_valid_timezone(branch.timezone):
+        raise HTTPException(status_code=400, detail=f"Zona horaria inválida: {branch.timezone}")
     
     for key, value in branch.dict(exclude_unset=True).items():
         setattr(db_branch, key, value)
     
+    ref_cache.invalidate(db, ref_cache.BRANCHES)
     db.commit()
     db.refresh(db_branch)
     return db_branch
@@ -40,5 +49,6 @@ def delete_branch(branch_id: int, db: Session = Depends(get_db), current_user =
         raise HTTPException(status_code=404, detail="Sucursal no encontrada")
     
     db.delete(db_branch)
+    ref_cache.invalidate(db, ref_cache.BRANCHES)
     db.commit()
     return {"ok": True}
\ No newline at end of file
@@ -1,16 +1,20 @@
 # app/routers/cash.py
+import logging
 from typing import Optional, List
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, desc
 from decimal import Decimal
 from datetime import datetime
 from app.database import get_db
 from app.models import CashSession, CashSessionStatus, Payment, PaymentMethod, SalesDocument, DocumentStatus
-from app.schemas.cash import CashSessionCreate, CashSessionRead, CashSessionClose
+from app.schemas.cash import CashSessionCreate, CashSessionRead, CashSessionClose, CashSessionHistoryRead
 from app.security import get_current_user, User
+from app.utils import live_events
+from app.crud import cash as crud_cash
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 @router.get("/status", response_model=Optional[CashSessionRead])
 def get_current_session(
@@ -25,15 +29,15 @@ def get_current_session(
     ).first()
     return session
 
-@router.get("/history", response_model=List[CashSessionRead])
+@router.get("/history", response_model=List[CashSessionHistoryRead])
 def read_cash_history(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Historial de cortes de caja de la sucursal"""
-    return db.query(CashSession).filter(
+    """Historial de cortes de caja de la sucursal (con el corte congelado de cada turno cerrado)"""
+    return db.query(CashSession).options(joinedload(CashSession.cut)).filter(
         CashSession.branch_id == current_user.branch_id
     ).order_by(CashSession.opened_at.desc()).offset(skip).limit(limit).all()
 
@@ -61,6 +65,7 @@ def open_session(
         user_id=current_user.id,
         status=CashSessionStatus.OPEN,
         opening_balance=session_in.opening_balance,
+        terminal=session_in.terminal,
         opened_at=datetime.utcnow()
     )
     db.add(new_session)
@@ -74,30 +79,28 @@ def close_session(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    # 1. Buscar sesión activa
+    # 1. Buscar sesión activa (bloqueada: los acumulados no cambian mientras se cierra)
     session = db.query(CashSession).filter(
         CashSession.user_id == current_user.id,
         CashSession.status == CashSessionStatus.OPEN
-    ).first()
+    ).with_for_update().first()
     
     if not session:
         raise HTTPException(400, "No hay sesión abierta para cerrar.")
 
-    # 2. Calcular Ventas en Efectivo durante este turno (Sistema)
-    # Buscamos pagos hechos entre opened_at y ahora, por este usuario
-    sales_total = db.query(func.sum(Payment.amount)).join(SalesDocument).filter(
-        Payment.method == PaymentMethod.CASH,
-        SalesDocument.seller_id == current_user.id, # Asumiendo que el pago lo cobró el usuario de la sesión
-        Payment.created_at >= session.opened_at,
-        SalesDocument.status == DocumentStatus.PAID
-    ).scalar() or Decimal(0)
+    # 2. Conciliar los acumulados contra los pagos y movimientos antes de congelar el corte
+    drift = crud_cash.reconcile_sessions(db, session.id, fix=True)
+    if drift:
+        logger.warning("cash session %s: running totals corrected at close: %s", session.id, drift[0]["diffs"])
+
+    # 3. Esperado = Inicio + Ventas Efectivo + Entradas - Salidas (acumulados del turno)
+    sales_total = session.sales_cash or Decimal(0)
+    expected = crud_cash.expected_in_drawer(session)
 
-    # 3. Calcular Diferencia (Real vs Esperado)
-    # Esperado = Inicio + Ventas Efectivo
-    expected = session.opening_balance + sales_total
+    # 4. Diferencia (Real vs Esperado)
     diff = close_data.closing_balance - expected
 
-    # 4. Actualizar y Cerrar
+    # 5. Actualizar y Cerrar
     session.status = CashSessionStatus.CLOSED
     session.closed_at = datetime.utcnow()
     session.closing_balance = close_data.closing_balance
@@ -105,6 +108,9 @@ def close_session(
     session.difference = diff
     session.notes = close_data.notes
 
+    # 6. Congelar el corte (PDF, ticket, impresión e historial leen este snapshot)
+    crud_cash.snapshot_cash_cut(db, session)
+
     db.commit()
     db.refresh(session)
     return session
@@ -159,30 +165,19 @@ def get_cash_summary(
     if not session:
         raise HTTPException(400, "No hay sesión abierta.")
 
-    # 2. Ventas Efectivo (Desde apertura)
-    sales_cash = db.query(func.sum(Payment.amount)).join(SalesDocument).filter(
-        Payment.method == PaymentMethod.CASH,
-        SalesDocument.seller_id == current_user.id,
-        Payment.created_at >= session.opened_at,
-        SalesDocument.status == DocumentStatus.PAID
-    ).scalar() or Decimal(0)
-
-    # 3. Entradas/Salidas Manuales
-    session_id = session.id
-    # Importar modelo aquí para evitar ciclos circulares si los hay, o traer arriba si es seguro.
-    # Asumimos que `app.models.cash` ya tiene CashMovement
-    from app.models.cash import CashMovement
-
-    movements = db.query(CashMovement).filter(CashMovement.session_id == session.id).all()
-    
-    total_inflows = sum(m.amount for m in movements if m.type == 'IN')
-    total_outflows = sum(m.amount for m in movements if m.type == 'OUT')
-
-    expected = session.opening_balance + sales_cash + total_inflows - total_outflows
+    # 2. Acumulados del turno (se actualizan con cada venta, cancelación y movimiento)
+    sales_cash = session.sales_cash or Decimal(0)
+    total_inflows = session.inflows or Decimal(0)
+    total_outflows = session.outflows or Decimal(0)
+    expected = crud_cash.expected_in_drawer(session)
 
     return {
         "opening_balance": float(session.opening_balance),
         "sales_cash": float(sales_cash),
+        "sales_card": float(session.sales_card or 0),
+        "sales_transfer": float(session.sales_transfer or 0),
+        "sales_other": float(session.sales_other or 0),
+        "payments_count": session.payments_count or 0,
         "inflows": float(total_inflows),
         "outflows": float(total_outflows),
         "expected_in_drawer": float(expected)
@@ -212,6 +207,11 @@ def register_inflow(
         reason=reason
     )
     db.add(new_move)
+    crud_cash.apply_movement(db, session.id, "IN", new_move.amount)
+    live_events.publish_on_commit(db, session.branch_id, {
+        "type": "cash_movement", "session_id": session.id, "user_id": session.user_id,
+        "direction": "IN", "amount": float(amount), "reason": reason
+    })
     db.commit()
     
     return {"message": "Entrada registrada", "amount": amount}
@@ -240,6 +240,11 @@ def register_outflow(
         reason=reason
     )
     db.add(new_move)
+    crud_cash.apply_movement(db, session.id, "OUT", new_move.amount)
+    live_events.publish_on_commit(db, session.branch_id, {
+        "type": "cash_movement", "session_id": session.id, "user_id": session.user_id,
+        "direction": "OUT", "amount": float(amount), "reason": reason
+    })
     db.commit()
     
     return {"message": "Salida registrada", "amount": amount}
@@ -259,33 +264,8 @@ def get_cash_cut_pdf(
     session = db.query(CashSession).filter(CashSession.id == session_id).first()
     if not session:
         raise HTTPException(404, "Sesión no encontrada")
-        
-    # Recalcular totales para el reporte
-    from app.models.cash import CashMovement
-    sales_cash = session.total_cash_sales or Decimal(0) # Si ya cerró, usar guardado. Si no, calcular? 
-    # Mejor asumimos que el PDF se pide AL CERRAR o DESPUES. 
-    # Si está OPEN, habría que calcular al vuelo. Haremos eso para robustez.
-    if session.status == "OPEN":
-        # Recalculo 'al vuelo' similar a summary
-        sales_cash = db.query(func.sum(Payment.amount)).join(SalesDocument).filter(
-            Payment.method == PaymentMethod.CASH,
-            SalesDocument.seller_id == session.user_id,
-            Payment.created_at >= session.opened_at,
-            SalesDocument.status == DocumentStatus.PAID
-        ).scalar() or Decimal(0)
-    
-    movements = db.query(CashMovement).filter(CashMovement.session_id == session.id).all()
-    inflows = sum(m.amount for m in movements if m.type == 'IN')
-    outflows = sum(m.amount for m in movements if m.type == 'OUT')
-    
-    pdf_bytes = generate_cash_cut_pdf(
-        session, 
-        session.user.full_name or session.user.username, # Asumiendo relación User
-        "Sucursal Principal", # TODO: Get real branch name
-        sales_cash,
-        inflows,
-        outflows
-    )
+
+    pdf_bytes = generate_cash_cut_pdf(crud_cash.get_cash_cut(db, session))
     
     return Response(
         content=pdf_bytes,
@@ -307,44 +287,32 @@ def get_cash_cut_ticket(
     if not session:
         raise HTTPException(404, "Sesión no encontrada")
     
-    # Logica de totales (Copy-paste de arriba, refactorizar luego en servicio)
-    from app.models.cash import CashMovement
-    sales_cash = session.total_cash_sales or Decimal(0)
-    if session.status == "OPEN":
-        sales_cash = db.query(func.sum(Payment.amount)).join(SalesDocument).filter(
-            Payment.method == PaymentMethod.CASH,
-            SalesDocument.seller_id == session.user_id,
-            Payment.created_at >= session.opened_at,
-            SalesDocument.status == DocumentStatus.PAID
-        ).scalar() or Decimal(0)
-        
-    movements = db.query(CashMovement).filter(CashMovement.session_id == session.id).all()
-    inflows = sum(m.amount for m in movements if m.type == 'IN')
-    outflows = sum(m.amount for m in movements if m.type == 'OUT')
-    expected = session.opening_balance + sales_cash + inflows - outflows
-    
+    cut = crud_cash.get_cash_cut(db, session)
+
     return {
         "header": {
             "title": "CORTE DE CAJA",
-            "branch": "Sucursal Principal",
-            "user": session.user.username,
+            "branch": cut.branch_name or "Sucursal Principal",
+            "user": cut.cashier_name,
+            "terminal": cut.terminal,
             "date": datetime.now().strftime('%d/%m/%Y %H:%M')
         },
         "details": {
-            "start_balance": float(session.opening_balance),
-            "sales_cash": float(sales_cash),
-            "inflows": float(inflows),
-            "outflows": float(outflows),
-            "expected": float(expected),
-            "reported": float(session.closing_balance or 0),
-            "difference": float(session.difference or 0)
+            "start_balance": float(cut.opening_balance),
+            "sales_cash": float(cut.sales_cash),
+            "inflows": float(cut.inflows),
+            "outflows": float(cut.outflows),
+            "expected": float(cut.expected),
+            "reported": float(cut.closing_balance or 0),
+            "difference": float(cut.difference or 0)
         },
+        "by_method": cut.by_method,
         "movements": [
             {
-                "time": m.created_at.strftime('%H:%M'),
-                "type": m.type,
-                "amount": float(m.amount),
-                "reason": m.reason
-            } for m in movements
+                "time": datetime.fromisoformat(m["created_at"]).strftime('%H:%M') if m["created_at"] else "",
+                "type": m["type"],
+                "amount": m["amount"],
+                "reason": m["reason"]
+            } for m in cut.movements
         ]
     }
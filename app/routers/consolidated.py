@@ -0,0 +1,196 @@
+# app/routers/consolidated.py
+from collections import defaultdict
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.models import Role
+from app.security import get_current_user, User
+from app.routers.reports import _compute_daily_summary, _margin_query, _margin_row
+from app.routers.sales import _compute_sales_stats
+from app.utils import ref_cache, report_cache
+from app.utils.branch_fanout import fan_out
+from app.utils.business_date import branch_today
+
+router = APIRouter()
+
+BRANCH_TIMEOUT = 10.0   # Segundos máximos de espera por sucursal
+
+
+def _require_owner(current_user: User) -> None:
+    if current_user.role not in (Role.ADMINISTRADOR, Role.DUEÑO):
+        raise HTTPException(status_code=403, detail="Requiere permisos de administrador o dueño")
+
+
+def _target_branches(db: Session, branch_ids: Optional[List[int]]) -> dict:
+    """{id: nombre} de las sucursales activas (o solo las pedidas)."""
+    branches, _ = ref_cache.get_branches(db)
+    selected = {
+        b.id: b.name for b in branches
+        if getattr(b, "is_active", True) is not False and (not branch_ids or b.id in branch_ids)
+    }
+    if not selected:
+        raise HTTPException(status_code=404, detail="No hay sucursales para consolidar")
+    return selected
+
+
+def _envelope(names: dict, timings: List[dict], results: dict) -> dict:
+    for t in timings:
+        t["name"] = names.get(t["branch_id"])
+    return {
+        "branches": timings,
+        "partial": len(results) < len(names),
+        "by_branch": results,
+    }
+
+
+@router.get("/stats")
+def consolidated_sales_stats(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    branch_ids: Optional[List[int]] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """KPIs de ventas (como /api/sales/stats) de todas las sucursales, calculados en paralelo."""
+    _require_owner(current_user)
+    names = _target_branches(db, branch_ids)
+
+    def compute(branch_db: Session, branch_id: int) -> dict:
+        # Misma llave de caché que el reporte por sucursal
+        return report_cache.cached(
+            "sales.stats", branch_id,
+            {"start_date": start_date, "end_date": end_date},
+            lambda: _compute_sales_stats(branch_db, branch_id, start_date, end_date),
+            start=start_date, end=end_date
+        )
+
+    results, timings = fan_out(names, compute, ("sales.stats", start_date, end_date), timeout=BRANCH_TIMEOUT)
+
+    total_sales = sum(r["total_sales"] for r in results.values())
+    total_transactions = sum(r["total_transactions"] for r in results.values())
+    methods = defaultdict(float)
+    for r in results.values():
+        for method, amount in r["payment_methods"].items():
+            methods[method] += amount
+
+    return {
+        "total_sales": total_sales,
+        "total_transactions": total_transactions,
+        "average_ticket": total_sales / total_transactions if total_transactions else 0.0,
+        "total_returns": sum(r["total_returns"] for r in results.values()),
+        "payment_methods": dict(methods),
+        **_envelope(names, timings, results),
+    }
+
+
+@router.get("/daily-summary")
+def consolidated_daily_summary(
+    target_date: Optional[date] = None,
+    branch_ids: Optional[List[int]] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Resumen del día (como /api/reports/daily-summary) de todas las sucursales.
+    Sin fecha, cada sucursal usa su propio día de negocio (zonas horarias distintas).
+    """
+    _require_owner(current_user)
+    names = _target_branches(db, branch_ids)
+
+    def compute(branch_db: Session, branch_id: int) -> dict:
+        day = target_date or branch_today(branch_db, branch_id)
+        return report_cache.cached(
+            "reports.daily_summary", branch_id, {"target_date": day},
+            lambda: _compute_daily_summary(branch_db, branch_id, day),
+            start=day, end=day
+        )
+
+    results, timings = fan_out(names, compute, ("reports.daily_summary", target_date), timeout=BRANCH_TIMEOUT)
+
+    payments = defaultdict(float)
+    top_items = defaultdict(float)
+    for r in results.values():
+        for method, amount in r["payments"].items():
+            payments[getattr(method, "value", method)] += amount
+        # Los más vendidos salen de los top de cada sucursal
+        for item in r["top_selling_items"]:
+            top_items[item["name"]] += item["quantity"]
+
+    return {
+        "date": target_date,
+        "transactions_count": sum(r["transactions_count"] for r in results.values()),
+        "total_revenue": sum(r["total_revenue"] for r in results.values()),
+        "gross_profit": sum(r["gross_profit"] for r in results.values()),
+        "returns_amount": sum(r["returns_amount"] for r in results.values()),
+        "payments": dict(payments),
+        "top_selling_items": [
+            {"name": name, "quantity": qty}
+            for name, qty in sorted(top_items.items(), key=lambda kv: kv[1], reverse=True)[:5]
+        ],
+        **_envelope(names, timings, results),
+    }
+
+
+@router.get("/margin")
+def consolidated_margin(
+    group_by: str = Query("department", pattern="^(department|brand|variant|seller)$"),
+    start_date: Optional[date] = Query(None, alias="from"),
+    end_date: Optional[date] = Query(None, alias="to"),
+    limit: int = Query(500, ge=1, le=100000),
+    branch_ids: Optional[List[int]] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Margen bruto (como /api/reports/margin) sumado entre sucursales (default: mes en curso)."""
+    _require_owner(current_user)
+    names = _target_branches(db, branch_ids)
+    end = end_date or branch_today(db, current_user.branch_id)
+    start = start_date or end.replace(day=1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="La fecha inicial es posterior a la final")
+
+    def compute(branch_db: Session, branch_id: int) -> list:
+        return [_margin_row(r) for r in _margin_query(branch_db, group_by, branch_id, start, end)]
+
+    results, timings = fan_out(names, compute, ("reports.margin", group_by, start, end), timeout=BRANCH_TIMEOUT)
+
+    merged = {}
+    for rows in results.values():
+        for r in rows:
+            acc = merged.setdefault(r["id"], {"id": r["id"], "name": r["name"], "units": 0.0, "revenue": 0.0, "cost": 0.0})
+            acc["units"] += r["units"]
+            acc["revenue"] += r["revenue"]
+            acc["cost"] += r["cost"]
+    rows = sorted(merged.values(), key=lambda r: r["revenue"], reverse=True)
+    for r in rows:
+        r["revenue"], r["cost"] = round(r["revenue"], 2), round(r["cost"], 2)
+        r["margin"] = round(r["revenue"] - r["cost"], 2)
+        r["margin_pct"] = round(r["margin"] / r["revenue"] * 100, 2) if r["revenue"] else 0.0
+
+    total_revenue = sum(r["revenue"] for r in rows)
+    total_cost = sum(r["cost"] for r in rows)
+    envelope = _envelope(names, timings, results)
+    # Por sucursal solo se devuelven los totales (el detalle ya va consolidado)
+    envelope["by_branch"] = {
+        b: {"revenue": round(sum(r["revenue"] for r in branch_rows), 2),
+            "cost": round(sum(r["cost"] for r in branch_rows), 2)}
+        for b, branch_rows in results.items()
+    }
+    return {
+        "from": start,
+        "to": end,
+        "group_by": group_by,
+        "total_groups": len(rows),
+        "totals": {
+            "revenue": round(total_revenue, 2),
+            "cost": round(total_cost, 2),
+            "margin": round(total_revenue - total_cost, 2),
+            "margin_pct": round((total_revenue - total_cost) / total_revenue * 100, 2) if total_revenue else 0.0,
+        },
+        "rows": rows[:limit],
+        **envelope,
+    }
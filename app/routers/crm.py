@@ -5,8 +5,10 @@ from decimal import Decimal
 from app.database import get_db
 from app.schemas.crm import CustomerCreate, CustomerRead, CustomerPaymentCreate, PaymentResponse
 from app.crud import crm as crud_crm
+from app.crud import cash as crud_cash
 from app.security import get_current_user
 from app.models import User, Customer, Payment, CustomerLedgerEntry # <--- Nuevos modelos
+from app.utils.business_date import business_date_for
 
 router = APIRouter()
 
@@ -59,20 +61,18 @@ def register_customer_payment(
         amount=payment_in.amount,
         method=payment_in.method,
         reference=payment_in.reference,
-        created_by_id=current_user.id
+        created_by_id=current_user.id,
+        business_date=business_date_for(db, current_user.branch_id),
+        **crud_cash.session_stamp(crud_cash.get_open_session(db, current_user.id))
     )
     db.add(new_payment)
     
-    # 4. Actualizar Saldo del Cliente (Resta deuda)
-    customer.current_balance -= payment_in.amount
-    
-    # 5. Registrar en el Kardex Financiero (Ledger)
-    ledger_entry = CustomerLedgerEntry(
-        customer_id=customer.id,
-        amount=-payment_in.amount, # Negativo porque disminuye la deuda
-        description=f"Abono a cuenta ({payment_in.method})",
+    # 4. Actualizar Saldo del Cliente y aplicar FIFO a sus ventas a crédito abiertas
+    # 5. Registrar en el Kardex Financiero (Ledger), un movimiento por venta abonada
+    crud_crm.apply_customer_payment(
+        db, customer, payment_in.amount,
+        description=f"Abono a cuenta ({payment_in.method.value})"
     )
-    db.add(ledger_entry)
     
     db.commit()
     db.refresh(customer)
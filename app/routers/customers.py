@@ -1,14 +1,17 @@
 # app/routers/customers.py
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session, contains_eager
 from sqlalchemy import desc
 from typing import List
 from decimal import Decimal
 
 from app.database import get_db
-from app.models import Customer, CustomerLedgerEntry
-from app.schemas.customers import CustomerCreate, CustomerRead, CustomerUpdate, LedgerEntryResponse
+from app.models import Customer, CustomerLedgerEntry, CustomerRFM
+from app.schemas.customers import CustomerCreate, CustomerRead, CustomerUpdate, LedgerEntryResponse, OpenInvoiceRead
 from app.security import get_current_user, User
+from app.utils.business_date import branch_today
+from app.crud import crm as crud_crm
+from app.models import SalesDocument
 
 router = APIRouter()
 
@@ -20,10 +23,13 @@ def get_customers(
     skip: int = 0, 
     limit: int = 100, 
     search: str = None, # Opción para buscar por nombre/RFC
+    segment: str = None, # Segmento RFM (ver /api/reports/customers/rfm)
+    order_by: str = Query("name", pattern="^(name|monetary|recency|frequency)$"),
     db: Session = Depends(get_db), 
     current_user: User = Depends(get_current_user)
 ):
-    query = db.query(Customer).filter(Customer.is_active == True)
+    query = db.query(Customer).outerjoin(CustomerRFM, CustomerRFM.customer_id == Customer.id
+    ).options(contains_eager(Customer.rfm)).filter(Customer.is_active == True)
     
     if search:
         # Búsqueda insensible a mayúsculas
@@ -32,8 +38,18 @@ def get_customers(
             (Customer.name.ilike(search_fmt)) | 
             (Customer.tax_id.ilike(search_fmt))
         )
-        
-    return query.order_by(Customer.name).offset(skip).limit(limit).all()
+
+    if segment:
+        query = query.filter(CustomerRFM.segment == segment)
+
+    # Clientes sin compras (sin renglón RFM) quedan al final
+    ordering = {
+        "name": [Customer.name],
+        "monetary": [CustomerRFM.monetary.is_(None), desc(CustomerRFM.monetary), Customer.name],
+        "recency": [CustomerRFM.recency_days.is_(None), CustomerRFM.recency_days, Customer.name],
+        "frequency": [CustomerRFM.frequency.is_(None), desc(CustomerRFM.frequency), Customer.name],
+    }[order_by]
+    return query.order_by(*ordering).offset(skip).limit(limit).all()
 
 # --------------------------------------------------------------------------
 # 2. OBTENER DETALLE (INDIVIDUAL)
@@ -159,6 +175,42 @@ def get_customer_statement(
         
     return entries
 
+@router.get("/{customer_id}/open-invoices", response_model=List[OpenInvoiceRead])
+def get_customer_open_invoices(
+    customer_id: int,
+    overdue_only: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Ventas a crédito con saldo pendiente (de la más antigua a la más reciente),
+    con su vencimiento según los días de crédito del cliente.
+    """
+    customer = db.query(Customer).filter(Customer.id == customer_id).first()
+    if not customer:
+        raise HTTPException(status_code=404, detail="Cliente no encontrado")
+
+    today = branch_today(db, current_user.branch_id)
+    if overdue_only:
+        query = crud_crm.overdue_invoices_query(db, today, customer_id)
+    else:
+        query = crud_crm.open_invoices_query(db, customer_id)
+
+    invoices = query.order_by(SalesDocument.created_at, SalesDocument.id).all()
+    return [
+        OpenInvoiceRead(
+            id=doc.id,
+            series=doc.series,
+            folio=doc.folio,
+            created_at=doc.created_at,
+            due_date=doc.due_date,
+            total_amount=doc.total_amount,
+            balance_due=doc.balance_due,
+            days_overdue=max((today - doc.due_date).days, 0) if doc.due_date else 0
+        )
+        for doc in invoices
+    ]
+
 @router.post("/{customer_id}/pay", response_model=LedgerEntryResponse)
 def register_customer_payment(
     customer_id: int,
@@ -177,19 +229,12 @@ def register_customer_payment(
     if amount <= 0:
         raise HTTPException(400, "El monto del pago debe ser mayor a cero")
 
-    # 1. Actualizar saldo (restar el abono)
-    customer.current_balance -= amount
+    # 1. Actualizar saldo (restar el abono) y aplicarlo FIFO a las ventas a crédito abiertas
+    # 2. Registrar en el Ledger (Kardex de dinero), un movimiento por venta abonada
+    entries = crud_crm.apply_customer_payment(db, customer, amount, description=f"PAGO RECIBIDO: {reference}")
 
-    # 2. Registrar en el Ledger (Kardex de dinero)
-    new_entry = CustomerLedgerEntry(
-        customer_id=customer.id,
-        amount=-amount,  # Negativo porque reduce la deuda
-        description=f"PAGO RECIBIDO: {reference}",
-        # created_by=current_user.id  <-- Opcional para auditoría
-    )
-    
-    db.add(new_entry)
     db.commit()
+    new_entry = entries[-1]
     db.refresh(new_entry)
     return new_entry
 
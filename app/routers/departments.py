@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from typing import List
 from app.database import get_db
@@ -7,19 +7,22 @@ from app.database import get_db
 from app.models import Category  # Usamos Category como Departamento para consistencia con Productos
 from app.schemas.departments import DepartmentCreate, DepartmentUpdate, DepartmentResponse
 from app.security import get_current_user
+from app.utils import ref_cache
 
 router = APIRouter()
 
 @router.get("/", response_model=List[DepartmentResponse])
-def get_departments(db: Session = Depends(get_db)):
+def get_departments(request: Request, response: Response, db: Session = Depends(get_db)):
     # Mapeamos Category -> DepartmentResponse
     # DepartmentResponse espera id, name, description
-    return db.query(Category).all()
+    departments, version = ref_cache.get_departments(db)
+    return ref_cache.not_modified(request, response, ref_cache.DEPARTMENTS, version) or departments
 
 @router.post("/", response_model=DepartmentResponse)
 def create_department(dept: DepartmentCreate, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
     new_dept = Category(name=dept.name, description=dept.description)
     db.add(new_dept)
+    ref_cache.invalidate(db, ref_cache.DEPARTMENTS)
     db.commit()
     db.refresh(new_dept)
     return new_dept
@@ -35,6 +38,7 @@ def update_department(dept_id: int, dept_in: DepartmentUpdate, db: Session = Dep
     if dept_in.description is not None:
         dept.description = dept_in.description
         
+    ref_cache.invalidate(db, ref_cache.DEPARTMENTS)
     db.commit()
     db.refresh(dept)
     return dept
@@ -47,5 +51,6 @@ def delete_department(dept_id: int, db: Session = Depends(get_db), current_user
         
     # Optional: Check if used in products before delete, or let FK constraints handle/fail
     db.delete(dept)
+    ref_cache.invalidate(db, ref_cache.DEPARTMENTS)
     db.commit()
     return {"status": "ok"}
\ No newline at end of file
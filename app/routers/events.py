@@ -0,0 +1,70 @@
+# app/routers/events.py
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+from app.database import SessionLocal
+from app.security import (
+    get_current_user, get_stream_user, create_stream_token, CurrentUser, STREAM_TOKEN_EXPIRE_SECONDS
+)
+from app.utils import live_events
+
+router = APIRouter()
+
+# Cada cuánto se manda un comentario para mantener viva la conexión
+KEEPALIVE_SECONDS = 15
+
+
+@router.post("/token")
+def create_events_token(current_user: CurrentUser = Depends(get_current_user)):
+    """
+    Token de corta duración que solo sirve para abrir /stream. EventSource no permite
+    encabezados y el token viaja en la URL (queda en bitácoras), así que no se usa
+    el token de sesión.
+    """
+    return {"token": create_stream_token(current_user.username), "expires_in": STREAM_TOKEN_EXPIRE_SECONDS}
+
+
+@router.get("/stream")
+async def stream_branch_events(request: Request, token: str = Query(...)):
+    """
+    Canal SSE de la sucursal del usuario: deltas de ventas, cancelaciones,
+    devoluciones y movimientos de caja conforme se confirman.
+    `token` es el de POST /token (solo se valida al conectar).
+    """
+    # Sesión de BD solo para autenticar; no se retiene mientras dure el stream
+    db = SessionLocal()
+    try:
+        current_user = await get_stream_user(token, db)
+    finally:
+        db.close()
+
+    branch_id = current_user.branch_id
+
+    async def event_stream():
+        queue = live_events.subscribe(branch_id)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                if payload is live_events.OVERFLOW:
+                    # Se perdieron eventos: cerrar para que el cliente reconecte y recargue
+                    break
+                yield f"data: {json.dumps(jsonable_encoder(payload))}\n\n"
+        finally:
+            live_events.unsubscribe(branch_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,10 +1,12 @@
 # app/routers/inventory.py
+import math
 from typing import List  # <--- ESTA ERA LA LÍNEA QUE FALTABA
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+from sqlalchemy import case, func, and_, Float, type_coerce
 from app.database import get_db
-from app.models import InventoryMovement, StockOnHand, MovementType, User, ProductVariant
-from app.schemas.inventory import AdjustmentCreate, MovementRead
+from app.models import InventoryMovement, StockOnHand, MovementType, User, ProductVariant, Product, ReplenishmentPlan
+from app.schemas.inventory import AdjustmentCreate, MovementRead, ReplenishmentRead
 from app.security import get_current_user
 
 router = APIRouter()
@@ -101,4 +103,54 @@ def get_kardex(
             created_at=m.created_at,
             user_name=m.user.username if m.user else "Sistema"
         ) for m in movements
-    ]
\ No newline at end of file
+    ]
+
+@router.get("/replenishment", response_model=List[ReplenishmentRead])
+def get_replenishment(
+    only_reorder: bool = True,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Sugerencias de reabastecimiento de la sucursal. Lee el pronóstico precalculado
+    (run_replenishment.py) y lo compara con el stock actual:
+    si el stock está en o bajo el punto de reorden, sugiere pedir hasta `order_up_to`.
+    """
+    qty = type_coerce(func.coalesce(StockOnHand.qty_on_hand, 0), Float)
+    suggested = case(
+        (qty <= ReplenishmentPlan.reorder_point, ReplenishmentPlan.order_up_to - qty),
+        else_=0.0
+    )
+    query = db.query(
+        ReplenishmentPlan, ProductVariant.sku, ProductVariant.variant_name, Product.name,
+        qty.label("qty_on_hand"), suggested.label("suggested_qty")
+    ).join(ProductVariant, ProductVariant.id == ReplenishmentPlan.variant_id
+    ).join(Product, Product.id == ProductVariant.product_id
+    ).outerjoin(StockOnHand, and_(
+        StockOnHand.branch_id == ReplenishmentPlan.branch_id,
+        StockOnHand.variant_id == ReplenishmentPlan.variant_id
+    )).filter(ReplenishmentPlan.branch_id == current_user.branch_id)
+
+    if only_reorder:
+        query = query.filter(qty <= ReplenishmentPlan.reorder_point, ReplenishmentPlan.order_up_to > qty)
+
+    rows = query.order_by(suggested.desc(), ReplenishmentPlan.variant_id).offset(skip).limit(limit).all()
+    return [
+        ReplenishmentRead(
+            variant_id=plan.variant_id,
+            sku=sku,
+            name=f"{name} ({variant_name})" if variant_name and variant_name != "Estándar" else name,
+            qty_on_hand=qty_on_hand,
+            avg_daily_demand=plan.avg_daily_demand,
+            forecast_daily=plan.forecast_daily,
+            safety_stock=plan.safety_stock,
+            reorder_point=plan.reorder_point,
+            order_up_to=plan.order_up_to,
+            suggested_qty=float(math.ceil(suggested_qty)) if suggested_qty > 0 else 0.0,
+            days_of_cover=round(qty_on_hand / plan.forecast_daily, 1) if plan.forecast_daily > 0 else None,
+            history_end=plan.history_end,
+            computed_at=plan.computed_at
+        ) for plan, sku, variant_name, name, qty_on_hand, suggested_qty in rows
+    ]
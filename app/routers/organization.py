@@ -1,22 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models.organization import Organization
 from app.schemas.organization import OrganizationRead, OrganizationUpdate, OrganizationCreate
 from app.security import get_current_user
+from app.utils import ref_cache
 
 router = APIRouter()
 
 @router.get("/", response_model=OrganizationRead)
-def get_organization(db: Session = Depends(get_db)):
-    org = db.query(Organization).first()
-    if not org:
-        # Auto-create if not exists
-        org = Organization(name="Mi Empresa - Atlas ERP")
-        db.add(org)
-        db.commit()
-        db.refresh(org)
-    return org
+def get_organization(request: Request, response: Response, db: Session = Depends(get_db)):
+    # Auto-create if not exists (lo hace el cargador de la caché)
+    org, version = ref_cache.get_organization(db)
+    return ref_cache.not_modified(request, response, ref_cache.ORGANIZATION, version) or org
 
 from app.models.users import Role
 
@@ -38,6 +34,7 @@ def update_organization(
         for key, value in org_in.dict(exclude_unset=True).items():
             setattr(org, key, value)
     
+    ref_cache.invalidate(db, ref_cache.ORGANIZATION)
     db.commit()
     db.refresh(org)
     return org
@@ -9,6 +9,8 @@ from sqlalchemy import func
 from decimal import Decimal
 from app.security import get_current_user
 from app.pos_printer import PosPrinter, IS_WINDOWS, win32print
+from app.utils import ref_cache
+from app.crud import cash as crud_cash
 
 router = APIRouter()
 
@@ -17,8 +19,7 @@ def test_print_endpoint(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    from app.models.organization import Organization
-    organization = db.query(Organization).first()
+    organization, _ = ref_cache.get_organization(db)
     
     p_name = organization.printer_name if (organization and organization.printer_name) else "POS-80"
     printer = PosPrinter(printer_name=p_name, paper_width_mm=80)
@@ -56,8 +57,7 @@ def print_ticket_endpoint(
         raise HTTPException(status_code=404, detail="Venta no encontrada")
 
     # Fetch Organization for Ticket Config
-    from app.models.organization import Organization
-    organization = db.query(Organization).first()
+    organization, _ = ref_cache.get_organization(db)
     
     # Use configured printer or default
     p_name = organization.printer_name if (organization and organization.printer_name) else "POS-80"
@@ -93,8 +93,7 @@ def reprint_ticket_endpoint(
         db.commit()
 
     # Fetch Organization
-    from app.models.organization import Organization
-    organization = db.query(Organization).first()
+    organization, _ = ref_cache.get_organization(db)
 
     p_name = organization.printer_name if (organization and organization.printer_name) else "POS-80"
     printer = PosPrinter(printer_name=p_name, paper_width_mm=80)
@@ -129,45 +128,17 @@ def print_cash_cut_endpoint(
     if not session:
         raise HTTPException(404, "Sesión no encontrada")
 
-    # Recalcular totales para impresión
-    sales_cash = db.query(func.sum(Payment.amount)).join(SalesDocument).filter(
-        Payment.method == PaymentMethod.CASH,
-        SalesDocument.seller_id == session.user_id, 
-        Payment.created_at >= session.opened_at,
-        Payment.created_at <= (session.closed_at or datetime.now()),
-        SalesDocument.status == DocumentStatus.PAID
-    ).scalar() or Decimal(0)
-
-    inflows = db.query(func.sum(CashMovement.amount)).filter(
-        CashMovement.session_id == session.id,
-        CashMovement.type == 'IN'
-    ).scalar() or Decimal(0)
-
-    outflows = db.query(func.sum(CashMovement.amount)).filter(
-        CashMovement.session_id == session.id,
-        CashMovement.type == 'OUT'
-    ).scalar() or Decimal(0)
-
-    # Identificar nombre de usuario y sucursal
-    cashier_name = session.user.username if session.user else "Desconocido"
-    branch_name = "Sucursal Principal" # Placeholder o tomar de session.user.branch
+    # Corte congelado al cerrar (o calculado al momento si el turno sigue abierto)
+    cut = crud_cash.get_cash_cut(db, session)
 
     # Fetch Organization for Printer Config
-    from app.models.organization import Organization
-    organization = db.query(Organization).first()
+    organization, _ = ref_cache.get_organization(db)
     p_name = organization.printer_name if (organization and organization.printer_name) else "POS-80"
 
     printer = PosPrinter(printer_name=p_name, paper_width_mm=80)
     
     try:
-        success = printer.print_cash_cut(
-            session=session,
-            cashier_name=cashier_name,
-            branch_name=branch_name,
-            sales_cash=sales_cash,
-            inflows=inflows,
-            outflows=outflows
-        )
+        success = printer.print_cash_cut(cut)
         if not success:
             raise HTTPException(500, "Error de hardware al imprimir corte")
     except Exception as e:
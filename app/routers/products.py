@@ -1,10 +1,11 @@
 # app/routers/products.py
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Request, Response
 from sqlalchemy.orm import Session, joinedload
 from typing import List
 from decimal import Decimal
+from datetime import datetime
 from sqlalchemy import or_
 import pandas as pd
 import io
@@ -12,13 +13,18 @@ import io
 from app.database import get_db
 from app.models import (
     Product, ProductVariant, StockOnHand, User,
-    InventoryMovement, MovementType, Category, ProductPrice
+    InventoryMovement, MovementType, Category, ProductPrice, Role,
+    ProductPriceHistory
 )
 from app.schemas.products import (
     ProductCreate, ProductRead, ProductUpdate,
-    DepartmentRead, StockLevel
+    DepartmentRead, StockLevel, RepriceRequest, RepriceResult,
+    ProductPriceCreate, PriceAtRead
 )
 from app.security import get_current_user
+from app.crud.products import sync_price_tiers, sync_extra_variants
+from app.crud.pricing import reprice_variants, record_price_history, prices_at
+from app.utils import ref_cache
 
 router = APIRouter()
 
@@ -91,18 +97,10 @@ def _safe_decimal(val, default: Decimal = Decimal(0)) -> Decimal:
 # 0. Departamentos (Categories)
 # -----------------------------
 @router.get("/departments", response_model=List[DepartmentRead], tags=["Departamentos"])
-def read_departments(db: Session = Depends(get_db)):
-    # Seed básico si está vacío
-    if db.query(Category).count() == 0:
-        db.add_all([
-            Category(name="General"),
-            Category(name="Abarrotes"),
-            Category(name="Bebidas"),
-            Category(name="Farmacia"),
-            Category(name="Limpieza"),
-        ])
-        db.commit()
-    return db.query(Category).all()
+def read_departments(request: Request, response: Response, db: Session = Depends(get_db)):
+    # Catálogo cacheado (el seed básico si está vacío lo hace el cargador)
+    departments, version = ref_cache.get_departments(db)
+    return ref_cache.not_modified(request, response, ref_cache.DEPARTMENTS, version) or departments
 
 
 # -----------------------------
@@ -195,6 +193,9 @@ def create_product(
             unit_price=p_price.unit_price,
         ))
 
+    # Precio inicial en el historial
+    record_price_history(db, [new_variant.id], source="CREATE", user_id=current_user.id)
+
     # Stock inicial + movimiento inventario
     initial_stock = prod_in.initial_stock or Decimal(0)
 
@@ -277,53 +278,99 @@ def update_product(
 
         if prod_in.barcode is not None:
             v.barcode = prod_in.barcode
-        if prod_in.price is not None:
+        repriced_ids = []
+        if prod_in.price is not None and prod_in.price != v.price:
             v.price = prod_in.price
-        if prod_in.cost is not None:
+            repriced_ids.append(v.id)
+        if prod_in.cost is not None and prod_in.cost != v.cost:
             v.cost = prod_in.cost
+            repriced_ids.append(v.id)
 
-        # Reemplazar lista de precios escalonados
+        # Sincronizar precios escalonados (solo los renglones que cambian)
         if prod_in.prices is not None:
-            db.query(ProductPrice).filter(ProductPrice.variant_id == v.id).delete()
-            for p_price in prod_in.prices:
-                db.add(ProductPrice(
-                    variant_id=v.id,
-                    price_name=p_price.price_name,
-                    min_quantity=p_price.min_quantity,
-                    unit_price=p_price.unit_price,
-                ))
-
-        # 2. Add/Sync Extra Variants
-        # Strategy: We will delete non-main variants and recreate them from the list, 
-        # unless we want to be smarter. For simplicity: Delete all EXCEPT main, then add new ones.
-        # Main variant is 'v' (variants[0]).
-        
+            if sync_price_tiers(db, v.id, list(v.prices or []), prod_in.prices):
+                repriced_ids.append(v.id)
+
+        # Sincronizar variantes extra por SKU (conserva ids y FKs de ventas/kardex)
         if prod_in.extra_variants is not None:
-             # Delete all variants of this product where id != v.id
-             db.query(ProductVariant).filter(
-                 ProductVariant.product_id == product.id,
-                 ProductVariant.id != v.id
-             ).delete()
-             
-             for extra in prod_in.extra_variants:
-                 if extra.sku == v.sku: continue # Skip if matches main
-                 
-                 # Check global SKU uniqueness (optional but recommended)
-                 # existing = db.query(ProductVariant).filter(ProductVariant.sku == extra.sku).first()
-                 # if existing: raise ...
-                 
-                 db.add(ProductVariant(
-                    product_id=product.id,
-                    sku=extra.sku,
-                    variant_name=extra.variant_name,
-                    price=extra.price,
-                    cost=extra.cost or v.cost
-                 ))
+            repriced_skus = sync_extra_variants(db, product, v, prod_in.extra_variants)
+            if repriced_skus:
+                db.flush()
+                repriced_ids.extend(
+                    r[0] for r in db.query(ProductVariant.id).filter(ProductVariant.sku.in_(repriced_skus))
+                )
+
+        # Historial de precios (una foto por variante afectada)
+        record_price_history(db, repriced_ids, source="EDIT", user_id=current_user.id)
 
     db.commit()
     return {"msg": "Actualizado correctamente"}
 
 
+# -----------------------------
+# 3.1 Re-precio masivo (departamento / marca / lista de SKUs)
+# -----------------------------
+@router.post("/reprice", response_model=RepriceResult)
+def reprice_products(
+    rule: RepriceRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Cambia precios en bloque con UPDATEs por conjunto:
+    - percent: precio * (1 + value/100)
+    - amount:  precio + value
+    - margin:  costo * (1 + value/100)
+    Opcionalmente redondea a una terminación (.50, .90) y escala los escalonados.
+    """
+    if current_user.role not in (Role.ADMINISTRADOR, Role.GERENTE, Role.DUEÑO):
+        raise HTTPException(status_code=403, detail="Requiere permisos de gerente, dueño o administrador")
+
+    if rule.department_id is None and rule.brand_id is None and not rule.skus:
+        raise HTTPException(status_code=400, detail="Indique departamento, marca o lista de SKUs.")
+
+    if rule.rounding is not None and not (Decimal(0) <= rule.rounding < Decimal(1)):
+        raise HTTPException(status_code=400, detail="El redondeo debe ser una terminación entre 0.00 y 0.99")
+
+    result = reprice_variants(db, rule, user_id=current_user.id)
+    db.commit()
+    return result
+
+
+# -----------------------------
+# 3.2 Historial de precios
+# -----------------------------
+@router.get("/price-history/at", response_model=List[PriceAtRead])
+def read_prices_at(
+    at: datetime,
+    variant_ids: List[int] = Query(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Precio/costo vigente de N variantes en el instante `at` (una sola consulta).
+    Ej: /api/products/price-history/at?at=2025-01-31T23:59:59&variant_ids=1&variant_ids=2
+    """
+    return prices_at(db, variant_ids, at)
+
+
+@router.get("/price-history/{variant_id}", response_model=List[PriceAtRead])
+def read_price_history(
+    variant_id: int,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Línea de tiempo de precios/costos de una variante (más reciente primero)."""
+    return (
+        db.query(ProductPriceHistory)
+        .filter(ProductPriceHistory.variant_id == variant_id)
+        .order_by(ProductPriceHistory.effective_at.desc(), ProductPriceHistory.id.desc())
+        .limit(limit)
+        .all()
+    )
+
+
 # -----------------------------
 # 4. Eliminar (soft delete)
 # -----------------------------
@@ -505,6 +552,7 @@ async def upload_products(
     created_count = 0
     updated_count = 0
     failed_count = 0
+    repriced_ids = []  # Variantes con precio/costo nuevo o modificado (historial)
 
     for _, row in df.iterrows():
         try:
@@ -529,6 +577,7 @@ async def upload_products(
                 new_dept = Category(name=raw_dept)
                 db.add(new_dept)
                 db.flush()
+                ref_cache.invalidate(db, ref_cache.DEPARTMENTS)
                 dept_id = new_dept.id
                 dept_map[raw_dept.lower()] = dept_id
 
@@ -542,6 +591,8 @@ async def upload_products(
                 prod.name = raw_name if raw_name else prod.name
                 prod.category_id = dept_id
                 
+                if existing_variant.price != price_base or existing_variant.cost != cost:
+                    repriced_ids.append(existing_variant.id)
                 existing_variant.price = price_base
                 existing_variant.cost = cost
                 updated_count += 1
@@ -571,6 +622,7 @@ async def upload_products(
                 )
                 db.add(variant)
                 db.flush()
+                repriced_ids.append(variant.id)
                 created_count += 1
                 is_new = True
 
@@ -615,31 +667,31 @@ async def upload_products(
 
             # --- TIERED PRICES ---
             # Parse dynamic columns p1 nombre, p1 min, p1 precio, etc.
-            # We first clear existing tiers if we detect new ones to avoid dups? 
-            # Or maybe only if 'p1 nombre' is present?
-            # Let's replace only if columns exist.
+            # Only if columns exist; sync against current tiers so unchanged rows are untouched.
             
             has_tier_cols = any(c.startswith("p1") for c in df.columns)
             if has_tier_cols:
-                # Delete existing
-                db.query(ProductPrice).filter(ProductPrice.variant_id == variant.id).delete()
-                
+                tiers_in = []
                 for i in range(1, 6): # Up to 5
                     p_name = row.get(f"p{i} nombre")
                     p_min = row.get(f"p{i} min")
                     p_val = row.get(f"p{i} precio")
                     
                     if p_name and not pd.isna(p_name) and p_val and not pd.isna(p_val):
-                        db.add(ProductPrice(
-                            variant_id=variant.id,
+                        tiers_in.append(ProductPriceCreate(
                             price_name=str(p_name),
                             min_quantity=_safe_decimal(p_min, 1),
                             unit_price=_safe_decimal(p_val, 0)
                         ))
 
+                existing_tiers = [] if is_new else list(variant.prices or [])
+                if sync_price_tiers(db, variant.id, existing_tiers, tiers_in):
+                    repriced_ids.append(variant.id)
+
         except Exception as e:
             print(f"Error row: {e}")
             failed_count += 1
 
+    record_price_history(db, repriced_ids, source="UPLOAD", user_id=current_user.id)
     db.commit()
     return {"created": created_count, "updated": updated_count, "failed": failed_count}
@@ -4,6 +4,7 @@ from decimal import Decimal
 from app.database import get_db
 from app.models import ProductVariant, StockOnHand, InventoryMovement, MovementType
 from app.security import get_current_user, User
+from app.crud.pricing import record_price_history
 
 router = APIRouter()
 
@@ -28,7 +29,10 @@ def receive_inventory(
 
     # 2. Actualizar costo en la variante (Importante para reportes de utilidad)
     variant = db.query(ProductVariant).get(variant_id)
+    cost_changed = variant.cost != cost
     variant.cost = cost 
+    if cost_changed:
+        record_price_history(db, [variant.id], source="PURCHASE", user_id=current_user.id)
 
     # 3. Aumentar Stock y registrar movimiento
     qty_before = stock.qty_on_hand
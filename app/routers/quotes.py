@@ -13,6 +13,9 @@ from app.models import (
 from app.schemas.sales import SaleCreate
 from app.security import get_current_user, User
 from app.utils.folios import get_next_folio
+from app.utils.business_date import business_date_for
+from app.crud import rollups
+from app.crud import cash as crud_cash
 from app.utils.pdf_generator import generate_quote_pdf
 
 router = APIRouter()
@@ -60,7 +63,8 @@ def create_quote(
         customer_id=quote_in.customer_id,
         total_amount=total_amount,
         series="Q",
-        folio=next_folio
+        folio=next_folio,
+        business_date=business_date_for(db, current_user.branch_id)
     )
     db.add(new_quote)
     db.flush()
@@ -110,8 +114,8 @@ def convert_quote_to_sale(
     if not quote:
         raise HTTPException(404, "Cotización no encontrada")
     
-    if quote.status == DocumentStatus.COMPLETED:
-        raise HTTPException(400, "Esta cotización ya fue procesada")
+    if quote.status == DocumentStatus.CANCELLED:
+        raise HTTPException(400, "Esta cotización está cancelada")
 
     # Validar stock al momento de convertir
     for line in quote.lines:
@@ -125,8 +129,9 @@ def convert_quote_to_sale(
 
     # Convertir a INVOICE
     quote.doc_type = DocumentType.INVOICE
-    quote.status = DocumentStatus.COMPLETED
+    quote.status = DocumentStatus.PAID
     quote.created_at = datetime.now()
+    quote.business_date = business_date_for(db, current_user.branch_id)
     
     # Nuevo folio de venta (Serie A)
     quote.series = "A"
@@ -138,7 +143,9 @@ def convert_quote_to_sale(
         amount=quote.total_amount,
         method=payment_method,
         created_by_id=current_user.id,
-        reference=f"Conv. desde Q-{quote.folio}"
+        reference=f"Conv. desde Q-{quote.folio}",
+        business_date=quote.business_date,
+        **crud_cash.session_stamp(crud_cash.get_open_session(db, current_user.id))
     )
     db.add(new_payment)
 
@@ -150,6 +157,8 @@ def convert_quote_to_sale(
         
         qty_before = stock.qty_on_hand
         stock.qty_on_hand -= Decimal(str(line.quantity))
+        # Costo al momento de la venta (para margen); la cotización no lo guarda
+        line.unit_cost = line.variant.cost
 
         db.add(InventoryMovement(
             branch_id=current_user.branch_id,
@@ -162,5 +171,9 @@ def convert_quote_to_sale(
             reference=f"Venta desde Q-{quote.folio}"
         ))
 
+    # Acumulados diarios para reportes (misma transacción)
+    rollups.apply_sale(db, quote, quote.lines, [new_payment])
+    crud_cash.apply_payments(db, [new_payment])
+
     db.commit()
     return {"status": "success", "new_folio": f"{quote.series}-{quote.folio}"}
\ No newline at end of file
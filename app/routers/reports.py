@@ -1,73 +1,894 @@
 #app/routers/reports.py
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, case, and_, or_, extract, type_coerce, Float, select, union, union_all
+import csv
+import io
+import numpy as np
+import pandas as pd
 from decimal import Decimal
-from datetime import datetime, date, timedelta
-from typing import List, Dict, Any
+from datetime import datetime, date, time, timedelta, timezone
+from typing import List, Dict, Any, Optional
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
 from app.models import (
     SalesDocument, SalesLineItem, Payment, 
-    ProductVariant, Customer, CashSession, DocumentStatus, CustomerLedgerEntry
+    ProductVariant, Customer, CashSession, DocumentStatus, CustomerLedgerEntry,
+    Product, DailySales, DailyPayments, DailyVariantSales, HourlySales,
+    DocumentType, StockOnHand, CustomerRFM, Role, Category, Brand, Branch, SaleReturn, SaleReturnItem
 )
 from app.security import get_current_user, User
-from app.schemas.reports import AgingReportResponse
+from app.schemas.reports import AgingReportResponse, OverdueInvoice
+from app.crud import crm as crud_crm
+from app.crud import rollups
+from app.crud.basket import mine_association_rules
+from app.utils.business_date import branch_today, branch_zone
+from app.utils import report_cache, report_jobs
 
 
 router = APIRouter()
 
+def _compute_daily_summary(db: Session, branch_id: int, target_date: date) -> dict:
+    # 1. Ventas Totales y Utilidad Bruta (Venta - Costo)
+    day = db.query(DailySales).filter(
+        DailySales.branch_id == branch_id,
+        DailySales.business_date == target_date
+    ).first()
+
+    # 2. Desglose por Métodos de Pago
+    payments_breakdown = db.query(DailyPayments).filter(
+        DailyPayments.branch_id == branch_id,
+        DailyPayments.business_date == target_date,
+        DailyPayments.amount != 0
+    ).all()
+
+    # 3. Top 5 Productos más vendidos
+    top_products = db.query(
+        Product.name,
+        ProductVariant.variant_name,
+        DailyVariantSales.units
+    ).join(ProductVariant, ProductVariant.id == DailyVariantSales.variant_id
+    ).join(Product, Product.id == ProductVariant.product_id
+    ).filter(
+        DailyVariantSales.branch_id == branch_id,
+        DailyVariantSales.business_date == target_date,
+        DailyVariantSales.units > 0
+    ).order_by(desc(DailyVariantSales.units)).limit(5).all()
+
+    total_revenue = day.total_amount if day else Decimal(0)
+    gross_profit = (day.total_amount - day.total_cost) if day else Decimal(0)
+
+    return {
+        "date": target_date,
+        "transactions_count": day.tickets_count if day else 0,
+        "total_revenue": float(total_revenue),
+        "gross_profit": float(gross_profit),
+        "returns_amount": float(day.returns_amount) if day else 0.0,
+        "payments": {p.method: float(p.amount) for p in payments_breakdown},
+        "top_selling_items": [
+            {
+                "name": f"{p.name} ({p.variant_name})" if p.variant_name and p.variant_name != "Estándar" else p.name,
+                "quantity": float(p.units)
+            }
+            for p in top_products
+        ]
+    }
+
 @router.get("/daily-summary")
 def get_daily_summary(
-    target_date: date = date.today(),
+    target_date: Optional[date] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Resumen de ventas, métodos de pago y utilidad del día."""
-    
-    # 1. Ventas Totales por Estatus
-    sales_query = db.query(
-        func.count(SalesDocument.id).label("count"),
-        func.sum(SalesDocument.total_amount).label("total")
-    ).filter(
-        func.date(SalesDocument.created_at) == target_date,
-        SalesDocument.branch_id == current_user.branch_id
-    ).first()
+    """
+    Resumen de ventas, métodos de pago y utilidad del día.
+    El día es el `business_date` (día local de la sucursal); se lee de los acumulados diarios.
+    Resultado cacheado por sucursal y día (se invalida al registrar ventas de ese día).
+    """
+    branch_id = current_user.branch_id
+    if target_date is None:
+        target_date = branch_today(db, branch_id)
 
-    # 2. Desglose por Métodos de Pago
-    payments_breakdown = db.query(
-        Payment.method,
-        func.sum(Payment.amount).label("total")
-    ).join(SalesDocument).filter(
-        func.date(Payment.created_at) == target_date,
-        SalesDocument.branch_id == current_user.branch_id
-    ).group_by(Payment.method).all()
+    return report_cache.cached(
+        "reports.daily_summary", branch_id, {"target_date": target_date},
+        lambda: _compute_daily_summary(db, branch_id, target_date),
+        start=target_date, end=target_date
+    )
 
-    # 3. Top 5 Productos más vendidos
+# -----------------------------
+# Dashboard (index.html)
+# -----------------------------
+DASHBOARD_RECENT = 10
+DASHBOARD_TOP = 5
+
+
+def _compute_dashboard(db: Session, branch_id: int, today: date, days: int, low_stock_threshold: float) -> dict:
+    """
+    Todo lo que pinta el dashboard en pocas consultas agregadas:
+    acumulados diarios para KPIs/tendencia/pagos/top, y SQL directo para
+    ventas por hora, últimas ventas y stock bajo (solo columnas necesarias).
+    """
+    start = today - timedelta(days=days - 1)
+
+    # 1. Tendencia y KPIs del día (acumulados diarios)
+    daily_rows = db.query(DailySales).filter(
+        DailySales.branch_id == branch_id,
+        DailySales.business_date >= start,
+        DailySales.business_date <= today
+    ).order_by(DailySales.business_date).all()
+    by_day = {r.business_date: r for r in daily_rows}
+    trend = [
+        {"date": start + timedelta(days=i),
+         "total": float(by_day[start + timedelta(days=i)].total_amount) if start + timedelta(days=i) in by_day else 0.0}
+        for i in range(days)
+    ]
+    today_row = by_day.get(today)
+    sales_today = today_row.total_amount if today_row else Decimal(0)
+    tickets_today = today_row.tickets_count if today_row else 0
+
+    # 2. Métodos de pago del periodo
+    payments = db.query(DailyPayments.method, func.sum(DailyPayments.amount)).filter(
+        DailyPayments.branch_id == branch_id,
+        DailyPayments.business_date >= start,
+        DailyPayments.business_date <= today
+    ).group_by(DailyPayments.method).all()
+
+    # 3. Top productos del periodo
+    units = func.sum(DailyVariantSales.units)
     top_products = db.query(
-        SalesLineItem.description,
-        func.sum(SalesLineItem.quantity).label("qty")
-    ).join(SalesDocument).filter(
-        func.date(SalesDocument.created_at) == target_date
-    ).group_by(SalesLineItem.description).order_by(desc("qty")).limit(5).all()
-
-    # 4. Cálculo de Utilidad Bruta (Venta - Costo)
-    profit_data = db.query(
-        func.sum(SalesLineItem.total_line - (SalesLineItem.unit_cost * SalesLineItem.quantity))
-    ).join(SalesDocument).filter(
-        func.date(SalesDocument.created_at) == target_date,
-        SalesDocument.status == DocumentStatus.COMPLETED
-    ).scalar() or Decimal(0)
+        Product.name, ProductVariant.variant_name, units.label("units")
+    ).join(ProductVariant, ProductVariant.id == DailyVariantSales.variant_id
+    ).join(Product, Product.id == ProductVariant.product_id
+    ).filter(
+        DailyVariantSales.branch_id == branch_id,
+        DailyVariantSales.business_date >= start,
+        DailyVariantSales.business_date <= today
+    ).group_by(ProductVariant.id, Product.name, ProductVariant.variant_name
+    ).having(units > 0).order_by(desc("units")).limit(DASHBOARD_TOP).all()
+
+    # 4. Ventas por hora de hoy (acumulado por hora local de la sucursal)
+    hourly_rows = db.query(HourlySales.hour, HourlySales.total_amount).filter(
+        HourlySales.branch_id == branch_id,
+        HourlySales.business_date == today
+    ).all()
+    hourly = [0.0] * 24
+    for hour, total in hourly_rows:
+        hourly[hour] += float(total or 0)
+
+    # 5. Últimas ventas y cuentas por cobrar
+    recent = db.query(
+        SalesDocument.id, SalesDocument.series, SalesDocument.folio, SalesDocument.customer_id,
+        Customer.name.label("customer_name"), SalesDocument.total_amount,
+        SalesDocument.status, SalesDocument.created_at
+    ).outerjoin(Customer, Customer.id == SalesDocument.customer_id).filter(
+        SalesDocument.branch_id == branch_id,
+        SalesDocument.doc_type == DocumentType.INVOICE
+    ).order_by(SalesDocument.id.desc()).limit(DASHBOARD_RECENT).all()
+
+    pending_count = db.query(func.count(SalesDocument.id)).filter(
+        SalesDocument.branch_id == branch_id,
+        SalesDocument.doc_type == DocumentType.INVOICE,
+        SalesDocument.status == DocumentStatus.PENDING
+    ).scalar() or 0
+
+    # 6. Stock bajo en la sucursal
+    low_stock_filter = (
+        StockOnHand.branch_id == branch_id,
+        StockOnHand.qty_on_hand <= low_stock_threshold,
+        Product.is_active == True
+    )
+    low_stock_base = db.query(StockOnHand).join(
+        ProductVariant, ProductVariant.id == StockOnHand.variant_id
+    ).join(Product, Product.id == ProductVariant.product_id).filter(*low_stock_filter)
+    low_stock_count = low_stock_base.with_entities(func.count(StockOnHand.id)).scalar() or 0
+    low_stock_items = low_stock_base.with_entities(
+        Product.name, ProductVariant.sku, StockOnHand.qty_on_hand
+    ).order_by(StockOnHand.qty_on_hand, Product.name).limit(DASHBOARD_RECENT).all()
 
     return {
-        "date": target_date,
-        "transactions_count": sales_query.count or 0,
-        "total_revenue": float(sales_query.total or 0),
-        "gross_profit": float(profit_data),
-        "payments": {p.method: float(p.total) for p in payments_breakdown},
-        "top_selling_items": [{"name": p.description, "quantity": float(p.qty)} for p in top_products]
+        "date": today,
+        "kpis": {
+            "sales_today": float(sales_today),
+            "tickets_today": tickets_today,
+            "average_ticket": float(sales_today / tickets_today) if tickets_today else 0.0,
+            "returns_today": float(today_row.returns_amount) if today_row else 0.0,
+            "pending_count": pending_count,
+            "low_stock_count": low_stock_count,
+        },
+        "trend": trend,
+        "payments": {method.value: float(amount or 0) for method, amount in payments},
+        "top_products": [
+            {
+                "name": f"{p.name} ({p.variant_name})" if p.variant_name and p.variant_name != "Estándar" else p.name,
+                "quantity": float(p.units)
+            }
+            for p in top_products
+        ],
+        "hourly": hourly,
+        "recent_sales": [
+            {
+                "id": r.id,
+                "folio": f"{r.series}-{r.folio}" if r.series else str(r.folio or r.id),
+                "customer_name": r.customer_name,
+                "total_amount": float(r.total_amount or 0),
+                "status": r.status.value if r.status else None,
+                "created_at": r.created_at,
+            }
+            for r in recent
+        ],
+        "low_stock": [
+            {"name": r.name, "sku": r.sku, "qty": float(r.qty_on_hand)}
+            for r in low_stock_items
+        ],
+    }
+
+
+@router.get("/dashboard")
+def get_dashboard(
+    days: int = Query(7, ge=1, le=90),
+    low_stock_threshold: float = 5,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    KPIs del día, tendencia, métodos de pago, top productos, ventas por hora,
+    últimas ventas y stock bajo de la sucursal en una sola respuesta pequeña.
+    Cacheado por sucursal (se invalida al registrar ventas del periodo).
+    """
+    branch_id = current_user.branch_id
+    today = branch_today(db, branch_id)
+    return report_cache.cached(
+        "reports.dashboard", branch_id,
+        {"today": today, "days": days, "low_stock_threshold": low_stock_threshold},
+        lambda: _compute_dashboard(db, branch_id, today, days, low_stock_threshold),
+        start=today - timedelta(days=days - 1), end=today
+    )
+
+
+# -----------------------------
+# Clasificación ABC (Pareto)
+# -----------------------------
+ABC_CACHE_TTL = 300
+ABC_COLUMNS = ["variant_id", "sku", "product_name", "variant_name", "units", "revenue", "cost"]
+ABC_ITEM_COLUMNS = ["variant_id", "sku", "name", "units", "revenue", "cost", "margin", "margin_pct",
+                    "revenue_share", "cumulative_share", "abc_class", "margin_share", "margin_class"]
+
+
+def _abc_classes(values: np.ndarray, a_share: float, b_share: float):
+    """
+    Participación, acumulado y clase ABC de cada valor (ya ordenados de mayor a menor).
+    La clase se decide con el acumulado previo: el renglón que cruza el umbral entra a la clase.
+    Los valores <= 0 siempre son C.
+    """
+    positive = np.clip(values, 0, None)
+    total = positive.sum()
+    share = positive / total if total else np.zeros_like(positive)
+    cumulative = np.cumsum(share)
+    previous = cumulative - share
+    classes = np.select([previous < a_share, previous < b_share], ["A", "B"], "C")
+    classes[positive <= 0] = "C"
+    return share, cumulative, classes
+
+
+def _compute_abc(db: Session, branch_id: int, start: date, end: date, a_share: float, b_share: float) -> dict:
+    # 1. Una sola consulta agrupada por variante sobre el acumulado diario
+    # (sumas como Float y ejecución sin ORM: evita crear objetos por renglón)
+    query = db.query(
+        DailyVariantSales.variant_id, ProductVariant.sku, Product.name, ProductVariant.variant_name,
+        type_coerce(func.sum(DailyVariantSales.units), Float),
+        type_coerce(func.sum(DailyVariantSales.revenue), Float),
+        type_coerce(func.sum(DailyVariantSales.cost), Float)
+    ).join(ProductVariant, ProductVariant.id == DailyVariantSales.variant_id
+    ).join(Product, Product.id == ProductVariant.product_id
+    ).filter(
+        DailyVariantSales.branch_id == branch_id,
+        DailyVariantSales.business_date >= start,
+        DailyVariantSales.business_date <= end
+    ).group_by(DailyVariantSales.variant_id, ProductVariant.sku, Product.name, ProductVariant.variant_name)
+
+    df = pd.DataFrame(db.execute(query.statement).fetchall(), columns=ABC_COLUMNS)
+    df[["units", "revenue", "cost"]] = df[["units", "revenue", "cost"]].astype(float).fillna(0.0)
+    df = df[df["units"] > 0].copy()
+
+    # 2. Pareto por venta
+    df = df.sort_values(["revenue", "variant_id"], ascending=[False, True], kind="mergesort")
+    df["revenue_share"], df["cumulative_share"], df["abc_class"] = _abc_classes(df["revenue"].to_numpy(), a_share, b_share)
+
+    # 3. Pareto por contribución al margen (las variantes con margen negativo quedan en C)
+    df["margin"] = df["revenue"] - df["cost"]
+    df["margin_pct"] = np.where(df["revenue"] > 0, df["margin"] / df["revenue"].where(df["revenue"] > 0, 1) * 100, 0.0)
+    by_margin = df["margin"].sort_values(ascending=False, kind="mergesort")
+    share, _, classes = _abc_classes(by_margin.to_numpy(), a_share, b_share)
+    df["margin_share"] = pd.Series(share, index=by_margin.index)
+    df["margin_class"] = pd.Series(classes, index=by_margin.index)
+
+    df["name"] = np.where(
+        df["variant_name"].isna() | (df["variant_name"] == "Estándar"),
+        df["product_name"], df["product_name"] + " (" + df["variant_name"].fillna("") + ")"
+    )
+    for col in ("revenue", "cost", "margin", "margin_pct"):
+        df[col] = df[col].round(2)
+    for col in ("revenue_share", "cumulative_share", "margin_share"):
+        df[col] = df[col].round(6)
+
+    summary = df.groupby("abc_class").agg(
+        skus=("variant_id", "size"), units=("units", "sum"), revenue=("revenue", "sum"), margin=("margin", "sum")
+    ).reindex(["A", "B", "C"], fill_value=0)
+    total_revenue = float(df["revenue"].sum())
+
+    return {
+        "from": start,
+        "to": end,
+        "thresholds": {"A": a_share, "B": b_share},
+        "total_skus": int(len(df)),
+        "total_revenue": round(total_revenue, 2),
+        "total_margin": round(float(df["margin"].sum()), 2),
+        "classes": {
+            cls: {
+                "skus": int(r.skus),
+                "units": float(r.units),
+                "revenue": round(float(r.revenue), 2),
+                "margin": round(float(r.margin), 2),
+                "revenue_share": round(float(r.revenue) / total_revenue, 6) if total_revenue else 0.0,
+            }
+            for cls, r in summary.iterrows()
+        },
+        # Se guarda el DataFrame: cada petición convierte a dict solo su página
+        "frame": df[ABC_ITEM_COLUMNS].reset_index(drop=True),
+    }
+
+
+@router.get("/abc")
+def get_abc_report(
+    start_date: Optional[date] = Query(None, alias="from"),
+    end_date: Optional[date] = Query(None, alias="to"),
+    a_share: float = Query(0.80, gt=0, lt=1),
+    b_share: float = Query(0.95, gt=0, lt=1),
+    abc_class: Optional[str] = Query(None, pattern="^[ABC]$"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=100000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Clasificación ABC de variantes por venta y por contribución al margen en el periodo
+    (default: últimos 90 días). Lee el acumulado diario por variante en una consulta
+    agrupada; acumulados y clases se calculan vectorizados. Cacheado por sucursal y periodo.
+    """
+    if a_share >= b_share:
+        raise HTTPException(status_code=400, detail="El umbral A debe ser menor que el umbral B")
+
+    branch_id = current_user.branch_id
+    end = end_date or branch_today(db, branch_id)
+    start = start_date or end - timedelta(days=89)
+    if start > end:
+        raise HTTPException(status_code=400, detail="La fecha inicial es posterior a la final")
+
+    report = report_cache.cached(
+        "reports.abc", branch_id, {"start": start, "end": end, "a": a_share, "b": b_share},
+        lambda: _compute_abc(db, branch_id, start, end, a_share, b_share),
+        ttl=ABC_CACHE_TTL, start=start, end=end
+    )
+    frame = report["frame"]
+    if abc_class:
+        frame = frame[frame["abc_class"] == abc_class]
+    return {
+        **{k: v for k, v in report.items() if k != "frame"},
+        "items": frame.iloc[skip:skip + limit].to_dict("records"),
+    }
+
+
+# -----------------------------
+# Canasta de compra (reglas de asociación)
+# -----------------------------
+BASKET_TTL = 3600
+
+
+def _basket_job(branch_id: int, start: date, end: date, min_support: float, min_confidence: float, max_rules: int):
+    # Corre en un hilo del pool: usa su propia sesión
+    db = SessionLocal()
+    try:
+        return mine_association_rules(db, branch_id, start, end, min_support, min_confidence, max_rules)
+    finally:
+        db.close()
+
+
+@router.get("/basket")
+def get_basket_rules(
+    start_date: Optional[date] = Query(None, alias="from"),
+    end_date: Optional[date] = Query(None, alias="to"),
+    min_support: float = Query(0.01, gt=0, le=1),
+    min_confidence: float = Query(0.2, ge=0, le=1),
+    max_rules: int = Query(200, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Reglas "quien compra A también compra B" (soporte, confianza, lift) del periodo
+    (default: últimos 90 días). Se calcula en segundo plano: mientras corre responde
+    202 con status "running"; después devuelve el resultado cacheado por periodo.
+    Por ticket se cruzan a lo más MAX_BASKET variantes frecuentes (crud.basket); los tickets
+    más grandes se reportan en `truncated_transactions`.
+    """
+    branch_id = current_user.branch_id
+    end = end_date or branch_today(db, branch_id)
+    start = start_date or end - timedelta(days=89)
+    if start > end:
+        raise HTTPException(status_code=400, detail="La fecha inicial es posterior a la final")
+
+    job = report_jobs.get_or_submit(
+        "reports.basket", branch_id,
+        {"start": start, "end": end, "min_support": min_support,
+         "min_confidence": min_confidence, "max_rules": max_rules},
+        lambda: _basket_job(branch_id, start, end, min_support, min_confidence, max_rules),
+        ttl=BASKET_TTL
+    )
+    if job["status"] == "error":
+        raise HTTPException(status_code=500, detail="Error calculando la canasta; intente de nuevo más tarde.")
+    if job["status"] == "running":
+        return JSONResponse(status_code=202, content=jsonable_encoder(job))
+    return job
+
+
+# -----------------------------
+# Mapa de calor (día de la semana x hora)
+# -----------------------------
+WEEKDAYS = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+
+
+@router.get("/heatmap")
+def get_sales_heatmap(
+    start_date: Optional[date] = Query(None, alias="from"),
+    end_date: Optional[date] = Query(None, alias="to"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Matrices 7x24 (fila 0 = lunes, columna = hora local) de tickets, venta, ticket
+    promedio, unidades por ticket y tickets promedio por día (para programar cajeros).
+    Default: últimos 90 días. Lee el acumulado por hora en una sola consulta agrupada.
+    """
+    branch_id = current_user.branch_id
+    end = end_date or branch_today(db, branch_id)
+    start = start_date or end - timedelta(days=89)
+    if start > end:
+        raise HTTPException(status_code=400, detail="La fecha inicial es posterior a la final")
+
+    # strftime('%w') en SQLite: 0 = domingo
+    weekday = extract("dow", HourlySales.business_date)
+    rows = db.execute(
+        db.query(
+            weekday, HourlySales.hour,
+            func.sum(HourlySales.tickets_count),
+            type_coerce(func.sum(HourlySales.total_amount), Float),
+            type_coerce(func.sum(HourlySales.units), Float),
+        ).filter(
+            HourlySales.branch_id == branch_id,
+            HourlySales.business_date >= start,
+            HourlySales.business_date <= end
+        ).group_by(weekday, HourlySales.hour).statement
+    ).fetchall()
+
+    tickets = np.zeros((7, 24))
+    revenue = np.zeros((7, 24))
+    units = np.zeros((7, 24))
+    if rows:
+        data = np.array([tuple(r) for r in rows], dtype=np.float64)
+        dow, hour = (data[:, 0].astype(int) + 6) % 7, data[:, 1].astype(int)
+        tickets[dow, hour] = data[:, 2]
+        revenue[dow, hour] = np.nan_to_num(data[:, 3])
+        units[dow, hour] = np.nan_to_num(data[:, 4])
+
+    # Cuántas veces aparece cada día de la semana en el periodo
+    days = (end - start).days + 1
+    occurrences = np.bincount((start.weekday() + np.arange(days)) % 7, minlength=7)[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg_ticket = np.where(tickets > 0, revenue / tickets, 0.0)
+        units_per_ticket = np.where(tickets > 0, units / tickets, 0.0)
+    tickets_per_day = tickets / np.maximum(occurrences, 1)
+
+    return {
+        "from": start,
+        "to": end,
+        "weekdays": WEEKDAYS,
+        "hours": list(range(24)),
+        "tickets": tickets.astype(int).tolist(),
+        "revenue": revenue.round(2).tolist(),
+        "avg_ticket": avg_ticket.round(2).tolist(),
+        "units_per_ticket": units_per_ticket.round(2).tolist(),
+        "avg_tickets_per_day": tickets_per_day.round(2).tolist(),
+        "totals": {
+            "tickets": int(tickets.sum()),
+            "revenue": round(float(revenue.sum()), 2),
+            "avg_ticket": round(float(revenue.sum() / tickets.sum()), 2) if tickets.sum() else 0.0,
+        },
+    }
+
+
+# -----------------------------
+# Margen bruto por departamento / marca / variante / vendedor / sucursal
+# -----------------------------
+MARGIN_COLUMNS = ["id", "name", "units", "revenue", "cost", "margin", "margin_pct"]
+
+
+def _margin_query(db: Session, group_by: str, branch_id: Optional[int], start: date, end: date):
+    """
+    Una sola consulta agrupada con venta y costo netos de devoluciones
+    (costo = unit_cost capturado en la venta; lo devuelto se descuenta con ese mismo costo
+    en el día en que se registró la devolución).
+    Departamento, marca, variante y sucursal salen del acumulado diario por variante;
+    vendedor de las partidas de venta y de devolución (el acumulado no guarda vendedor).
+    Cada renglón trae además los totales del periodo (ventana sobre el agrupado).
+    """
+    if group_by == "seller":
+        sold = select(
+            SalesDocument.seller_id.label("seller_id"),
+            SalesLineItem.quantity.label("units"),
+            SalesLineItem.total_line.label("revenue"),
+            (func.coalesce(SalesLineItem.unit_cost, 0) * SalesLineItem.quantity).label("cost"),
+        ).join(SalesDocument, SalesDocument.id == SalesLineItem.document_id).where(
+            SalesDocument.branch_id == branch_id,
+            SalesDocument.doc_type == DocumentType.INVOICE,
+            SalesDocument.status != DocumentStatus.CANCELLED,
+            SalesDocument.business_date >= start,
+            SalesDocument.business_date <= end
+        )
+        costs = rollups.sale_unit_costs()
+        returned = select(
+            SalesDocument.seller_id,
+            -SaleReturnItem.quantity,
+            -SaleReturnItem.refund_amount,
+            -(SaleReturnItem.quantity * func.coalesce(costs.c.unit_cost, 0)),
+        ).select_from(SaleReturn).join(SaleReturnItem, SaleReturnItem.return_id == SaleReturn.id
+        ).join(SalesDocument, SalesDocument.id == SaleReturn.sale_id
+        ).outerjoin(costs, and_(costs.c.document_id == SaleReturn.sale_id,
+                                costs.c.variant_id == SaleReturnItem.variant_id)).where(
+            SaleReturn.branch_id == branch_id,
+            SaleReturn.business_date >= start,
+            SaleReturn.business_date <= end
+        )
+        moves = union_all(sold, returned).subquery()
+        units = func.sum(moves.c.units)
+        revenue = func.sum(moves.c.revenue)
+        cost = func.sum(moves.c.cost)
+        key = moves.c.seller_id
+        name = func.coalesce(User.full_name, User.username)
+        query = db.query(moves).outerjoin(User, User.id == moves.c.seller_id)
+    else:
+        units = func.sum(DailyVariantSales.units - DailyVariantSales.units_returned)
+        revenue = func.sum(DailyVariantSales.revenue - DailyVariantSales.refunds)
+        cost = func.sum(DailyVariantSales.cost - DailyVariantSales.cost_returned)
+        query = db.query(DailyVariantSales).filter(
+            DailyVariantSales.business_date >= start,
+            DailyVariantSales.business_date <= end
+        )
+        if branch_id is not None:
+            query = query.filter(DailyVariantSales.branch_id == branch_id)
+        if group_by == "branch":
+            key, name = DailyVariantSales.branch_id, Branch.name
+            query = query.join(Branch, Branch.id == DailyVariantSales.branch_id)
+        else:
+            query = query.join(ProductVariant, ProductVariant.id == DailyVariantSales.variant_id
+            ).join(Product, Product.id == ProductVariant.product_id)
+            if group_by == "department":
+                key, name = Product.category_id, func.coalesce(Category.name, "Sin departamento")
+                query = query.outerjoin(Category, Category.id == Product.category_id)
+            elif group_by == "brand":
+                key, name = Product.brand_id, func.coalesce(Brand.name, "Sin marca")
+                query = query.outerjoin(Brand, Brand.id == Product.brand_id)
+            else:
+                key = DailyVariantSales.variant_id
+                name = case(
+                    (or_(ProductVariant.variant_name.is_(None), ProductVariant.variant_name == "Estándar"), Product.name),
+                    else_=Product.name + " (" + ProductVariant.variant_name + ")"
+                )
+
+    revenue, cost = type_coerce(revenue, Float), type_coerce(cost, Float)
+    return query.with_entities(
+        key.label("id"),
+        name.label("name"),
+        type_coerce(units, Float).label("units"),
+        revenue.label("revenue"),
+        cost.label("cost"),
+        (revenue - cost).label("margin"),
+        func.count().over().label("total_groups"),
+        type_coerce(func.sum(revenue).over(), Float).label("total_revenue"),
+        type_coerce(func.sum(cost).over(), Float).label("total_cost"),
+    ).group_by(key, name).order_by(desc("revenue"), key)
+
+
+def _margin_row(row) -> dict:
+    revenue, cost = float(row.revenue or 0), float(row.cost or 0)
+    return {
+        "id": row.id,
+        "name": row.name,
+        "units": float(row.units or 0),
+        "revenue": round(revenue, 2),
+        "cost": round(cost, 2),
+        "margin": round(revenue - cost, 2),
+        "margin_pct": round((revenue - cost) / revenue * 100, 2) if revenue else 0.0,
+    }
+
+
+def _stream_margin_csv(query):
+    """Genera el CSV por bloques sin cargar todo el reporte en memoria."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(MARGIN_COLUMNS)
+    for i, row in enumerate(query.yield_per(500), start=1):
+        item = _margin_row(row)
+        writer.writerow([item[col] for col in MARGIN_COLUMNS])
+        if i % 500 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+@router.get("/margin")
+def get_margin_report(
+    group_by: str = Query("department", pattern="^(department|brand|variant|seller|branch)$"),
+    start_date: Optional[date] = Query(None, alias="from"),
+    end_date: Optional[date] = Query(None, alias="to"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=100000),
+    format: str = Query("json", pattern="^(json|csv)$"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Venta, costo y margen bruto del periodo (default: mes en curso) agrupados por
+    departamento, marca, variante, vendedor o sucursal (todas las sucursales; solo
+    administrador o dueño). format=csv devuelve el reporte completo en streaming.
+    """
+    branch_id = current_user.branch_id
+    end = end_date or branch_today(db, branch_id)
+    start = start_date or end.replace(day=1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="La fecha inicial es posterior a la final")
+    if group_by == "branch":
+        if current_user.role not in (Role.ADMINISTRADOR, Role.DUEÑO):
+            raise HTTPException(status_code=403, detail="Requiere permisos de administrador o dueño")
+        branch_id = None
+
+    query = _margin_query(db, group_by, branch_id, start, end)
+
+    if format == "csv":
+        headers = {"Content-Disposition": f'attachment; filename="margen_{group_by}_{start}_{end}.csv"'}
+        return StreamingResponse(_stream_margin_csv(query), media_type="text/csv", headers=headers)
+
+    rows = query.offset(skip).limit(limit).all()
+    total_revenue = float(rows[0].total_revenue or 0) if rows else 0.0
+    total_cost = float(rows[0].total_cost or 0) if rows else 0.0
+    return {
+        "from": start,
+        "to": end,
+        "group_by": group_by,
+        "total_groups": rows[0].total_groups if rows else 0,
+        "totals": {
+            "revenue": round(total_revenue, 2),
+            "cost": round(total_cost, 2),
+            "margin": round(total_revenue - total_cost, 2),
+            "margin_pct": round((total_revenue - total_cost) / total_revenue * 100, 2) if total_revenue else 0.0,
+        },
+        "rows": [_margin_row(r) for r in rows],
+    }
+
+
+# -----------------------------
+# Desempeño por cajero / vendedor
+# -----------------------------
+def _cashiers_query(branch_id: int, start: date, end: date, closed_from: datetime, closed_to: datetime):
+    """
+    Una sola sentencia: tickets con LAG por vendedor y día (segundos desde su ticket
+    anterior), unidades por ticket, y cortes de caja cerrados en el periodo.
+    """
+    in_period = and_(
+        SalesDocument.branch_id == branch_id,
+        SalesDocument.doc_type == DocumentType.INVOICE,
+        SalesDocument.business_date >= start,
+        SalesDocument.business_date <= end,
+    )
+    units = (
+        select(SalesLineItem.document_id, func.sum(SalesLineItem.quantity).label("units"))
+        .join(SalesDocument, SalesDocument.id == SalesLineItem.document_id)
+        .where(in_period)
+        .group_by(SalesLineItem.document_id)
+        .subquery("units")
+    )
+    previous = func.lag(SalesDocument.created_at).over(
+        partition_by=(SalesDocument.seller_id, SalesDocument.business_date),
+        order_by=SalesDocument.created_at,
+    )
+    tickets = (
+        select(
+            SalesDocument.seller_id,
+            SalesDocument.status,
+            SalesDocument.total_amount,
+            func.coalesce(units.c.units, 0).label("units"),
+            ((func.julianday(SalesDocument.created_at) - func.julianday(previous)) * 86400).label("gap"),
+        )
+        .outerjoin(units, units.c.document_id == SalesDocument.id)
+        .where(in_period)
+        .subquery("tickets")
+    )
+    valid = tickets.c.status != DocumentStatus.CANCELLED
+    sales = (
+        select(
+            tickets.c.seller_id,
+            func.count().filter(valid).label("tickets"),
+            type_coerce(func.sum(tickets.c.total_amount).filter(valid), Float).label("revenue"),
+            func.sum(tickets.c.units).filter(valid).label("units"),
+            func.count().filter(~valid).label("cancelled"),
+            func.avg(tickets.c.gap).label("avg_seconds_between_sales"),
+        )
+        .group_by(tickets.c.seller_id)
+        .subquery("sales")
+    )
+    cash = (
+        select(
+            CashSession.user_id,
+            func.count(CashSession.id).label("cash_sessions"),
+            type_coerce(func.sum(CashSession.difference), Float).label("cash_difference"),
+            type_coerce(func.sum(func.abs(CashSession.difference)), Float).label("cash_abs_difference"),
+            func.count().filter(CashSession.difference < 0).label("cash_shortages"),
+        )
+        .where(
+            CashSession.branch_id == branch_id,
+            CashSession.closed_at >= closed_from,
+            CashSession.closed_at < closed_to,
+        )
+        .group_by(CashSession.user_id)
+        .subquery("cash")
+    )
+    people = union(select(sales.c.seller_id.label("user_id")), select(cash.c.user_id)).subquery("people")
+    return (
+        select(
+            people.c.user_id,
+            func.coalesce(User.full_name, User.username).label("name"),
+            sales.c.tickets, sales.c.revenue, sales.c.units, sales.c.cancelled, sales.c.avg_seconds_between_sales,
+            cash.c.cash_sessions, cash.c.cash_difference, cash.c.cash_abs_difference, cash.c.cash_shortages,
+        )
+        .select_from(people)
+        .outerjoin(sales, sales.c.seller_id == people.c.user_id)
+        .outerjoin(cash, cash.c.user_id == people.c.user_id)
+        .outerjoin(User, User.id == people.c.user_id)
+        .order_by(desc(func.coalesce(sales.c.revenue, 0)), people.c.user_id)
+    )
+
+
+@router.get("/cashiers")
+def get_cashier_performance(
+    start_date: Optional[date] = Query(None, alias="from"),
+    end_date: Optional[date] = Query(None, alias="to"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Por vendedor: tickets, venta, ticket promedio, artículos por ticket, cancelaciones,
+    segundos promedio entre tickets (dentro del mismo día) y faltantes/sobrantes de sus
+    cortes cerrados en el periodo (default: últimos 30 días).
+    """
+    branch_id = current_user.branch_id
+    end = end_date or branch_today(db, branch_id)
+    start = start_date or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="La fecha inicial es posterior a la final")
+
+    # Cortes: días locales de la sucursal -> instantes UTC (closed_at se guarda en UTC)
+    zone = branch_zone(db, branch_id)
+    closed_from = datetime.combine(start, time.min, zone).astimezone(timezone.utc).replace(tzinfo=None)
+    closed_to = datetime.combine(end + timedelta(days=1), time.min, zone).astimezone(timezone.utc).replace(tzinfo=None)
+
+    rows = db.execute(_cashiers_query(branch_id, start, end, closed_from, closed_to)).all()
+    cashiers = []
+    for r in rows:
+        tickets = r.tickets or 0
+        revenue = float(r.revenue or 0)
+        units = float(r.units or 0)
+        cancelled = r.cancelled or 0
+        cashiers.append({
+            "user_id": r.user_id,
+            "name": r.name,
+            "tickets": tickets,
+            "revenue": round(revenue, 2),
+            "average_ticket": round(revenue / tickets, 2) if tickets else 0.0,
+            "units": units,
+            "items_per_ticket": round(units / tickets, 2) if tickets else 0.0,
+            "cancelled": cancelled,
+            "cancel_rate": round(cancelled / (tickets + cancelled) * 100, 2) if tickets + cancelled else 0.0,
+            "avg_seconds_between_sales": round(r.avg_seconds_between_sales, 1) if r.avg_seconds_between_sales is not None else None,
+            "cash_sessions": r.cash_sessions or 0,
+            "cash_difference": round(float(r.cash_difference or 0), 2),
+            "cash_abs_difference": round(float(r.cash_abs_difference or 0), 2),
+            "cash_shortages": r.cash_shortages or 0,
+        })
+    return {"from": start, "to": end, "cashiers": cashiers}
+
+
+# -----------------------------
+# Clientes: segmentación RFM
+# -----------------------------
+RFM_SORTS = {
+    "monetary": desc(CustomerRFM.monetary),
+    "frequency": desc(CustomerRFM.frequency),
+    "recency": CustomerRFM.recency_days,
+    "score": desc(CustomerRFM.r_score + CustomerRFM.f_score + CustomerRFM.m_score),
+}
+
+
+@router.get("/customers/rfm")
+def get_customer_rfm(
+    segment: Optional[str] = Query(None, pattern="^(" + "|".join(crud_crm.RFM_SEGMENTS) + ")$"),
+    sort: str = Query("monetary", pattern="^(monetary|frequency|recency|score)$"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Recencia, frecuencia, monto (valor histórico) y segmento por cliente.
+    Lee la tabla precalculada; si aún no existe se calcula una vez.
+    Se recalcula a diario con refresh_customer_rfm.py, o a mano con POST /customers/rfm/refresh.
+    """
+    if not db.query(CustomerRFM.customer_id).first():
+        crud_crm.refresh_customer_rfm(db, as_of=branch_today(db, current_user.branch_id))
+        db.commit()
+
+    segments = {
+        code: {"label": label, "customers": 0, "monetary": 0.0}
+        for code, label in crud_crm.RFM_SEGMENTS.items()
+    }
+    for code, customers, monetary in db.query(
+        CustomerRFM.segment, func.count(CustomerRFM.customer_id), func.sum(CustomerRFM.monetary)
+    ).group_by(CustomerRFM.segment):
+        segments[code].update(customers=customers, monetary=round(monetary or 0.0, 2))
+
+    query = db.query(CustomerRFM, Customer.name).join(Customer, Customer.id == CustomerRFM.customer_id)
+    if segment:
+        query = query.filter(CustomerRFM.segment == segment)
+    rows = query.order_by(RFM_SORTS[sort], CustomerRFM.customer_id).offset(skip).limit(limit).all()
+
+    return {
+        "computed_at": db.query(func.max(CustomerRFM.computed_at)).scalar(),
+        "segments": segments,
+        "items": [
+            {
+                "customer_id": r.customer_id,
+                "customer_name": name,
+                "first_purchase": r.first_purchase,
+                "last_purchase": r.last_purchase,
+                "recency_days": r.recency_days,
+                "frequency": r.frequency,
+                "monetary": r.monetary,
+                "avg_ticket": r.avg_ticket,
+                "r_score": r.r_score,
+                "f_score": r.f_score,
+                "m_score": r.m_score,
+                "rfm_score": r.rfm_score,
+                "segment": r.segment,
+                "segment_label": crud_crm.RFM_SEGMENTS.get(r.segment, r.segment),
+            }
+            for r, name in rows
+        ],
     }
 
+
+@router.post("/customers/rfm/refresh")
+def refresh_customer_rfm(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Recalcula la segmentación RFM de todos los clientes."""
+    if current_user.role not in (Role.ADMINISTRADOR, Role.GERENTE, Role.DUEÑO):
+        raise HTTPException(status_code=403, detail="Requiere permisos de gerente, dueño o administrador")
+    segments = crud_crm.refresh_customer_rfm(db, as_of=branch_today(db, current_user.branch_id))
+    db.commit()
+    return {"customers": sum(segments.values()), "segments": segments}
+
+
 @router.get("/audit/discrepancies")
 def get_cash_discrepancies(
     limit: int = 10,
@@ -81,64 +902,141 @@ def get_cash_discrepancies(
     
     return discrepancies
 
+# Cubetas de antigüedad (días): 0-30, 31-60, 61-90, +90
+AGING_BUCKETS = (30, 60, 90)
+AGING_COLUMNS = ["customer_id", "customer_name", "total_balance",
+                 "current_0_30", "overdue_31_60", "overdue_61_90", "overdue_91_plus"]
+
+
+def _aging_query(db: Session, now: datetime, branch_id: Optional[int] = None, customer_id: Optional[int] = None):
+    """
+    Antigüedad de saldos en UNA consulta agrupada: el saldo abierto de cada venta a
+    crédito (balance_due, ya descontados los abonos FIFO) se reparte en cubetas con
+    CASE sobre created_at (comparaciones directas; índice parcial de ventas abiertas).
+    Los totales del reporte completo salen con funciones de ventana.
+    """
+    # days_old <= 30  <=>  created_at > now - 31 días
+    t30, t60, t90 = (now - timedelta(days=d + 1) for d in AGING_BUCKETS)
+    created = SalesDocument.created_at
+    amount = SalesDocument.balance_due
+
+    def bucket(condition):
+        return func.coalesce(func.sum(case((condition, amount), else_=0)), 0)
+
+    open_invoices = and_(
+        SalesDocument.customer_id == Customer.id,
+        SalesDocument.balance_due > 0,
+        SalesDocument.status != DocumentStatus.CANCELLED
+    )
+
+    query = db.query(
+        Customer.id.label("customer_id"),
+        Customer.name.label("customer_name"),
+        Customer.current_balance.label("total_balance"),
+        bucket(created > t30).label("current_0_30"),
+        bucket(and_(created <= t30, created > t60)).label("overdue_31_60"),
+        bucket(and_(created <= t60, created > t90)).label("overdue_61_90"),
+        bucket(created <= t90).label("overdue_91_plus"),
+        func.sum(Customer.current_balance).over().label("total_receivable"),
+        func.count().over().label("total_customers"),
+    ).filter(Customer.current_balance > 0)
+
+    if branch_id is not None:
+        # Solo clientes con ventas abiertas en esa sucursal
+        query = query.join(SalesDocument, open_invoices).filter(SalesDocument.branch_id == branch_id)
+    else:
+        query = query.outerjoin(SalesDocument, open_invoices)
+
+    if customer_id is not None:
+        query = query.filter(Customer.id == customer_id)
+
+    return query.group_by(Customer.id, Customer.name, Customer.current_balance).order_by(Customer.name, Customer.id)
+
+
+def _stream_aging_csv(query):
+    """Genera el CSV por bloques sin cargar todo el reporte en memoria."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(AGING_COLUMNS)
+    for i, row in enumerate(query.yield_per(500), start=1):
+        writer.writerow([getattr(row, col) for col in AGING_COLUMNS])
+        if i % 500 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
 @router.get("/aging-report", response_model=AgingReportResponse)
 def get_aging_report(
+    branch_id: Optional[int] = None,
+    customer_id: Optional[int] = None,
+    skip: int = 0,
+    limit: Optional[int] = None,
+    format: str = "json",
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Calcula la antigüedad de saldos: Clasifica la deuda de los clientes 
     en periodos de 30, 60, 90 y +90 días.
+    - Paginado con skip/limit (total_customers trae el total para la paginación).
+    - format=csv devuelve el reporte completo como descarga en streaming.
     """
-    now = datetime.now()
-    # 1. Obtener solo clientes que tengan saldo deudor actual
-    debtor_customers = db.query(Customer).filter(Customer.current_balance > 0).all()
-    
-    report_list = []
-    total_receivable = Decimal("0.00")
-
-    for customer in debtor_customers:
-        # Inicializamos los acumuladores para este cliente
-        buckets = {
-            "current": Decimal("0.00"),  # 0-30 días
-            "31_60": Decimal("0.00"),
-            "61_90": Decimal("0.00"),
-            "91_plus": Decimal("0.00")
-        }
-
-        # 2. Analizar cargos pendientes (donde amount > 0)
-        # Nota: En un sistema real, aquí podrías filtrar facturas específicas no pagadas
-        ledger_entries = db.query(CustomerLedgerEntry).filter(
-            CustomerLedgerEntry.customer_id == customer.id,
-            CustomerLedgerEntry.amount > 0 
-        ).all()
-
-        for entry in ledger_entries:
-            days_old = (now - entry.created_at).days
-
-            if days_old <= 30:
-                buckets["current"] += entry.amount
-            elif days_old <= 60:
-                buckets["31_60"] += entry.amount
-            elif days_old <= 90:
-                buckets["61_90"] += entry.amount
-            else:
-                buckets["91_plus"] += entry.amount
-
-        # 3. Construir objeto de respuesta para el cliente
-        report_list.append({
-            "customer_id": customer.id,
-            "customer_name": customer.name,
-            "total_balance": customer.current_balance,
-            "current_0_30": buckets["current"],
-            "overdue_31_60": buckets["31_60"],
-            "overdue_61_90": buckets["61_90"],
-            "overdue_91_plus": buckets["91_plus"]
-        })
-        total_receivable += customer.current_balance
+    # created_at se guarda en UTC (CURRENT_TIMESTAMP)
+    now = datetime.utcnow()
+    query = _aging_query(db, now, branch_id=branch_id, customer_id=customer_id)
+
+    if format == "csv":
+        headers = {"Content-Disposition": f'attachment; filename="antiguedad_saldos_{now.date()}.csv"'}
+        return StreamingResponse(_stream_aging_csv(query), media_type="text/csv", headers=headers)
+
+    if skip:
+        query = query.offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+    rows = query.all()
 
     return {
         "report_date": now.date(),
-        "total_receivable": total_receivable,
-        "customers": report_list
-    }
\ No newline at end of file
+        "total_receivable": rows[0].total_receivable if rows else Decimal("0.00"),
+        "total_customers": rows[0].total_customers if rows else 0,
+        "customers": [{col: getattr(row, col) for col in AGING_COLUMNS} for row in rows]
+    }
+
+
+@router.get("/overdue-invoices", response_model=List[OverdueInvoice])
+def get_overdue_invoices(
+    branch_id: Optional[int] = None,
+    customer_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Ventas a crédito vencidas (due_date = día de la venta + días de crédito del cliente)
+    que aún tienen saldo. Lee solo ventas abiertas por el índice de vencimiento.
+    """
+    today = branch_today(db, branch_id or current_user.branch_id)
+    query = crud_crm.overdue_invoices_query(db, today, customer_id).join(
+        Customer, Customer.id == SalesDocument.customer_id
+    ).with_entities(
+        SalesDocument.id.label("sale_id"),
+        SalesDocument.series,
+        SalesDocument.folio,
+        SalesDocument.customer_id,
+        Customer.name.label("customer_name"),
+        SalesDocument.branch_id,
+        SalesDocument.due_date,
+        SalesDocument.total_amount,
+        SalesDocument.balance_due,
+    )
+    if branch_id is not None:
+        query = query.filter(SalesDocument.branch_id == branch_id)
+
+    rows = query.order_by(SalesDocument.due_date, SalesDocument.id).offset(skip).limit(limit).all()
+    return [
+        {**row._asdict(), "days_overdue": (today - row.due_date).days}
+        for row in rows
+    ]
@@ -8,6 +8,8 @@ from app.models import (
 )
 from app.schemas.returns import ReturnCreate, ReturnRead
 from app.security import get_current_user, User
+from app.utils.business_date import business_date_for
+from app.crud import rollups
 
 router = APIRouter()
 
@@ -30,11 +32,13 @@ def create_return(
         user_id=current_user.id,
         branch_id=current_user.branch_id,
         reason=return_in.reason,
-        total_refunded=0 # Se actualizará abajo
+        total_refunded=0, # Se actualizará abajo
+        business_date=business_date_for(db, current_user.branch_id)
     )
     db.add(new_return)
     db.flush()
 
+    return_items = []
     for item in return_in.items:
         # Validar que el producto estaba en la venta original
         sale_line = db.query(SalesLineItem).filter(
@@ -72,14 +76,17 @@ def create_return(
         ))
 
         # Registrar item de devolución
-        db.add(SaleReturnItem(
+        return_item = SaleReturnItem(
             return_id=new_return.id,
             variant_id=item.variant_id,
             quantity=item.quantity,
             refund_amount=item_refund
-        ))
+        )
+        db.add(return_item)
+        return_items.append(return_item)
 
     new_return.total_refunded = total_refund
+    rollups.apply_return(db, new_return, return_items)
     db.commit()
     db.refresh(new_return)
     return new_return
\ No newline at end of file
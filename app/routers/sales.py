@@ -2,7 +2,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func
-from datetime import datetime
+from datetime import datetime, date, timedelta
 from decimal import Decimal
 from typing import Dict, Any, List, Optional
 
@@ -12,68 +12,79 @@ from app.models import (
     ProductVariant, StockOnHand, InventoryMovement,
     SalesDocument, SalesLineItem, Payment,
     User, DocumentType, DocumentStatus, MovementType,
-    Customer, CustomerLedgerEntry, PaymentMethod
+    Customer, CustomerLedgerEntry, PaymentMethod,
+    DailySales, DailyPayments
 )
 from app.schemas.sales import SaleCreate, SaleRead
 from app.security import get_current_user
 # --- NUEVA IMPORTACIÓN PARA FOLIOS ---
 from app.utils.folios import get_next_folio 
+from app.utils.business_date import business_date_for
+from app.crud import rollups
+from app.crud import cash as crud_cash
+from app.crud import crm as crud_crm
+from app.utils import report_cache
 
 router = APIRouter()
 
-@router.get("/stats")
-def get_sales_stats(
-    start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    """
-    Calcula KPIs de ventas: Total, Cantidad, Ticket Promedio, Desglose por Método.
-    """
-    # Base Query
-    query = db.query(SalesDocument).filter(
-        SalesDocument.branch_id == current_user.branch_id,
-        SalesDocument.status != DocumentStatus.CANCELLED
-    )
-
-    if start_date:
-        query = query.filter(SalesDocument.created_at >= start_date)
-    if end_date:
-        query = query.filter(SalesDocument.created_at <= end_date)
+def _compute_sales_stats(db: Session, branch_id: int, start_date: Optional[date], end_date: Optional[date]) -> dict:
+    def in_period(query, model):
+        query = query.filter(model.branch_id == branch_id)
+        if start_date:
+            query = query.filter(model.business_date >= start_date)
+        if end_date:
+            query = query.filter(model.business_date <= end_date)
+        return query
 
     # 1. KPIs Generales
-    total_sales = query.with_entities(func.sum(SalesDocument.total_amount)).scalar() or Decimal(0)
-    total_count = query.count()
+    totals = in_period(
+        db.query(
+            func.coalesce(func.sum(DailySales.total_amount), 0),
+            func.coalesce(func.sum(DailySales.tickets_count), 0),
+            func.coalesce(func.sum(DailySales.returns_amount), 0),
+        ),
+        DailySales
+    ).one()
+    total_sales = Decimal(str(totals[0]))
+    total_count = int(totals[1])
     avg_ticket = total_sales / total_count if total_count > 0 else Decimal(0)
 
     # 2. Desglose por Método de Pago
-    # Join con Payment
-    payment_stats = (
-        db.query(Payment.method, func.sum(Payment.amount))
-        .join(SalesDocument)
-        .filter(
-            SalesDocument.branch_id == current_user.branch_id,
-            SalesDocument.status != DocumentStatus.CANCELLED
-        )
-    )
+    payment_stats = in_period(
+        db.query(DailyPayments.method, func.sum(DailyPayments.amount)),
+        DailyPayments
+    ).group_by(DailyPayments.method).all()
     
-    if start_date:
-        payment_stats = payment_stats.filter(SalesDocument.created_at >= start_date)
-    if end_date:
-        payment_stats = payment_stats.filter(SalesDocument.created_at <= end_date)
-
-    payment_stats = payment_stats.group_by(Payment.method).all()
-    
-    methods_data = {method.value: float(amount) for method, amount in payment_stats}
+    methods_data = {method.value: float(amount) for method, amount in payment_stats if amount}
 
     return {
         "total_sales": float(total_sales),
         "total_transactions": total_count,
         "average_ticket": float(avg_ticket),
+        "total_returns": float(totals[2]),
         "payment_methods": methods_data
     }
 
+@router.get("/stats")
+def get_sales_stats(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Calcula KPIs de ventas: Total, Cantidad, Ticket Promedio, Desglose por Método.
+    Lee los acumulados diarios (un renglón por día / método), no las ventas.
+    Las fechas son días de negocio inclusivos. Resultado cacheado por sucursal y rango.
+    """
+    branch_id = current_user.branch_id
+    return report_cache.cached(
+        "sales.stats", branch_id,
+        {"start_date": start_date, "end_date": end_date},
+        lambda: _compute_sales_stats(db, branch_id, start_date, end_date),
+        start=start_date, end=end_date
+    )
+
 @router.get("/", response_model=List[SaleRead])
 def read_sales(
     skip: int = 0,
@@ -235,6 +246,7 @@ def create_sale(
     # 3.1 OBTENER SIGUIENTE FOLIO DISPONIBLE
     current_series = "A" # Puedes parametrizar esto por caja o sucursal si deseas
     next_folio_number = get_next_folio(db, branch_id=current_user.branch_id, series=current_series)
+    business_date = business_date_for(db, current_user.branch_id)
 
     sales_doc = SalesDocument(
         doc_type=DocumentType.INVOICE,
@@ -245,7 +257,10 @@ def create_sale(
         total_amount=total_sale,
         subtotal=total_sale, # Ajustar si manejas impuestos separados
         series=current_series,    # Serie dinámica
-        folio=next_folio_number   # <--- Folio consecutivo real
+        folio=next_folio_number,  # <--- Folio consecutivo real
+        business_date=business_date,
+        balance_due=remaining_debt, # Saldo abierto de esta venta (abonos FIFO)
+        due_date=business_date + timedelta(days=customer.credit_days or 0) if remaining_debt > 0 else None
     )
     db.add(sales_doc)
     db.flush() # Obtenemos el ID del documento
@@ -255,7 +270,9 @@ def create_sale(
         line.document_id = sales_doc.id
         db.add(line)
 
-    # Guardar los Pagos recibidos (si hubo alguno mayor a 0)
+    # Guardar los Pagos recibidos (si hubo alguno mayor a 0), sellados con el turno de caja abierto
+    cash_session = crud_cash.get_open_session(db, current_user.id)
+    db_payments = []
     for payment in sale_in.payments:
         if payment.amount > 0:
             new_payment = Payment(
@@ -263,9 +280,18 @@ def create_sale(
                 amount=payment.amount,
                 method=payment.method,
                 created_by_id=current_user.id,
-                reference=payment.reference # Guardar num de autorización de tarjeta si existe
+                reference=payment.reference, # Guardar num de autorización de tarjeta si existe
+                business_date=business_date,
+                **crud_cash.session_stamp(cash_session)
             )
             db.add(new_payment)
+            db_payments.append(new_payment)
+
+    # Acumulados diarios para reportes (misma transacción)
+    rollups.apply_sale(db, sales_doc, db_lines, db_payments)
+
+    # Acumulados del turno de caja del cajero (misma transacción)
+    crud_cash.apply_payments(db, db_payments)
 
     # --- 4. Registrar Deuda en Cta Cte (Si aplica) ---
     if remaining_debt > 0:
@@ -279,10 +305,13 @@ def create_sale(
             sales_document_id=sales_doc.id,
             amount=remaining_debt, # Monto positivo = Incrementa la deuda
             description=f"Crédito por Venta #{sales_doc.series}-{sales_doc.folio}",
-            entry_type="DEBT" # Define un tipo si tu modelo lo requiere
+            entry_type="DEBT"
         )
         db.add(ledger)
 
+        # Si el cliente tenía saldo a favor, cubre (parte de) esta venta
+        crud_crm.apply_customer_credit(db, customer)
+
     # --- COMMIT FINAL ---
     db.commit()
     db.refresh(sales_doc)
@@ -361,7 +390,7 @@ def cancel_sale(
             ).first()
 
             if stock_record:
-                qty_to_restore = line.quantity # Asumiendo unidad base
+                qty_to_restore = Decimal(str(line.quantity)) # Asumiendo unidad base
                 qty_before = stock_record.qty_on_hand
                 
                 # Restaurar stock
@@ -397,7 +426,8 @@ def cancel_sale(
             paid_amount = sum(p.amount for p in sale.payments)
             debt_amount = sale.total_amount - paid_amount
             
-            if debt_amount > 0 and sale.status == DocumentStatus.PENDING:
+            # Venta a crédito (aunque ya esté abonada: lo abonado queda como saldo a favor)
+            if debt_amount > 0:
                 customer.current_balance -= debt_amount # Reducir deuda
                 
                 # Ledger entry
@@ -410,8 +440,15 @@ def cancel_sale(
                 )
                 db.add(ledger)
 
-    # 3. Marcar Cancelado
+    # 3. Marcar Cancelado y descontar de los acumulados diarios
+    rollups.apply_sale(db, sale, sale.lines, sale.payments, sign=-1)
+    crud_cash.apply_payments(db, sale.payments, sign=-1)
     sale.status = DocumentStatus.CANCELLED
+    sale.balance_due = 0
+
+    # Lo abonado a la venta cancelada queda a favor: se aplica a sus otras ventas abiertas
+    if sale.customer_id and customer:
+        crud_crm.apply_customer_credit(db, customer)
     
     db.commit()
     return {"message": "Venta cancelada exitosamente", "sale_id": sale.id}
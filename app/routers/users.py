@@ -7,7 +7,7 @@ from app.database import get_db
 from app.models import User
 # Asegúrate de que UserUpdate esté en tu schema (ya lo agregamos antes)
 from app.schemas.users import UserCreate, UserRead, UserUpdate 
-from app.security import get_current_user, get_password_hash
+from app.security import get_current_user, get_password_hash, invalidate_user_cache
 
 router = APIRouter()
 
@@ -107,6 +107,7 @@ def update_user(
             user_db.password_hash = get_password_hash(password_raw)
 
     # 5. Actualizar resto de campos (nombre, rol, sucursal, etc.)
+    previous_username = user_db.username
     for field, value in update_data.items():
         # Validar que el usuario (modelo) tenga ese atributo antes de asignarlo
         if hasattr(user_db, field):
@@ -115,6 +116,9 @@ def update_user(
     db.add(user_db)
     db.commit()
     db.refresh(user_db)
+
+    # El token se resuelve por username: invalidar el anterior y el nuevo
+    invalidate_user_cache(previous_username, user_db.username)
     return user_db
 
 # --- 6. ELIMINAR/DESACTIVAR (SOFT DELETE) ---
@@ -145,6 +149,7 @@ def delete_user(
     
     db.commit()
     db.refresh(user_db) # Recargamos para obtener el estado actualizado
+    invalidate_user_cache(user_db.username)
     
     # Retornamos el objeto usuario completo. 
     # El frontend podrá leer user_db.username o user_db.full_name para mostrar a quién borró.
@@ -6,6 +6,7 @@ class BranchBase(BaseModel):
     address: Optional[str] = None
     phone: Optional[str] = None
     is_active: bool = True
+    timezone: Optional[str] = "America/Mexico_City" # Zona IANA (día de negocio)
 
 class BranchCreate(BranchBase):
     pass
@@ -15,6 +16,7 @@ class BranchUpdate(BranchBase):
     address: Optional[str] = None
     phone: Optional[str] = None
     is_active: Optional[bool] = None
+    timezone: Optional[str] = None
 
 # CAMBIO: Renombrado de BranchResponse a BranchRead para coincidir con el Router
 class BranchRead(BranchBase):
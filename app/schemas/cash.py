@@ -1,7 +1,7 @@
 
 # schemas/cash.py
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List, Dict, Any
 from decimal import Decimal
 from datetime import datetime
 
@@ -9,7 +9,7 @@ class CashSessionBase(BaseModel):
     opening_balance: Decimal
 
 class CashSessionCreate(CashSessionBase):
-    pass # Solo necesitamos el saldo inicial
+    terminal: Optional[str] = None # Caja / equipo donde se abre el turno
 
 class CashSessionClose(BaseModel):
     closing_balance: Decimal # Lo que el cajero contó físicamente
@@ -20,6 +20,7 @@ class CashSessionRead(CashSessionBase):
     branch_id: int
     user_id: int
     status: str
+    terminal: Optional[str] = None
     opened_at: datetime
     closed_at: Optional[datetime] = None
     
@@ -29,4 +30,36 @@ class CashSessionRead(CashSessionBase):
     difference: Decimal = Decimal(0)       # Sobrante o Faltante
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class CashCutRead(BaseModel):
+    """Corte congelado al cerrar el turno."""
+    session_id: int
+    branch_name: Optional[str] = None
+    cashier_name: Optional[str] = None
+    terminal: Optional[str] = None
+    opened_at: Optional[datetime] = None
+    closed_at: Optional[datetime] = None
+
+    opening_balance: Decimal
+    sales_cash: Decimal
+    sales_card: Decimal
+    sales_transfer: Decimal
+    sales_other: Decimal
+    payments_count: int
+    inflows: Decimal
+    outflows: Decimal
+    expected: Decimal
+    closing_balance: Optional[Decimal] = None
+    difference: Optional[Decimal] = None
+
+    by_method: Dict[str, Any] = {}          # {"CASH": {"count", "amount"}, ...}
+    movements: List[Dict[str, Any]] = []    # [{"created_at", "type", "amount", "reason"}, ...]
+    notes: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class CashSessionHistoryRead(CashSessionRead):
+    cut: Optional[CashCutRead] = None
@@ -1,7 +1,7 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, AliasChoices
 from typing import Optional, List
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, date
 
 # --- CLASES BASE ---
 
@@ -37,19 +37,49 @@ class CustomerUpdate(CustomerBase):
 # --- ESTADO DE CUENTA (Movimientos) ---
 class LedgerEntryResponse(BaseModel):
     id: int
-    date: datetime
+    date: datetime = Field(validation_alias=AliasChoices("date", "created_at"))
+    created_at: Optional[datetime] = None
     amount: Decimal          # Positivo = Cargo (Deuda), Negativo = Abono (Pago)
     description: str
+    entry_type: Optional[str] = None   # DEBT, PAYMENT, CANCELLATION
+    sales_document_id: Optional[int] = None # Venta a la que aplica (abonos FIFO)
     reference_id: Optional[str] = None # ID Venta o Folio Pago
     
     class Config:
         from_attributes = True
 
+# --- VENTAS A CRÉDITO ABIERTAS ---
+class OpenInvoiceRead(BaseModel):
+    id: int
+    series: Optional[str] = None
+    folio: Optional[int] = None
+    created_at: Optional[datetime] = None
+    due_date: Optional[date] = None
+    total_amount: Decimal
+    balance_due: Decimal     # Saldo pendiente después de abonos (FIFO)
+    days_overdue: int = 0
+
+    class Config:
+        from_attributes = True
+
+# --- SEGMENTACIÓN RFM (precalculada) ---
+class CustomerRFMSummary(BaseModel):
+    segment: str             # CHAMPIONS, LOYAL, AT_RISK, ...
+    rfm_score: str           # Ej. "545"
+    recency_days: int
+    frequency: int
+    monetary: float
+    last_purchase: Optional[date] = None
+
+    class Config:
+        from_attributes = True
+
 # --- LECTURA (RESPONSE) ---
 class CustomerRead(CustomerBase):
     id: int
     current_balance: Decimal = Decimal("0.00") # Saldo actual calculado
     created_at: Optional[datetime] = None
+    rfm: Optional[CustomerRFMSummary] = None
 
     class Config:
         from_attributes = True
\ No newline at end of file
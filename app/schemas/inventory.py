@@ -1,7 +1,7 @@
 from pydantic import BaseModel
 from typing import Optional, List
 from decimal import Decimal
-from datetime import datetime
+from datetime import date, datetime
 
 # Input para crear un ajuste manual
 class AdjustmentCreate(BaseModel):
@@ -21,4 +21,23 @@ class MovementRead(BaseModel):
     user_name: str # Extraemos el nombre del usuario
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Output de sugerencias de reabastecimiento
+class ReplenishmentRead(BaseModel):
+    variant_id: int
+    sku: Optional[str]
+    name: str
+    qty_on_hand: float
+    avg_daily_demand: float
+    forecast_daily: float
+    safety_stock: float
+    reorder_point: float
+    order_up_to: float
+    suggested_qty: float
+    days_of_cover: Optional[float] = None # Días que alcanza el stock actual
+    history_end: date
+    computed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -1,7 +1,9 @@
 # app/schemas/products.py
 from typing import Optional, List
+from enum import Enum
 from pydantic import BaseModel
 from decimal import Decimal
+from datetime import datetime
 
 # --- Deptos / Categorías ---
 class DepartmentRead(BaseModel):
@@ -108,4 +110,37 @@ class ProductRead(BaseModel):
     stock_levels: List[StockLevel] = []
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# --- Re-precio masivo ---
+class RepriceMode(str, Enum):
+    PERCENT = "percent"   # +/- % sobre el precio actual
+    AMOUNT = "amount"     # +/- monto fijo sobre el precio actual
+    MARGIN = "margin"     # precio = costo * (1 + margen%)
+
+class RepriceRequest(BaseModel):
+    # Selector (se combinan con AND; al menos uno es obligatorio)
+    department_id: Optional[int] = None
+    brand_id: Optional[int] = None
+    skus: Optional[List[str]] = None
+
+    # Regla
+    mode: RepriceMode
+    value: Decimal
+    rounding: Optional[Decimal] = None  # Terminación de centavos: 0.50, 0.90...
+    scale_tiers: bool = True            # Escalar precios escalonados en la misma proporción
+
+class RepriceResult(BaseModel):
+    updated: int
+    tiers_updated: int
+
+# --- Historial de precios ---
+class PriceAtRead(BaseModel):
+    variant_id: int
+    price: Optional[Decimal] = None
+    cost: Optional[Decimal] = None
+    tiers: Optional[List[dict]] = None
+    source: Optional[str] = None
+    effective_at: datetime
+    class Config:
+        from_attributes = True
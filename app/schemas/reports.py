@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional
 from datetime import date
 from decimal import Decimal
 
@@ -18,7 +18,20 @@ class CustomerAging(BaseModel):
 class AgingReportResponse(BaseModel):
     report_date: date
     total_receivable: Decimal  # Suma total de lo que deben todos los clientes
+    total_customers: int = 0   # Clientes en el reporte completo (para paginar)
     customers: List[CustomerAging]
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class OverdueInvoice(BaseModel):
+    sale_id: int
+    series: Optional[str] = None
+    folio: Optional[int] = None
+    customer_id: int
+    customer_name: Optional[str] = None
+    branch_id: int
+    due_date: date
+    total_amount: Decimal
+    balance_due: Decimal
+    days_overdue: int
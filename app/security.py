@@ -1,3 +1,7 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -6,13 +10,21 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.models import User
+from app.models import User, Role
 
 # Configuración JWT
 SECRET_KEY = "atlas_erp_secret_key_change_me_in_prod" 
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 12 # 12 horas
 
+# Token del canal de eventos (SSE): viaja en la URL, así que dura poco y solo sirve para el stream
+STREAM_TOKEN_SCOPE = "events"
+STREAM_TOKEN_EXPIRE_SECONDS = 60
+
+# Caché de usuarios resueltos desde el token (evita el SELECT en cada request)
+USER_CACHE_TTL_SECONDS = 60
+USER_CACHE_MAX_SIZE = 1024
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
@@ -36,22 +48,110 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def create_stream_token(username: str) -> str:
+    return create_access_token(
+        {"sub": username, "scope": STREAM_TOKEN_SCOPE},
+        expires_delta=timedelta(seconds=STREAM_TOKEN_EXPIRE_SECONDS)
+    )
+
+# --- Principal de usuario cacheado ---
+@dataclass(frozen=True)
+class CurrentUser:
+    """Copia ligera (sin sesión ORM) de los datos del usuario que usan los endpoints."""
+    id: int
+    username: str
+    full_name: Optional[str]
+    role: Role
+    branch_id: Optional[int]
+    is_active: bool
+
+    @classmethod
+    def from_orm_user(cls, user: User) -> "CurrentUser":
+        return cls(
+            id=user.id,
+            username=user.username,
+            full_name=user.full_name,
+            role=user.role,
+            branch_id=user.branch_id,
+            is_active=user.is_active,
+        )
+
+class _UserCache:
+    """LRU acotado con TTL, indexado por el `sub` del token (username)."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, username: str) -> Optional[CurrentUser]:
+        with self._lock:
+            item = self._data.get(username)
+            if item is None:
+                return None
+            principal, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[username]
+                return None
+            self._data.move_to_end(username)
+            return principal
+
+    def set(self, username: str, principal: CurrentUser) -> None:
+        with self._lock:
+            self._data[username] = (principal, time.monotonic() + self.ttl)
+            self._data.move_to_end(username)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, *usernames: Optional[str]) -> None:
+        with self._lock:
+            for username in usernames:
+                if username:
+                    self._data.pop(username, None)
+
+user_cache = _UserCache(max_size=USER_CACHE_MAX_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+def invalidate_user_cache(*usernames: Optional[str]) -> None:
+    """Llamar al actualizar o desactivar usuarios (rol, sucursal, username...)."""
+    user_cache.invalidate(*usernames)
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Credenciales no válidas",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _decode_username(token: str, scope: Optional[str]) -> str:
+    """`sub` del token si es válido y su alcance coincide (None = token de sesión)."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
-    
+        raise _credentials_exception()
+    username: str = payload.get("sub")
+    if username is None or payload.get("scope") != scope:
+        raise _credentials_exception()
+    return username
+
+def _resolve_user(username: str, db: Session) -> CurrentUser:
+    # 1. Caché (sin tocar la base de datos)
+    principal = user_cache.get(username)
+    if principal is not None:
+        return principal
+
+    # 2. Base de datos
     user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise credentials_exception
-        
-    return user
\ No newline at end of file
+    if user is None or not user.is_active:
+        raise _credentials_exception()
+
+    principal = CurrentUser.from_orm_user(user)
+    user_cache.set(username, principal)
+    return principal
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> CurrentUser:
+    return _resolve_user(_decode_username(token, scope=None), db)
+
+async def get_stream_user(token: str, db: Session) -> CurrentUser:
+    """Usuario de un token de stream (create_stream_token); el token de sesión no se acepta."""
+    return _resolve_user(_decode_username(token, scope=STREAM_TOKEN_SCOPE), db)
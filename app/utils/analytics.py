@@ -0,0 +1,157 @@
+# app/utils/analytics.py
+"""
+Motor analítico embebido (DuckDB) sobre la exportación Parquet de ventas.
+
+- `sync()` exporta los días nuevos (ver app/utils/sales_export.py), copia los
+  catálogos pequeños (departamentos, marcas, productos, variantes, usuarios) y
+  deja vistas `sales_lines` / `payments` sobre los archivos Parquet.
+- Los reportes ad-hoc consultan DuckDB y no tocan la base transaccional.
+- Los datos llegan hasta el último día completo exportado (ayer).
+
+Requiere `duckdb` y `pyarrow` (dependencias opcionales).
+"""
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models import Category, Brand, Product, ProductVariant, User
+from app.utils.sales_export import export_sales_facts, pa
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+ANALYTICS_DIR = os.environ.get("ATLAS_ANALYTICS_DIR", os.path.join("exports", "sales"))
+DB_FILE = os.path.join(ANALYTICS_DIR, "analytics.duckdb")
+DATASETS = ("sales_lines", "payments")
+
+_lock = threading.Lock()
+_sync_lock = threading.Lock()   # Una sola sincronización a la vez (escribe los mismos Parquet)
+_conn = None
+_last_sync: Optional[datetime] = None
+
+
+class AnalyticsUnavailable(Exception):
+    """El motor analítico no está instalado o todavía no se ha sincronizado."""
+
+
+class SyncInProgress(Exception):
+    """Ya hay una sincronización corriendo."""
+
+
+def is_installed() -> bool:
+    return duckdb is not None and pa is not None
+
+
+def _connection():
+    global _conn
+    if not is_installed():
+        raise AnalyticsUnavailable("El módulo analítico requiere 'duckdb' y 'pyarrow'.")
+    with _lock:
+        if _conn is None:
+            os.makedirs(ANALYTICS_DIR, exist_ok=True)
+            _conn = duckdb.connect(DB_FILE)
+        return _conn
+
+
+def _dataset_glob(dataset: str) -> str:
+    return os.path.join(ANALYTICS_DIR, dataset, "*", "*", "*.parquet").replace("\\", "/")
+
+
+def _has_files(dataset: str) -> bool:
+    root = os.path.join(ANALYTICS_DIR, dataset)
+    return any(f.endswith(".parquet") for _, _, files in os.walk(root) for f in files)
+
+
+def _replace_table(conn, name: str, rows: List[dict], schema) -> None:
+    conn.register("_staging", pa.Table.from_pylist(rows, schema=schema))
+    try:
+        conn.execute(f"CREATE OR REPLACE TABLE {name} AS SELECT * FROM _staging")
+    finally:
+        conn.unregister("_staging")
+
+
+def sync(db: Session) -> dict:
+    """
+    Exporta los días nuevos y refresca catálogos y vistas. Devuelve lo exportado por sucursal.
+    Si ya hay otra sincronización en curso levanta SyncInProgress (no espera).
+    """
+    conn = _connection()
+    if not _sync_lock.acquire(blocking=False):
+        raise SyncInProgress("Ya hay una sincronización analítica en curso.")
+    try:
+        exported = export_sales_facts(db, ANALYTICS_DIR, incremental=True)
+        _refresh_catalogs(conn, db)
+    finally:
+        _sync_lock.release()
+    return exported
+
+
+def _refresh_catalogs(conn, db: Session) -> None:
+    global _last_sync
+    with _lock:
+        _replace_table(conn, "dim_variants", [
+            {
+                "variant_id": r.id, "sku": r.sku, "variant_name": r.variant_name,
+                "product_id": r.product_id, "product_name": r.product_name,
+                "department_id": r.category_id, "department_name": r.department_name,
+                "brand_id": r.brand_id, "brand_name": r.brand_name,
+            }
+            for r in db.query(
+                ProductVariant.id, ProductVariant.sku, ProductVariant.variant_name,
+                ProductVariant.product_id, Product.name.label("product_name"),
+                Product.category_id, Category.name.label("department_name"),
+                Product.brand_id, Brand.name.label("brand_name"),
+            ).join(Product, Product.id == ProductVariant.product_id
+            ).outerjoin(Category, Category.id == Product.category_id
+            ).outerjoin(Brand, Brand.id == Product.brand_id)
+        ], pa.schema([
+            ("variant_id", pa.int64()), ("sku", pa.string()), ("variant_name", pa.string()),
+            ("product_id", pa.int64()), ("product_name", pa.string()),
+            ("department_id", pa.int64()), ("department_name", pa.string()),
+            ("brand_id", pa.int64()), ("brand_name", pa.string()),
+        ]))
+        _replace_table(conn, "dim_users", [
+            {"user_id": r.id, "username": r.username, "full_name": r.full_name}
+            for r in db.query(User.id, User.username, User.full_name)
+        ], pa.schema([("user_id", pa.int64()), ("username", pa.string()), ("full_name", pa.string())]))
+
+        for dataset in DATASETS:
+            if _has_files(dataset):
+                conn.execute(
+                    f"CREATE OR REPLACE VIEW {dataset} AS "
+                    f"SELECT * FROM read_parquet('{_dataset_glob(dataset)}', hive_partitioning = true)"
+                )
+        _last_sync = datetime.now(timezone.utc)
+
+
+def status() -> dict:
+    return {
+        "installed": is_installed(),
+        "last_sync": _last_sync,
+        "datasets": {d: _has_files(d) for d in DATASETS},
+    }
+
+
+def query(sql: str, params: Optional[list] = None) -> List[Dict[str, Any]]:
+    """Ejecuta una consulta de solo lectura y devuelve una lista de dicts."""
+    conn = _connection()
+    if not _has_files("sales_lines"):
+        raise AnalyticsUnavailable("No hay datos exportados; ejecute la sincronización analítica.")
+    # Un cursor por llamada: DuckDB permite consultas concurrentes así
+    cursor = conn.cursor()
+    try:
+        result = cursor.execute(sql, params or [])
+        columns = [c[0] for c in result.description]
+        return [dict(zip(columns, row)) for row in result.fetchall()]
+    except duckdb.CatalogException:
+        raise AnalyticsUnavailable("El almacén analítico no está inicializado; ejecute la sincronización.")
+    except (duckdb.IOException, duckdb.InvalidInputException):
+        # Archivos reemplazados o borrados (exportación completa) mientras se leían
+        raise AnalyticsUnavailable("El almacén analítico se está actualizando; intente de nuevo.")
+    finally:
+        cursor.close()
@@ -0,0 +1,123 @@
+# app/utils/branch_fanout.py
+"""
+Reportes consolidados: la misma agregación corre por sucursal en paralelo.
+
+- Cada sucursal se calcula en un hilo del pool con su propia sesión
+  (`session_factory(branch_id)`; hoy todas usan la misma base, pero una sucursal
+  puede apuntar a su propia base cambiando la fábrica).
+- Se espera a lo más `timeout` segundos: las sucursales que no terminan o fallan
+  se reportan como "timeout"/"error" y el resto se devuelve (resultado parcial).
+- Un hilo no se puede cancelar, así que el tiempo se acota en la base: en SQLite la
+  consulta en curso se interrumpe al vencer el plazo y el hilo vuelve al pool.
+- Los cálculos en curso se comparten por (reporte y parámetros, sucursal): una
+  petición idéntica espera el mismo Future (hasta su propio plazo) en vez de lanzar
+  otro, para que las sucursales lentas no acaparen el pool.
+- Cada sucursal trae su tiempo de cálculo en milisegundos. El detalle de los
+  errores va a la bitácora; al cliente solo se le regresa un código.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 8
+DEFAULT_TIMEOUT = 10.0
+PROGRESS_STEPS = 10000      # Instrucciones de SQLite entre revisiones del plazo
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="branch-fanout")
+_lock = threading.RLock()     # add_done_callback puede llamar _forget de inmediato
+_running: Dict[Tuple[Hashable, int], Future] = {}    # (reporte, sucursal) -> cálculo en curso
+
+
+def default_session_factory(branch_id: int) -> Session:
+    return SessionLocal()
+
+
+def _bound_statements(db: Session, deadline: float):
+    """Interrumpe las consultas de la sesión al pasar `deadline` (SQLite). Devuelve la conexión o None."""
+    raw = db.connection().connection.driver_connection
+    if not hasattr(raw, "set_progress_handler"):
+        return None
+    raw.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, PROGRESS_STEPS)
+    return raw
+
+
+def _run(branch_id: int, compute: Callable[[Session, int], Any], session_factory,
+         timeout: float) -> Tuple[Any, float]:
+    started = time.perf_counter()
+    db = session_factory(branch_id)
+    deadline = time.monotonic() + timeout
+    raw = None
+    try:
+        raw = _bound_statements(db, deadline)
+        return compute(db, branch_id), (time.perf_counter() - started) * 1000
+    except Exception as e:
+        if time.monotonic() > deadline:
+            # Consulta interrumpida por el plazo
+            raise TimeoutError() from e
+        raise
+    finally:
+        if raw is not None:
+            raw.set_progress_handler(None, 0)
+        db.close()
+
+
+def _forget(running_key: Tuple[Hashable, int], future: Future) -> None:
+    with _lock:
+        if _running.get(running_key) is future:
+            del _running[running_key]
+
+
+def fan_out(
+    branch_ids: Iterable[int],
+    compute: Callable[[Session, int], Any],
+    key: Hashable,
+    timeout: float = DEFAULT_TIMEOUT,
+    session_factory: Callable[[int], Session] = default_session_factory,
+) -> Tuple[Dict[int, Any], List[dict]]:
+    """
+    Ejecuta `compute(db, branch_id)` para cada sucursal en paralelo. `key` identifica
+    el reporte y sus parámetros: si ya corre el mismo cálculo de una sucursal, se reutiliza.
+    Devuelve ({branch_id: resultado} de las que terminaron bien,
+    [{branch_id, status, elapsed_ms, error}] de todas, en el orden recibido).
+    status: ok | error (error="branch_failed") | timeout.
+    """
+    started = time.perf_counter()
+    futures: Dict[int, Future] = {}
+    with _lock:
+        for branch_id in branch_ids:
+            running_key = (key, branch_id)
+            future = _running.get(running_key)
+            if future is None or future.done():
+                future = _executor.submit(_run, branch_id, compute, session_factory, timeout)
+                _running[running_key] = future
+                future.add_done_callback(lambda f, k=running_key: _forget(k, f))
+            futures[branch_id] = future
+    wait(futures.values(), timeout=timeout)
+
+    results: Dict[int, Any] = {}
+    timings: List[dict] = []
+    for branch_id, future in futures.items():
+        if not future.done():
+            # Sigue corriendo: su consulta se interrumpe al vencer el plazo y el resultado se descarta
+            timings.append({"branch_id": branch_id, "status": "timeout",
+                            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1), "error": None})
+            continue
+        try:
+            results[branch_id], elapsed_ms = future.result()
+        except TimeoutError:
+            timings.append({"branch_id": branch_id, "status": "timeout",
+                            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1), "error": None})
+        except Exception:
+            logger.exception("Consolidated report failed for branch %s", branch_id)
+            timings.append({"branch_id": branch_id, "status": "error", "elapsed_ms": None, "error": "branch_failed"})
+        else:
+            timings.append({"branch_id": branch_id, "status": "ok", "elapsed_ms": round(elapsed_ms, 1), "error": None})
+    return results, timings
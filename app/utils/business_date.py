@@ -0,0 +1,66 @@
+# app/utils/business_date.py
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy.orm import Session
+
+from app.utils import ref_cache
+
+# Zona horaria por defecto de las sucursales (configurable en Branch.timezone)
+DEFAULT_TIMEZONE = "America/Mexico_City"
+
+
+@lru_cache(maxsize=64)
+def get_zone(name: Optional[str]) -> ZoneInfo:
+    """ZoneInfo por nombre IANA; si no existe, la zona por defecto."""
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+def is_valid_timezone(name: str) -> bool:
+    try:
+        ZoneInfo(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+
+def branch_zone(db: Session, branch_id: Optional[int]) -> ZoneInfo:
+    """Zona horaria de la sucursal (leída del catálogo cacheado de sucursales)."""
+    branches, _ = ref_cache.get_branches(db)
+    for b in branches:
+        if b.id == branch_id:
+            return get_zone(getattr(b, "timezone", None))
+    return get_zone(None)
+
+
+def to_business_date(ts: Optional[datetime], zone: ZoneInfo) -> date:
+    """Día de negocio (local de la sucursal) de un instante. Los naive se asumen UTC."""
+    if ts is None:
+        ts = datetime.now(timezone.utc)
+    elif ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(zone).date()
+
+
+def to_local_hour(ts: Optional[datetime], zone: ZoneInfo) -> int:
+    """Hora local (0-23) de un instante en la zona de la sucursal. Los naive se asumen UTC."""
+    if ts is None:
+        ts = datetime.now(timezone.utc)
+    elif ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(zone).hour
+
+
+def business_date_for(db: Session, branch_id: Optional[int], ts: Optional[datetime] = None) -> date:
+    """Día de negocio para un renglón que se escribe ahora (o en `ts`) en la sucursal."""
+    return to_business_date(ts, branch_zone(db, branch_id))
+
+
+def branch_today(db: Session, branch_id: Optional[int]) -> date:
+    return business_date_for(db, branch_id)
+
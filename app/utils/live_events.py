@@ -0,0 +1,93 @@
+# app/utils/live_events.py
+"""
+Canal de eventos en vivo por sucursal (Server-Sent Events).
+
+- Cada pantalla abierta (dashboard, POS, caja) se suscribe a su sucursal y recibe
+  deltas (venta, cancelación, devolución, movimiento de caja) en vez de volver a
+  pedir los reportes completos.
+- Las escrituras llaman `publish_on_commit()`; el evento solo se envía si la
+  transacción se confirma.
+- Es local al proceso: con varios workers una pantalla solo recibe los eventos
+  de las escrituras que atendió su worker. Por eso las pantallas además recargan
+  todo cada 90 s (y al reconectar, o si el navegador no tiene EventSource).
+"""
+import asyncio
+import threading
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+QUEUE_SIZE = 100
+
+_lock = threading.Lock()
+# branch_id -> {(loop, queue)}
+_subscribers: Dict[Optional[int], Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+
+
+def subscribe(branch_id: Optional[int]) -> asyncio.Queue:
+    """Registra un suscriptor (llamar desde el event loop del servidor)."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    loop = asyncio.get_running_loop()
+    with _lock:
+        _subscribers.setdefault(branch_id, set()).add((loop, queue))
+    return queue
+
+
+def unsubscribe(branch_id: Optional[int], queue: asyncio.Queue) -> None:
+    with _lock:
+        subs = _subscribers.get(branch_id)
+        if not subs:
+            return
+        for item in [s for s in subs if s[1] is queue]:
+            subs.discard(item)
+        if not subs:
+            _subscribers.pop(branch_id, None)
+
+
+# Se encola en lugar de los eventos cuando el cliente no alcanza a leerlos:
+# el stream termina, EventSource reconecta y la pantalla recarga todo
+OVERFLOW = {"type": "overflow"}
+
+
+def _offer(queue: asyncio.Queue, payload: dict) -> None:
+    try:
+        queue.put_nowait(payload)
+    except asyncio.QueueFull:
+        # Cliente lento: se descartan los pendientes y se deja solo la marca de desborde
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(OVERFLOW)
+
+
+def publish(branch_id: Optional[int], payload: dict) -> None:
+    """Envía un evento a todos los suscriptores de la sucursal (seguro desde cualquier hilo)."""
+    with _lock:
+        subs = list(_subscribers.get(branch_id, ()))
+    for loop, queue in subs:
+        try:
+            loop.call_soon_threadsafe(_offer, queue, payload)
+        except RuntimeError:
+            # El loop ya se cerró
+            unsubscribe(branch_id, queue)
+
+
+# -----------------------------
+# Publicación al confirmar la transacción
+# -----------------------------
+_PENDING = "live_events_pending"
+
+
+def publish_on_commit(db: Session, branch_id: Optional[int], payload: dict) -> None:
+    db.info.setdefault(_PENDING, []).append((branch_id, payload))
+
+
+@event.listens_for(Session, "after_commit")
+def _flush_pending(session: Session) -> None:
+    for branch_id, payload in session.info.pop(_PENDING, ()):
+        publish(branch_id, payload)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session: Session) -> None:
+    session.info.pop(_PENDING, None)
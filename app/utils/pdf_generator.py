@@ -134,15 +134,10 @@ def generate_quote_pdf(quote):
 
     return pdf.output(dest='S').encode('latin-1')
 
-def generate_cash_cut_pdf(session, user_name, branch_name, sales_cash, inflows, outflows):
+def generate_cash_cut_pdf(cut):
     """
     Genera el PDF del Corte de Caja (Cash Session).
-    session: Objeto CashSession
-    user_name: Nombre del cajero
-    branch_name: Nombre de la sucursal
-    sales_cash: Total ventas efectivo (Decimal)
-    inflows: Total entradas (Decimal)
-    outflows: Total salidas (Decimal)
+    cut: CashCutSnapshot (corte congelado al cerrar; o calculado al momento si el turno sigue abierto)
     """
     pdf = PDFQuote()
     pdf.add_page()
@@ -153,8 +148,10 @@ def generate_cash_cut_pdf(session, user_name, branch_name, sales_cash, inflows,
     pdf.cell(0, 10, "CORTE DE CAJA", 0, 1, 'C')
     
     pdf.set_font("Arial", "", 10)
-    pdf.cell(0, 5, f"Sucursal: {branch_name}", 0, 1, 'C')
-    pdf.cell(0, 5, f"Cajero: {user_name}", 0, 1, 'C')
+    pdf.cell(0, 5, f"Sucursal: {cut.branch_name or 'Sucursal Principal'}", 0, 1, 'C')
+    pdf.cell(0, 5, f"Cajero: {cut.cashier_name or ''}", 0, 1, 'C')
+    if cut.terminal:
+        pdf.cell(0, 5, f"Terminal: {cut.terminal}", 0, 1, 'C')
     pdf.ln(5)
 
     # FECHAS
@@ -163,8 +160,9 @@ def generate_cash_cut_pdf(session, user_name, branch_name, sales_cash, inflows,
     pdf.set_y(pdf.get_y() + 3)
     
     pdf.set_font("Arial", "B", 9)
-    pdf.cell(95, 5, f"Apertura: {session.opened_at.strftime('%d/%m/%Y %H:%M')}", 0, 0, 'C')
-    close_time = session.closed_at.strftime('%d/%m/%Y %H:%M') if session.closed_at else "EN PROCESO"
+    open_time = cut.opened_at.strftime('%d/%m/%Y %H:%M') if cut.opened_at else ""
+    pdf.cell(95, 5, f"Apertura: {open_time}", 0, 0, 'C')
+    close_time = cut.closed_at.strftime('%d/%m/%Y %H:%M') if cut.closed_at else "EN PROCESO"
     pdf.cell(95, 5, f"Cierre: {close_time}", 0, 1, 'C')
     pdf.ln(10)
 
@@ -177,25 +175,23 @@ def generate_cash_cut_pdf(session, user_name, branch_name, sales_cash, inflows,
         pdf.cell(140, 8, label, 1, 0, 'L')
         pdf.cell(50, 8, f"${amount:,.2f}", 1, 1, 'R')
 
-    row("fondo Inicial (Apertura)", session.opening_balance)
-    row("(+) Ventas en Efectivo", sales_cash)
-    row("(+) Entradas / Ingresos", inflows)
-    row("(-) Salidas / Gastos", outflows)
+    row("fondo Inicial (Apertura)", cut.opening_balance)
+    row("(+) Ventas en Efectivo", cut.sales_cash)
+    row("(+) Entradas / Ingresos", cut.inflows)
+    row("(-) Salidas / Gastos", cut.outflows)
     
-    # Expected calculation
-    expected = session.opening_balance + sales_cash + inflows - outflows
     pdf.set_fill_color(230, 240, 255) # Light Blue
     
     pdf.cell(140, 8, "(=) Total Esperado en Caja", 1, 0, 'L', True)
-    pdf.cell(50, 8, f"${expected:,.2f}", 1, 1, 'R', True)
+    pdf.cell(50, 8, f"${cut.expected:,.2f}", 1, 1, 'R', True)
 
     pdf.ln(5)
     
     # REPORTED
     pdf.set_fill_color(255, 255, 255)
-    row("Dinero Contado (Reportado)", session.closing_balance or 0, bold=True)
+    row("Dinero Contado (Reportado)", cut.closing_balance or 0, bold=True)
     
-    diff = (session.closing_balance or 0) - expected
+    diff = cut.difference if cut.difference is not None else (cut.closing_balance or 0) - cut.expected
     
     # Diferencia Color
     if diff < 0:
@@ -215,8 +211,26 @@ def generate_cash_cut_pdf(session, user_name, branch_name, sales_cash, inflows,
     pdf.set_text_color(0, 0, 0)
     pdf.ln(10)
 
+    # VENTAS POR MÉTODO DE PAGO
+    method_labels = {"CASH": "Efectivo", "CARD": "Tarjeta", "TRANSFER": "Transferencia", "OTHER": "Otro"}
+    pdf.set_font("Arial", "B", 11)
+    pdf.cell(0, 8, "Ventas por Método de Pago", 0, 1)
+
+    pdf.set_font("Arial", "B", 9)
+    pdf.set_fill_color(220, 220, 220)
+    pdf.cell(100, 6, "Método", 1, 0, 'L', True)
+    pdf.cell(40, 6, "Pagos", 1, 0, 'C', True)
+    pdf.cell(50, 6, "Monto", 1, 1, 'R', True)
+
+    pdf.set_font("Arial", "", 9)
+    for method, data in (cut.by_method or {}).items():
+        pdf.cell(100, 6, method_labels.get(method, method), 1, 0, 'L')
+        pdf.cell(40, 6, str(data["count"]), 1, 0, 'C')
+        pdf.cell(50, 6, f"${data['amount']:,.2f}", 1, 1, 'R')
+    pdf.ln(5)
+
     # MOVIMIENTOS DETALLE (Opcional, si hay inflows/outflows)
-    if inflows > 0 or outflows > 0:
+    if cut.movements:
         pdf.set_font("Arial", "B", 11)
         pdf.cell(0, 8, "Detalle de Movimientos Manuales", 0, 1)
         
@@ -228,16 +242,17 @@ def generate_cash_cut_pdf(session, user_name, branch_name, sales_cash, inflows,
         pdf.cell(40, 6, "Monto", 1, 1, 'R', True)
         
         pdf.set_font("Arial", "", 9)
-        for m in session.movements:
-            pdf.cell(30, 6, m.created_at.strftime('%H:%M'), 1, 0, 'C')
-            pdf.cell(20, 6, "ENTRADA" if m.type == 'IN' else "SALIDA", 1, 0, 'C')
-            pdf.cell(100, 6, m.reason[:55], 1, 0, 'L')
-            pdf.cell(40, 6, f"${m.amount:,.2f}", 1, 1, 'R')
+        for m in cut.movements:
+            hour = datetime.fromisoformat(m["created_at"]).strftime('%H:%M') if m["created_at"] else ""
+            pdf.cell(30, 6, hour, 1, 0, 'C')
+            pdf.cell(20, 6, "ENTRADA" if m["type"] == 'IN' else "SALIDA", 1, 0, 'C')
+            pdf.cell(100, 6, (m["reason"] or "")[:55], 1, 0, 'L')
+            pdf.cell(40, 6, f"${m['amount']:,.2f}", 1, 1, 'R')
 
     pdf.ln(10)
     pdf.set_font("Arial", "I", 9)
-    if session.notes:
-        pdf.multi_cell(0, 5, f"Notas del cierre: {session.notes}")
+    if cut.notes:
+        pdf.multi_cell(0, 5, f"Notas del cierre: {cut.notes}")
 
     # FIRMA
     pdf.set_y(-40)
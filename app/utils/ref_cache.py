@@ -0,0 +1,150 @@
+# app/utils/ref_cache.py
+"""
+Caché local (por proceso) de catálogos pequeños: sucursales, departamentos y organización.
+
+- Cada catálogo guarda una copia "desconectada" de sus renglones (no objetos ORM),
+  por lo que se puede usar después de cerrar la sesión.
+- La invalidación es explícita: los endpoints de escritura llaman `invalidate()`,
+  que incrementa el sello en `cache_versions` dentro de la misma transacción.
+  Los renglones de sello se crean al arrancar (`seed_versions()`), así que el
+  incremento siempre es un UPDATE y dos escrituras simultáneas no chocan al insertar.
+- Los demás workers revisan ese sello como máximo cada VERSION_CHECK_SECONDS
+  (lectura por llave primaria) y recargan si cambió.
+"""
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models import Branch, Category, CacheVersion
+from app.models.organization import Organization
+
+VERSION_CHECK_SECONDS = 5.0
+CACHE_CONTROL = "private, no-cache"  # Siempre revalidar con el ETag (304 barato): las pantallas recargan tras editar
+
+BRANCHES = "branches"
+DEPARTMENTS = "departments"
+ORGANIZATION = "organization"
+CATALOGS = (BRANCHES, DEPARTMENTS, ORGANIZATION)
+
+DEFAULT_DEPARTMENTS = ["General", "Abarrotes", "Bebidas", "Farmacia", "Limpieza"]
+
+_lock = threading.Lock()
+# name -> (version, value, checked_at)
+_entries: Dict[str, Tuple[int, Any, float]] = {}
+
+
+def _snapshot(row) -> SimpleNamespace:
+    """Copia los valores de columna de un renglón ORM a un objeto simple."""
+    return SimpleNamespace(**{c.name: getattr(row, c.name) for c in row.__table__.columns})
+
+
+def _read_version(db: Session, name: str) -> int:
+    row = db.query(CacheVersion.version).filter(CacheVersion.name == name).first()
+    return row[0] if row else 0
+
+
+def _get(db: Session, name: str, loader: Callable[[Session], Any]) -> Tuple[Any, int]:
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(name)
+    if entry and now - entry[2] < VERSION_CHECK_SECONDS:
+        return entry[1], entry[0]
+
+    version = _read_version(db, name)
+    if entry and entry[0] == version:
+        with _lock:
+            _entries[name] = (version, entry[1], now)
+        return entry[1], version
+
+    value = loader(db)
+    with _lock:
+        _entries[name] = (version, value, now)
+    return value, version
+
+
+def seed_versions(db: Session) -> int:
+    """
+    Crea (con versión 0) los sellos que falten de los catálogos. Hace commit.
+    Si otro worker los crea al mismo tiempo, se respeta el suyo. Devuelve cuántos creó.
+    """
+    existing = {name for (name,) in db.query(CacheVersion.name).filter(CacheVersion.name.in_(CATALOGS))}
+    missing = [name for name in CATALOGS if name not in existing]
+    if not missing:
+        return 0
+    db.add_all([CacheVersion(name=name, version=0) for name in missing])
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return 0
+    return len(missing)
+
+
+def invalidate(db: Session, name: str) -> None:
+    """
+    Incrementa el sello de versión (sin commit: viaja con la transacción del llamador)
+    y descarta la copia local de este proceso. El renglón ya existe (seed_versions).
+    """
+    db.query(CacheVersion).filter(CacheVersion.name == name).update(
+        {CacheVersion.version: CacheVersion.version + 1}, synchronize_session=False
+    )
+    with _lock:
+        _entries.pop(name, None)
+
+
+def not_modified(request: Request, response: Response, name: str, version: int) -> Optional[Response]:
+    """
+    Agrega ETag/Cache-Control a la respuesta. Si el navegador ya tiene esa versión
+    (If-None-Match), devuelve un 304 listo para regresar desde el endpoint.
+    """
+    etag = f'W/"{name}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+# -----------------------------
+# Catálogos
+# -----------------------------
+def _load_branches(db: Session):
+    return [_snapshot(b) for b in db.query(Branch).order_by(Branch.id).all()]
+
+
+def _load_departments(db: Session):
+    rows = db.query(Category).order_by(Category.id).all()
+    if not rows:
+        # Seed básico si está vacío
+        db.add_all([Category(name=name) for name in DEFAULT_DEPARTMENTS])
+        db.commit()
+        rows = db.query(Category).order_by(Category.id).all()
+    return [_snapshot(c) for c in rows]
+
+
+def _load_organization(db: Session):
+    org = db.query(Organization).first()
+    if not org:
+        # Auto-create if not exists
+        org = Organization(name="Mi Empresa - Atlas ERP")
+        db.add(org)
+        db.commit()
+        db.refresh(org)
+    return _snapshot(org)
+
+
+def get_branches(db: Session) -> Tuple[list, int]:
+    return _get(db, BRANCHES, _load_branches)
+
+
+def get_departments(db: Session) -> Tuple[list, int]:
+    return _get(db, DEPARTMENTS, _load_departments)
+
+
+def get_organization(db: Session) -> Tuple[SimpleNamespace, int]:
+    return _get(db, ORGANIZATION, _load_organization)
@@ -0,0 +1,148 @@
+# app/utils/report_cache.py
+"""
+Caché local (por proceso) de resultados de reportes.
+
+- Llave: (endpoint, sucursal, parámetros). Cada entrada vive TTL segundos.
+- A lo más MAX_ENTRIES entradas: al guardar se descartan las vencidas y, si
+  sigue lleno, las menos usadas recientemente (LRU).
+- Peticiones idénticas simultáneas se agrupan: solo una calcula y las demás
+  esperan su resultado.
+- Las escrituras (venta, cancelación, devolución) marcan la sucursal y el día
+  afectados con `invalidate_on_commit()`; al confirmarse la transacción se
+  descartan las entradas de esa sucursal que cubren ese día.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+DEFAULT_TTL = 30.0
+WAIT_TIMEOUT = 30.0
+MAX_ENTRIES = 256
+
+Key = Tuple[str, Optional[int], Tuple]
+
+_lock = threading.Lock()
+# key -> (value, expires_at, (start, end)), de menos a más recientemente usada
+_entries: "OrderedDict[Key, Tuple[Any, float, Tuple[Optional[date], Optional[date]]]]" = OrderedDict()
+# key -> (event, resultado compartido)
+_inflight: Dict[Key, Tuple[threading.Event, dict]] = {}
+# branch_id -> generación (cambia con cada invalidación de la sucursal)
+_generations: Dict[Optional[int], int] = {}
+
+
+def _make_key(endpoint: str, branch_id: Optional[int], params: Dict[str, Hashable]) -> Key:
+    return (endpoint, branch_id, tuple(sorted(params.items())))
+
+
+def cached(
+    endpoint: str,
+    branch_id: Optional[int],
+    params: Dict[str, Hashable],
+    compute: Callable[[], Any],
+    ttl: float = DEFAULT_TTL,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> Any:
+    """
+    Devuelve el resultado cacheado de `compute()` para (endpoint, sucursal, params).
+    `start`/`end` indican los días de negocio que cubre el resultado (None = abierto)
+    para poder invalidarlo cuando cambian ventas de ese día.
+    El valor devuelto es compartido: no debe modificarse.
+    """
+    key = _make_key(endpoint, branch_id, params)
+
+    while True:
+        now = time.monotonic()
+        with _lock:
+            entry = _entries.get(key)
+            if entry and entry[1] > now:
+                _entries.move_to_end(key)
+                return entry[0]
+            inflight = _inflight.get(key)
+            if inflight is None:
+                done = threading.Event()
+                shared: dict = {}
+                _inflight[key] = (done, shared)
+                generation = _generations.get(branch_id, 0)
+                break
+
+        # Otra petición idéntica ya está calculando: esperar su resultado
+        done, shared = inflight
+        if not done.wait(WAIT_TIMEOUT):
+            return compute()
+        if "error" in shared:
+            raise shared["error"]
+        if "value" in shared:
+            return shared["value"]
+        # El líder se invalidó a medio cálculo; volver a intentar
+
+    try:
+        value = compute()
+    except Exception as e:
+        shared["error"] = e
+        raise
+    else:
+        with _lock:
+            # Si hubo una venta mientras se calculaba, el resultado ya puede estar viejo
+            if _generations.get(branch_id, 0) == generation:
+                _store(key, value, ttl, (start, end))
+                shared["value"] = value
+        return value
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+        done.set()
+
+
+def _store(key: Key, value: Any, ttl: float, span: Tuple[Optional[date], Optional[date]]) -> None:
+    """Guarda una entrada (con _lock tomado) descartando vencidas y, si no cabe, las menos usadas."""
+    now = time.monotonic()
+    for stale in [k for k, (_, expires_at, _) in _entries.items() if expires_at <= now]:
+        del _entries[stale]
+    _entries[key] = (value, now + ttl, span)
+    _entries.move_to_end(key)
+    while len(_entries) > MAX_ENTRIES:
+        _entries.popitem(last=False)
+
+
+def invalidate(branch_id: Optional[int], day: Optional[date] = None) -> None:
+    """Descarta las entradas de la sucursal que cubren `day` (todas si day es None)."""
+    with _lock:
+        _generations[branch_id] = _generations.get(branch_id, 0) + 1
+        for key, (_, _, (start, end)) in list(_entries.items()):
+            if key[1] != branch_id:
+                continue
+            if day is None or ((start is None or start <= day) and (end is None or day <= end)):
+                del _entries[key]
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+
+
+# -----------------------------
+# Invalidación al confirmar la transacción
+# -----------------------------
+_PENDING = "report_cache_pending"
+
+
+def invalidate_on_commit(db: Session, branch_id: Optional[int], day: Optional[date]) -> None:
+    """Programa la invalidación para cuando la sesión haga commit (se descarta en rollback)."""
+    db.info.setdefault(_PENDING, set()).add((branch_id, day))
+
+
+@event.listens_for(Session, "after_commit")
+def _flush_pending(session: Session) -> None:
+    for branch_id, day in session.info.pop(_PENDING, ()):
+        invalidate(branch_id, day)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session: Session) -> None:
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,91 @@
+# app/utils/report_jobs.py
+"""
+Reportes pesados calculados en segundo plano.
+
+- La primera petición lanza el cálculo en un hilo del pool y responde de inmediato
+  con estatus "running"; las siguientes reciben el mismo trabajo (no se duplica).
+- Al terminar, el resultado queda disponible TTL segundos por
+  (reporte, sucursal, parámetros); un error se conserva poco tiempo para reintentar.
+  El detalle del error va a la bitácora; el trabajo solo guarda un código.
+- Es local al proceso, igual que report_cache. Los trabajos vencidos se descartan
+  al lanzar uno nuevo.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 2
+DEFAULT_TTL = 3600.0
+ERROR_TTL = 60.0
+
+Key = Tuple[str, Optional[int], Tuple]
+
+_lock = threading.Lock()
+_jobs: Dict[Key, dict] = {}
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="report-job")
+
+
+def _snapshot(job: dict) -> dict:
+    return {k: v for k, v in job.items() if k != "expires_at"}
+
+
+def _run(job: dict, key: Key, compute: Callable[[], Any], ttl: float) -> None:
+    try:
+        result = compute()
+    except Exception:
+        logger.exception("Report job %s failed (branch %s)", key[0], key[1])
+        with _lock:
+            job.update(status="error", error="job_failed", finished_at=datetime.now(timezone.utc),
+                       expires_at=time.monotonic() + ERROR_TTL)
+    else:
+        with _lock:
+            job.update(status="ready", result=result, finished_at=datetime.now(timezone.utc),
+                       expires_at=time.monotonic() + ttl)
+
+
+def _expired(job: dict, now: float) -> bool:
+    return job["status"] != "running" and job["expires_at"] <= now
+
+
+def _purge() -> None:
+    """Descarta los trabajos terminados cuyo resultado ya venció (con _lock tomado)."""
+    now = time.monotonic()
+    for key in [k for k, job in _jobs.items() if _expired(job, now)]:
+        del _jobs[key]
+
+
+def get_or_submit(
+    report: str,
+    branch_id: Optional[int],
+    params: Dict[str, Hashable],
+    compute: Callable[[], Any],
+    ttl: float = DEFAULT_TTL,
+) -> dict:
+    """
+    Devuelve el estado del trabajo {status, result, error, started_at, finished_at}.
+    Si no existe (o ya expiró) lo lanza. `compute` corre en otro hilo: debe abrir
+    su propia sesión de base de datos.
+    """
+    key = (report, branch_id, tuple(sorted(params.items())))
+    with _lock:
+        job = _jobs.get(key)
+        if job is None or _expired(job, time.monotonic()):
+            _purge()
+            job = {
+                "status": "running", "result": None, "error": None,
+                "started_at": datetime.now(timezone.utc), "finished_at": None, "expires_at": None,
+            }
+            _jobs[key] = job
+            _executor.submit(_run, job, key, compute, ttl)
+        return _snapshot(job)
+
+
+def clear() -> None:
+    with _lock:
+        for key in [k for k, job in _jobs.items() if job["status"] != "running"]:
+            del _jobs[key]
@@ -0,0 +1,335 @@
+# app/utils/sales_export.py
+"""
+Exportación columnar (Parquet) del historial de ventas para BI.
+
+Escribe dos datasets particionados por sucursal y mes (estilo Hive):
+
+    <out_dir>/sales_lines/branch_id=1/month=2025-01/part-20250101-20250131.parquet
+    <out_dir>/payments/branch_id=1/month=2025-01/part-20250101-20250131.parquet
+
+- sales_lines: un renglón por partida de venta con los datos del encabezado.
+- payments: un renglón por cobro (de ventas y abonos a cuenta).
+
+Las consultas se leen en bloques (`yield_per`) ordenadas por sucursal y día, y
+cada bloque se escribe como un lote Arrow; solo hay un archivo abierto a la vez,
+así que la memoria no crece con el tamaño del historial.
+
+El modo incremental guarda en `_export_state.json` el último día exportado por
+sucursal y agrega los días nuevos y completos (hasta ayer en la zona de la
+sucursal). Como las cancelaciones y devoluciones cambian ventas ya exportadas,
+cada corrida además vuelve a exportar completos el mes en curso y el anterior
+(REFRESH_MONTHS) y reemplaza sus archivos. Cambios a ventas más viejas
+requieren una exportación completa.
+
+Requiere `pyarrow` (dependencia opcional).
+"""
+import json
+import os
+import shutil
+from datetime import date, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from app.models import Branch, SalesDocument, SalesLineItem, Payment, User
+from app.utils.business_date import branch_today
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+BATCH_SIZE = 10000
+REFRESH_MONTHS = 2      # Meses (incluido el último exportado) que se reexportan en cada corrida
+STATE_FILE = "_export_state.json"
+
+
+def _schemas():
+    money = pa.decimal128(12, 2)
+    ts = pa.timestamp("us", tz="UTC")
+    sales_lines = pa.schema([
+        ("document_id", pa.int64()),
+        ("line_id", pa.int64()),
+        ("business_date", pa.date32()),
+        ("created_at", ts),
+        ("doc_type", pa.string()),
+        ("status", pa.string()),
+        ("series", pa.string()),
+        ("folio", pa.int64()),
+        ("seller_id", pa.int64()),
+        ("customer_id", pa.int64()),
+        ("variant_id", pa.int64()),
+        ("description", pa.string()),
+        ("quantity", pa.float64()),
+        ("unit_price", money),
+        ("unit_cost", money),
+        ("total_line", money),
+        ("document_total", money),
+    ])
+    payments = pa.schema([
+        ("payment_id", pa.int64()),
+        ("business_date", pa.date32()),
+        ("created_at", ts),
+        ("sales_document_id", pa.int64()),
+        ("customer_id", pa.int64()),
+        ("created_by_id", pa.int64()),
+        ("method", pa.string()),
+        ("amount", money),
+        ("reference", pa.string()),
+        ("document_status", pa.string()),
+    ])
+    return {"sales_lines": sales_lines, "payments": payments}
+
+
+def _enum_value(value):
+    return value.value if hasattr(value, "value") else value
+
+
+class _PartitionedWriter:
+    """
+    Escribe lotes en el archivo de la partición (sucursal, mes); cambia de archivo al cambiar la llave.
+    Se escribe a `<archivo>.tmp` y se renombra al cerrar: quien lee con `*.parquet` nunca
+    ve un archivo a medias (sin footer).
+    """
+
+    def __init__(self, root: str, schema, file_name: str, replace_from: Optional[str] = None):
+        self.root = root
+        self.schema = schema
+        self.file_name = file_name
+        self.replace_from = replace_from    # Mes ("YYYY-MM") desde el que la partición se reescribe completa
+        self.key = None
+        self.writer = None
+        self.path = None
+        self.months = set()
+        self.rows = 0
+
+    def write(self, branch_id: int, month: str, columns: Dict[str, list]) -> None:
+        if self.key != (branch_id, month):
+            self.close()
+            folder = os.path.join(self.root, f"branch_id={branch_id}", f"month={month}")
+            os.makedirs(folder, exist_ok=True)
+            self.path = os.path.join(folder, self.file_name)
+            self.writer = pq.ParquetWriter(self.path + ".tmp", self.schema)
+            self.key = (branch_id, month)
+            self.months.add(month)
+        self.writer.write_table(pa.Table.from_pydict(columns, schema=self.schema))
+        self.rows += len(next(iter(columns.values())))
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            os.replace(self.path + ".tmp", self.path)
+            if self.replace_from is not None and self.key[1] >= self.replace_from:
+                _drop_parquet(os.path.dirname(self.path), keep=self.file_name)
+        self.writer = None
+        self.path = None
+        self.key = None
+
+    def abort(self) -> None:
+        """Descarta el archivo en curso (error a media exportación)."""
+        if self.writer is not None:
+            self.writer.close()
+            os.remove(self.path + ".tmp")
+        self.writer = None
+        self.path = None
+        self.key = None
+
+
+def _drop_parquet(folder: str, keep: Optional[str] = None) -> None:
+    """Borra los archivos de una partición (menos `keep`): los reemplazó una reexportación."""
+    if not os.path.isdir(folder):
+        return
+    for name in os.listdir(folder):
+        if name.endswith(".parquet") and name != keep:
+            os.remove(os.path.join(folder, name))
+
+
+def _refresh_start(end: date) -> date:
+    """Primer día del mes REFRESH_MONTHS - 1 meses antes del de `end`."""
+    month = end.replace(day=1)
+    for _ in range(REFRESH_MONTHS - 1):
+        month = (month - timedelta(days=1)).replace(day=1)
+    return month
+
+
+def _write_chunked(query, writer: _PartitionedWriter, branch_id: int, to_row, batch_size: int) -> None:
+    """Agrupa los renglones por mes y los manda al escritor cada `batch_size` renglones."""
+    columns: Dict[str, list] = {name: [] for name in writer.schema.names}
+    month = None
+    count = 0
+
+    def flush():
+        nonlocal count
+        if count:
+            writer.write(branch_id, month, columns)
+            for values in columns.values():
+                values.clear()
+            count = 0
+
+    for row in query.yield_per(batch_size):
+        row_month = row.business_date.strftime("%Y-%m")
+        if row_month != month or count >= batch_size:
+            flush()
+            month = row_month
+        for name, value in zip(writer.schema.names, to_row(row)):
+            columns[name].append(value)
+        count += 1
+    flush()
+
+
+def _sales_lines_query(db: Session, branch_id: int, start: Optional[date], end: date):
+    query = db.query(
+        SalesDocument.id.label("document_id"), SalesLineItem.id.label("line_id"),
+        SalesDocument.business_date, SalesDocument.created_at,
+        SalesDocument.doc_type, SalesDocument.status, SalesDocument.series, SalesDocument.folio,
+        SalesDocument.seller_id, SalesDocument.customer_id,
+        SalesLineItem.variant_id, SalesLineItem.description, SalesLineItem.quantity,
+        SalesLineItem.unit_price, SalesLineItem.unit_cost, SalesLineItem.total_line,
+        SalesDocument.total_amount,
+    ).join(SalesLineItem, SalesLineItem.document_id == SalesDocument.id).filter(
+        SalesDocument.branch_id == branch_id,
+        SalesDocument.business_date <= end,
+    )
+    if start is not None:
+        query = query.filter(SalesDocument.business_date >= start)
+    return query.order_by(SalesDocument.business_date, SalesDocument.id, SalesLineItem.id)
+
+
+def _payments_query(db: Session, branch_id: int, start: Optional[date], end: date):
+    # La sucursal del cobro es la de su venta; los abonos a cuenta toman la del cajero
+    payment_branch = func.coalesce(SalesDocument.branch_id, User.branch_id)
+    query = db.query(
+        Payment.id, Payment.business_date, Payment.created_at,
+        Payment.sales_document_id, Payment.customer_id, Payment.created_by_id,
+        Payment.method, Payment.amount, Payment.reference,
+        SalesDocument.status.label("document_status"),
+    ).outerjoin(SalesDocument, SalesDocument.id == Payment.sales_document_id
+    ).outerjoin(User, User.id == Payment.created_by_id).filter(
+        payment_branch == branch_id,
+        Payment.business_date <= end,
+    )
+    if start is not None:
+        query = query.filter(Payment.business_date >= start)
+    return query.order_by(Payment.business_date, Payment.id)
+
+
+def _load_state(out_dir: str) -> Dict[str, str]:
+    path = os.path.join(out_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_state(out_dir: str, state: Dict[str, str]) -> None:
+    path = os.path.join(out_dir, STATE_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def export_sales_facts(
+    db: Session,
+    out_dir: str,
+    incremental: bool = True,
+    branch_id: Optional[int] = None,
+    batch_size: int = BATCH_SIZE,
+) -> dict:
+    """
+    Exporta partidas y cobros a Parquet particionado por sucursal/mes.
+    incremental=False borra las particiones y el estado de las sucursales y exporta todo su historial.
+    Devuelve {branch_id: {"from", "to", "sales_lines", "payments"}} de lo exportado.
+    """
+    if pa is None:
+        raise RuntimeError("La exportación a Parquet requiere 'pyarrow' (pip install pyarrow).")
+
+    schemas = _schemas()
+    os.makedirs(out_dir, exist_ok=True)
+    state = _load_state(out_dir)
+    branch_ids = [branch_id] if branch_id is not None else [b.id for b in db.query(Branch.id).order_by(Branch.id)]
+
+    if not incremental:
+        for b_id in branch_ids:
+            for dataset in schemas:
+                shutil.rmtree(os.path.join(out_dir, dataset, f"branch_id={b_id}"), ignore_errors=True)
+            state.pop(str(b_id), None)
+        _save_state(out_dir, state)
+
+    summary = {}
+    for b_id in branch_ids:
+        # Solo días completos: hasta ayer en la zona de la sucursal
+        end = branch_today(db, b_id) - timedelta(days=1)
+        last = state.get(str(b_id))
+        start = date.fromisoformat(last) + timedelta(days=1) if last else None
+        replace_from = None
+        if start is not None:
+            # Los meses recientes se reexportan completos (cancelaciones y devoluciones)
+            refresh = _refresh_start(end)
+            start = min(start, refresh)
+            replace_from = f"{refresh:%Y-%m}"
+
+        first = start or db.query(func.min(SalesDocument.business_date)).filter(
+            SalesDocument.branch_id == b_id
+        ).scalar() or end
+        file_name = f"part-{first:%Y%m%d}-{end:%Y%m%d}.parquet"
+
+        lines_writer = _PartitionedWriter(
+            os.path.join(out_dir, "sales_lines"), schemas["sales_lines"], file_name, replace_from
+        )
+        payments_writer = _PartitionedWriter(
+            os.path.join(out_dir, "payments"), schemas["payments"], file_name, replace_from
+        )
+        try:
+            _write_chunked(
+                _sales_lines_query(db, b_id, start, end), lines_writer, b_id,
+                lambda r: (
+                    r.document_id, r.line_id, r.business_date, r.created_at,
+                    _enum_value(r.doc_type), _enum_value(r.status), r.series, r.folio,
+                    r.seller_id, r.customer_id, r.variant_id, r.description, r.quantity,
+                    r.unit_price, r.unit_cost, r.total_line, r.total_amount,
+                ),
+                batch_size,
+            )
+            _write_chunked(
+                _payments_query(db, b_id, start, end), payments_writer, b_id,
+                lambda r: (
+                    r.id, r.business_date, r.created_at,
+                    r.sales_document_id, r.customer_id, r.created_by_id,
+                    _enum_value(r.method), r.amount, r.reference, _enum_value(r.document_status),
+                ),
+                batch_size,
+            )
+        except Exception:
+            lines_writer.abort()
+            payments_writer.abort()
+            raise
+        lines_writer.close()
+        payments_writer.close()
+
+        # Meses reexportados que ya no tienen renglones: quitar lo que quedó de corridas anteriores
+        if replace_from is not None:
+            for dataset, writer in (("sales_lines", lines_writer), ("payments", payments_writer)):
+                branch_dir = os.path.join(out_dir, dataset, f"branch_id={b_id}")
+                if not os.path.isdir(branch_dir):
+                    continue
+                for folder in os.listdir(branch_dir):
+                    month = folder.partition("=")[2]
+                    if month >= replace_from and month not in writer.months:
+                        _drop_parquet(os.path.join(branch_dir, folder))
+
+        # El estado se guarda por sucursal al terminar: si el proceso se corta,
+        # la siguiente corrida reescribe los mismos archivos (mismo nombre)
+        state[str(b_id)] = end.isoformat()
+        _save_state(out_dir, state)
+        summary[b_id] = {
+            "from": first.isoformat(),
+            "to": end.isoformat(),
+            "sales_lines": lines_writer.rows,
+            "payments": payments_writer.rows,
+        }
+
+    return summary
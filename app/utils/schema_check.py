@@ -0,0 +1,72 @@
+# app/utils/schema_check.py
+"""
+Verificación del esquema al arrancar.
+
+`create_all` crea las tablas nuevas pero no agrega columnas a las existentes.
+Una base anterior (por ejemplo sql_app.db) falla con "no such column" en cuanto se
+consulta; por eso se revisa al inicio y se detiene el arranque con la instrucción
+para migrar. `migrate_schema.py` usa la misma lista de columnas.
+"""
+from typing import List, Tuple
+
+from sqlalchemy import inspect, select, func
+from sqlalchemy.engine import Engine
+
+from app.models import SalesDocument, DailySales, DocumentType, DocumentStatus
+
+# (tabla, columna, tipo SQL)
+COLUMNS = [
+    ("branches", "timezone", "VARCHAR DEFAULT 'America/Mexico_City'"),
+    ("sales_documents", "business_date", "DATE"),
+    ("payments", "business_date", "DATE"),
+    ("sale_returns", "business_date", "DATE"),
+    ("sales_documents", "balance_due", "NUMERIC(10, 2) DEFAULT 0"),
+    ("sales_documents", "due_date", "DATE"),
+    ("customer_ledger_entries", "entry_type", "VARCHAR"),
+    ("cash_sessions", "sales_cash", "NUMERIC(12, 2) NOT NULL DEFAULT 0"),
+    ("cash_sessions", "sales_card", "NUMERIC(12, 2) NOT NULL DEFAULT 0"),
+    ("cash_sessions", "sales_transfer", "NUMERIC(12, 2) NOT NULL DEFAULT 0"),
+    ("cash_sessions", "sales_other", "NUMERIC(12, 2) NOT NULL DEFAULT 0"),
+    ("cash_sessions", "payments_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("cash_sessions", "inflows", "NUMERIC(12, 2) NOT NULL DEFAULT 0"),
+    ("cash_sessions", "outflows", "NUMERIC(12, 2) NOT NULL DEFAULT 0"),
+    ("cash_sessions", "terminal", "VARCHAR(50)"),
+    ("payments", "cash_session_id", "INTEGER REFERENCES cash_sessions(id)"),
+    ("payments", "terminal", "VARCHAR(50)"),
+    ("daily_variant_sales", "cost_returned", "NUMERIC(12, 2) NOT NULL DEFAULT 0"),
+]
+
+MIGRATE_HINT = "Ejecuta 'python migrate_schema.py && python rebuild_rollups.py' antes de iniciar el servidor."
+
+
+class SchemaOutdated(RuntimeError):
+    pass
+
+
+def missing_columns(engine: Engine) -> List[Tuple[str, str, str]]:
+    """Columnas de COLUMNS que faltan en tablas existentes."""
+    inspector = inspect(engine)
+    missing = []
+    for table, column, ddl in COLUMNS:
+        if not inspector.has_table(table):
+            continue
+        if column not in {c["name"] for c in inspector.get_columns(table)}:
+            missing.append((table, column, ddl))
+    return missing
+
+
+def check_schema(engine: Engine) -> None:
+    """Detiene el arranque si faltan columnas o si hay ventas sin acumulados de reportes."""
+    missing = missing_columns(engine)
+    if missing:
+        names = ", ".join(f"{table}.{column}" for table, column, _ in missing)
+        raise SchemaOutdated(f"El esquema de la base está desactualizado (faltan columnas: {names}). {MIGRATE_HINT}")
+
+    with engine.connect() as conn:
+        has_sales = conn.execute(select(SalesDocument.id).where(
+            SalesDocument.doc_type == DocumentType.INVOICE,
+            SalesDocument.status != DocumentStatus.CANCELLED,
+        ).limit(1)).first() is not None
+        has_rollups = conn.execute(select(func.count()).select_from(DailySales.__table__)).scalar()
+    if has_sales and not has_rollups:
+        raise SchemaOutdated(f"Hay ventas pero los acumulados de reportes están vacíos. {MIGRATE_HINT}")
@@ -0,0 +1,42 @@
+"""
+Exporta el historial de ventas (partidas y cobros) a Parquet particionado por
+sucursal y mes, para el equipo de BI. Requiere pyarrow.
+
+Uso:
+    python export_sales_parquet.py                          # incremental (solo días nuevos)
+    python export_sales_parquet.py --full                   # reexporta todo el historial
+    python export_sales_parquet.py --out /data/atlas --branch 1
+"""
+import argparse
+
+from app.database import SessionLocal
+from app.utils.sales_export import export_sales_facts, BATCH_SIZE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export sales facts to partitioned Parquet")
+    parser.add_argument("--out", default="exports/sales", help="Directorio destino (default: exports/sales)")
+    parser.add_argument("--branch", type=int, default=None, help="ID de sucursal (default: todas)")
+    parser.add_argument("--full", action="store_true", help="Borra lo exportado y vuelve a exportar todo")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Renglones por lote")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        summary = export_sales_facts(
+            db, args.out, incremental=not args.full, branch_id=args.branch, batch_size=args.batch_size
+        )
+        if not summary:
+            print("Nothing new to export.")
+        for branch_id, info in summary.items():
+            print(f"branch {branch_id}: {info['from']}..{info['to']} "
+                  f"sales_lines={info['sales_lines']} payments={info['payments']}")
+        print("Export complete.")
+    except Exception as e:
+        print(f"Export error: {e}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Migración ligera del esquema (sin Alembic).
+
+- Crea las tablas nuevas (create_all).
+- Agrega columnas nuevas a tablas existentes (ALTER TABLE ... ADD COLUMN).
+- Crea los índices que falten.
+- Rellena datos derivados de los renglones históricos.
+
+Es idempotente: se puede correr varias veces.
+Uso: python migrate_schema.py
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from sqlalchemy import text, func
+
+from app.database import engine, SessionLocal, Base
+import app.models  # noqa: F401  (registra todos los modelos en Base.metadata)
+from app.models import (
+    Branch, SalesDocument, Payment, User, SaleReturn, Customer,
+    DocumentType, DocumentStatus
+)
+from app.utils.business_date import get_zone, to_business_date
+from app.crud.cash import reconcile_sessions, backfill_payment_sessions, backfill_cash_cuts
+from app.crud.pricing import backfill_price_history
+from app.utils import ref_cache
+from app.utils.schema_check import missing_columns
+
+BATCH_SIZE = 1000
+
+
+def add_missing_columns():
+    """Agrega las columnas faltantes; devuelve el conjunto de (tabla, columna) agregadas."""
+    added = set()
+    with engine.begin() as conn:
+        for table, column, ddl in missing_columns(engine):
+            print(f"Adding {table}.{column}...")
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+            added.add((table, column))
+    return added
+
+
+def create_missing_indexes():
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def backfill_business_date(db):
+    """Calcula business_date de ventas, pagos y devoluciones viejos con la zona de su sucursal."""
+    zones = {b.id: get_zone(b.timezone) for b in db.query(Branch.id, Branch.timezone)}
+    default_zone = get_zone(None)
+
+    total = 0
+    while True:
+        rows = (
+            db.query(SalesDocument.id, SalesDocument.branch_id, SalesDocument.created_at)
+            .filter(SalesDocument.business_date.is_(None), SalesDocument.created_at.isnot(None))
+            .limit(BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            break
+        db.bulk_update_mappings(SalesDocument, [
+            {"id": r.id, "business_date": to_business_date(r.created_at, zones.get(r.branch_id, default_zone))}
+            for r in rows
+        ])
+        db.commit()
+        total += len(rows)
+    print(f"sales_documents.business_date: {total} rows")
+
+    total = 0
+    while True:
+        # La sucursal del pago es la de su venta; los abonos a cuenta toman la del cajero
+        rows = (
+            db.query(Payment.id, Payment.created_at, SalesDocument.branch_id, User.branch_id.label("user_branch_id"))
+            .outerjoin(SalesDocument, SalesDocument.id == Payment.sales_document_id)
+            .outerjoin(User, User.id == Payment.created_by_id)
+            .filter(Payment.business_date.is_(None), Payment.created_at.isnot(None))
+            .limit(BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            break
+        db.bulk_update_mappings(Payment, [
+            {
+                "id": r.id,
+                "business_date": to_business_date(
+                    r.created_at, zones.get(r.branch_id or r.user_branch_id, default_zone)
+                ),
+            }
+            for r in rows
+        ])
+        db.commit()
+        total += len(rows)
+    print(f"payments.business_date: {total} rows")
+
+    total = 0
+    while True:
+        rows = (
+            db.query(SaleReturn.id, SaleReturn.branch_id, SaleReturn.created_at)
+            .filter(SaleReturn.business_date.is_(None), SaleReturn.created_at.isnot(None))
+            .limit(BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            break
+        db.bulk_update_mappings(SaleReturn, [
+            {"id": r.id, "business_date": to_business_date(r.created_at, zones.get(r.branch_id, default_zone))}
+            for r in rows
+        ])
+        db.commit()
+        total += len(rows)
+    print(f"sale_returns.business_date: {total} rows")
+
+
+def backfill_open_balances(db):
+    """
+    Reparte el saldo actual de cada cliente sobre sus ventas a crédito como si los
+    abonos se hubieran aplicado FIFO: el saldo abierto queda en las ventas más recientes.
+    """
+    paid = defaultdict(Decimal)
+    for doc_id, amount in (
+        db.query(Payment.sales_document_id, func.sum(Payment.amount))
+        .filter(Payment.sales_document_id.isnot(None))
+        .group_by(Payment.sales_document_id)
+    ):
+        paid[doc_id] = Decimal(str(amount or 0))
+
+    updates = []
+    for customer in db.query(Customer).filter(Customer.current_balance > 0):
+        remaining = Decimal(str(customer.current_balance))
+        docs = (
+            db.query(SalesDocument)
+            .filter(
+                SalesDocument.customer_id == customer.id,
+                SalesDocument.doc_type == DocumentType.INVOICE,
+                SalesDocument.status != DocumentStatus.CANCELLED,
+            )
+            .order_by(SalesDocument.created_at.desc(), SalesDocument.id.desc())
+        )
+        for doc in docs:
+            if remaining <= 0:
+                break
+            debt = Decimal(str(doc.total_amount or 0)) - paid[doc.id]
+            if debt <= 0:
+                continue
+            open_amount = min(debt, remaining)
+            remaining -= open_amount
+            updates.append({
+                "id": doc.id,
+                "balance_due": open_amount,
+                "due_date": doc.business_date + timedelta(days=customer.credit_days or 0) if doc.business_date else None,
+            })
+
+    for start in range(0, len(updates), BATCH_SIZE):
+        db.bulk_update_mappings(SalesDocument, updates[start:start + BATCH_SIZE])
+    db.commit()
+    print(f"sales_documents.balance_due: {len(updates)} open invoices")
+
+
+def migrate():
+    Base.metadata.create_all(bind=engine)
+    added = add_missing_columns()
+    create_missing_indexes()
+
+    db = SessionLocal()
+    try:
+        backfill_business_date(db)
+        if ("sales_documents", "balance_due") in added:
+            backfill_open_balances(db)
+        if ("payments", "cash_session_id") in added:
+            stamped = backfill_payment_sessions(db)
+            db.commit()
+            print(f"payments.cash_session_id: {stamped} rows")
+        if ("cash_sessions", "sales_cash") in added or ("payments", "cash_session_id") in added:
+            fixed = reconcile_sessions(db, fix=True)
+            db.commit()
+            print(f"cash_sessions running totals: {len(fixed)} sessions backfilled")
+        if ("daily_variant_sales", "cost_returned") in added:
+            print("daily_variant_sales.cost_returned: run 'python rebuild_rollups.py' to value past returns.")
+        baseline = backfill_price_history(db)
+        if baseline:
+            db.commit()
+            print(f"product_price_history: {baseline} variants with a baseline price")
+        seeded = ref_cache.seed_versions(db)
+        if seeded:
+            print(f"cache_versions: {seeded} catalogs seeded")
+        frozen = backfill_cash_cuts(db)
+        if frozen:
+            db.commit()
+            print(f"cash_cut_snapshots: {frozen} closed sessions frozen")
+        print("Migration complete.")
+        print("Run 'python rebuild_rollups.py' to (re)build the daily report rollups.")
+        print("Then run 'python run_replenishment.py' to compute reorder points.")
+        print("Schedule 'python refresh_customer_rfm.py' daily to keep customer RFM recency current.")
+    except Exception as e:
+        print(f"Migration error: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    migrate()
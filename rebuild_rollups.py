@@ -0,0 +1,38 @@
+"""
+Reconstruye los acumulados diarios de reportes (daily_sales, daily_payments,
+daily_variant_sales, hourly_sales) a partir de ventas, pagos y devoluciones.
+
+Uso:
+    python rebuild_rollups.py                       # todo
+    python rebuild_rollups.py --branch 1 --from 2025-01-01 --to 2025-01-31
+"""
+import argparse
+from datetime import date
+
+from app.database import SessionLocal
+from app.crud.rollups import rebuild_rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild daily report rollups")
+    parser.add_argument("--branch", type=int, default=None, help="ID de sucursal (default: todas)")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, default=None, help="Día inicial YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, default=None, help="Día final YYYY-MM-DD (inclusivo)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        counts = rebuild_rollups(db, branch_id=args.branch, start=args.start, end=args.end)
+        db.commit()
+        for table, count in counts.items():
+            print(f"{table}: {count} rows")
+        print("Rebuild complete.")
+    except Exception as e:
+        print(f"Rebuild error: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
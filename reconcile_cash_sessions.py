@@ -0,0 +1,41 @@
+"""
+Verifica los acumulados de las sesiones de caja (ventas por método, entradas y
+salidas) contra los pagos y movimientos registrados.
+
+Uso:
+    python reconcile_cash_sessions.py                # revisa todas
+    python reconcile_cash_sessions.py --session 12   # solo una sesión
+    python reconcile_cash_sessions.py --fix          # corrige las diferencias
+"""
+import argparse
+
+from app.database import SessionLocal
+from app.crud.cash import reconcile_sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile cash session running totals")
+    parser.add_argument("--session", type=int, default=None, help="ID de sesión de caja (default: todas)")
+    parser.add_argument("--fix", action="store_true", help="Corregir los acumulados con lo recalculado")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        mismatches = reconcile_sessions(db, session_id=args.session, fix=args.fix)
+        for m in mismatches:
+            detail = ", ".join(f"{col}: {d['stored']} -> {d['computed']}" for col, d in m["diffs"].items())
+            print(f"session {m['session_id']} ({m['status']}): {detail}")
+        if args.fix:
+            db.commit()
+            print(f"Fixed {len(mismatches)} sessions.")
+        else:
+            print(f"{len(mismatches)} sessions with differences.")
+    except Exception as e:
+        print(f"Reconcile error: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
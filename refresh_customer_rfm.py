@@ -0,0 +1,38 @@
+"""
+Recalcula la segmentación RFM de clientes (tabla customer_rfm): recencia,
+frecuencia, monto, calificaciones y segmento. La recencia depende del día en que
+se calcula, así que está pensado para correr una vez al día (por ejemplo, de madrugada).
+
+Uso:
+    python refresh_customer_rfm.py
+    python refresh_customer_rfm.py --as-of 2026-01-31
+"""
+import argparse
+from datetime import date
+
+from app.database import SessionLocal
+from app.crud.crm import refresh_customer_rfm
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild customer RFM segmentation")
+    parser.add_argument("--as-of", type=date.fromisoformat, default=None,
+                        help="Fecha de corte YYYY-MM-DD (default: día de negocio actual)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        segments = refresh_customer_rfm(db, as_of=args.as_of)
+        db.commit()
+        for segment, count in segments.items():
+            print(f"{segment}: {count} customers")
+        print("Customer RFM refresh complete.")
+    except Exception as e:
+        print(f"Customer RFM refresh error: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
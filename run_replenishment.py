@@ -0,0 +1,46 @@
+"""
+Recalcula el pronóstico de demanda y los puntos de reorden por sucursal y variante
+(tabla replenishment_plans) a partir de los acumulados diarios de ventas.
+Pensado para correr una vez al día (por ejemplo, de madrugada).
+
+Uso:
+    python run_replenishment.py
+    python run_replenishment.py --branch 1 --history-days 56 --lead-time 5 --review 7
+"""
+import argparse
+
+from app.database import SessionLocal
+from app.crud.replenishment import (
+    run_replenishment, HISTORY_DAYS, ALPHA, LEAD_TIME_DAYS, REVIEW_DAYS, SERVICE_Z
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild demand forecasts and reorder points")
+    parser.add_argument("--branch", type=int, default=None, help="ID de sucursal (default: todas)")
+    parser.add_argument("--history-days", type=int, default=HISTORY_DAYS, help="Días de historia a usar")
+    parser.add_argument("--alpha", type=float, default=ALPHA, help="Suavizamiento exponencial (0-1)")
+    parser.add_argument("--lead-time", type=int, default=LEAD_TIME_DAYS, help="Días de entrega del proveedor")
+    parser.add_argument("--review", type=int, default=REVIEW_DAYS, help="Días entre pedidos")
+    parser.add_argument("--z", type=float, default=SERVICE_Z, help="Factor de nivel de servicio")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        counts = run_replenishment(
+            db, branch_id=args.branch, history_days=args.history_days, alpha=args.alpha,
+            lead_time_days=args.lead_time, review_days=args.review, service_z=args.z
+        )
+        db.commit()
+        for branch_id, count in counts.items():
+            print(f"branch {branch_id}: {count} variants")
+        print("Replenishment complete.")
+    except Exception as e:
+        print(f"Replenishment error: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()